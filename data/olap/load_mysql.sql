@@ -0,0 +1,32 @@
+-- Load every table in dependency order. Run from this directory:
+--   mysql --local-infile=1 <database> < load_mysql.sql
+SET FOREIGN_KEY_CHECKS = 0;
+SET UNIQUE_CHECKS = 0;
+SET autocommit = 0;
+
+SOURCE dim_date.sql;
+COMMIT;
+SOURCE dim_specialty.sql;
+COMMIT;
+SOURCE dim_department.sql;
+COMMIT;
+SOURCE dim_encounter_type.sql;
+COMMIT;
+SOURCE dim_diagnosis.sql;
+COMMIT;
+SOURCE dim_procedure.sql;
+COMMIT;
+SOURCE dim_patient.sql;
+COMMIT;
+SOURCE dim_provider.sql;
+COMMIT;
+SOURCE fact_encounters.sql;
+COMMIT;
+SOURCE bridge_diagnoses.sql;
+COMMIT;
+SOURCE bridge_procedures.sql;
+COMMIT;
+
+SET UNIQUE_CHECKS = 1;
+SET FOREIGN_KEY_CHECKS = 1;
+SET autocommit = 1;
@@ -0,0 +1,37 @@
+-- Load every table in dependency order. Run from this directory:
+--   psql -v ON_ERROR_STOP=1 -d <database> -f load_postgres.sql
+\set ON_ERROR_STOP on
+
+BEGIN;
+\i dim_date.sql
+COMMIT;
+BEGIN;
+\i dim_specialty.sql
+COMMIT;
+BEGIN;
+\i dim_department.sql
+COMMIT;
+BEGIN;
+\i dim_encounter_type.sql
+COMMIT;
+BEGIN;
+\i dim_diagnosis.sql
+COMMIT;
+BEGIN;
+\i dim_procedure.sql
+COMMIT;
+BEGIN;
+\i dim_patient.sql
+COMMIT;
+BEGIN;
+\i dim_provider.sql
+COMMIT;
+BEGIN;
+\i fact_encounters.sql
+COMMIT;
+BEGIN;
+\i bridge_diagnoses.sql
+COMMIT;
+BEGIN;
+\i bridge_procedures.sql
+COMMIT;
@@ -0,0 +1,30 @@
+-- Load every table in dependency order. Run from this directory:
+--   mysql --local-infile=1 <database> < load_mysql.sql
+SET FOREIGN_KEY_CHECKS = 0;
+SET UNIQUE_CHECKS = 0;
+SET autocommit = 0;
+
+SOURCE specialties.sql;
+COMMIT;
+SOURCE departments.sql;
+COMMIT;
+SOURCE diagnoses.sql;
+COMMIT;
+SOURCE procedures.sql;
+COMMIT;
+SOURCE patients.sql;
+COMMIT;
+SOURCE providers.sql;
+COMMIT;
+SOURCE encounters.sql;
+COMMIT;
+SOURCE encounter_diagnoses.sql;
+COMMIT;
+SOURCE encounter_procedures.sql;
+COMMIT;
+SOURCE billing.sql;
+COMMIT;
+
+SET UNIQUE_CHECKS = 1;
+SET FOREIGN_KEY_CHECKS = 1;
+SET autocommit = 1;
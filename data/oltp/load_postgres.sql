@@ -0,0 +1,34 @@
+-- Load every table in dependency order. Run from this directory:
+--   psql -v ON_ERROR_STOP=1 -d <database> -f load_postgres.sql
+\set ON_ERROR_STOP on
+
+BEGIN;
+\i specialties.sql
+COMMIT;
+BEGIN;
+\i departments.sql
+COMMIT;
+BEGIN;
+\i diagnoses.sql
+COMMIT;
+BEGIN;
+\i procedures.sql
+COMMIT;
+BEGIN;
+\i patients.sql
+COMMIT;
+BEGIN;
+\i providers.sql
+COMMIT;
+BEGIN;
+\i encounters.sql
+COMMIT;
+BEGIN;
+\i encounter_diagnoses.sql
+COMMIT;
+BEGIN;
+\i encounter_procedures.sql
+COMMIT;
+BEGIN;
+\i billing.sql
+COMMIT;
@@ -7,6 +7,8 @@
 -- ============================================================================
 
 -- Drop tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS agg_readmission_specialty_month;
+DROP TABLE IF EXISTS agg_monthly_specialty;
 DROP TABLE IF EXISTS bridge_encounter_procedures;
 DROP TABLE IF EXISTS bridge_encounter_diagnoses;
 DROP TABLE IF EXISTS fact_encounters;
@@ -331,3 +333,48 @@ CREATE TABLE bridge_encounter_procedures (
     INDEX idx_bridge_proc_procedure (procedure_key),
     UNIQUE KEY uk_encounter_procedure (encounter_key, procedure_key)
 );
+
+-- ============================================================================
+-- SUMMARY AGGREGATES
+-- ============================================================================
+-- Dashboard rollups of fact_encounters, written by the OLAP build in the same
+-- pass as the fact. All measures are additive: incremental loads append delta
+-- rows (possibly negative) for a grain instead of updating it, so always read
+-- them with SUM(...) GROUP BY. Ratios are derived from the sums, e.g.
+--   readmission rate = SUM(readmissions) / SUM(inpatient_encounters)
+--   average allowed  = SUM(total_allowed_amount) / SUM(claim_count)
+-- Distinct counts are not additive, so there is no unique patients measure;
+-- count distinct patient_key on fact_encounters instead.
+-- ============================================================================
+CREATE TABLE agg_monthly_specialty (
+    encounter_year INT NOT NULL,
+    encounter_month INT NOT NULL,
+    specialty_key INT,                                -- FK to dim_specialty
+    specialty_name VARCHAR(100),                      -- DENORMALIZED
+    encounter_type_key INT NOT NULL,                  -- FK to dim_encounter_type
+    encounter_type VARCHAR(50) NOT NULL,              -- DENORMALIZED
+    encounter_count INT NOT NULL DEFAULT 0,
+    diagnosis_count INT NOT NULL DEFAULT 0,
+    procedure_count INT NOT NULL DEFAULT 0,
+    claim_count INT NOT NULL DEFAULT 0,
+    total_claim_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    total_allowed_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    total_length_of_stay_hours INT NOT NULL DEFAULT 0,
+    
+    INDEX idx_agg_monthly_grain (encounter_year, encounter_month, specialty_key, encounter_type_key),
+    INDEX idx_agg_monthly_specialty (specialty_name, encounter_year, encounter_month)
+);
+
+CREATE TABLE agg_readmission_specialty_month (
+    encounter_year INT NOT NULL,
+    encounter_month INT NOT NULL,
+    specialty_key INT,                                -- FK to dim_specialty
+    specialty_name VARCHAR(100),                      -- DENORMALIZED
+    inpatient_encounters INT NOT NULL DEFAULT 0,
+    readmissions INT NOT NULL DEFAULT 0,              -- 30-day readmissions
+    total_days_since_last_visit INT NOT NULL DEFAULT 0,  -- Over the readmissions
+    total_length_of_stay_days INT NOT NULL DEFAULT 0,
+    
+    INDEX idx_agg_readmission_grain (encounter_year, encounter_month, specialty_key),
+    INDEX idx_agg_readmission_specialty (specialty_name)
+);
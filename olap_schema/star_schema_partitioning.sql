@@ -0,0 +1,123 @@
+-- ============================================================================
+-- FACT_ENCOUNTERS MONTHLY RANGE PARTITIONS (run after star_schema.sql)
+-- ============================================================================
+-- Generated by generate_olap_data.py --partition-by month for 2020-01 .. 2026-12.
+-- One partition per month of encounter_date_key (YYYYMMDD), named like the
+-- partitions/fact_encounters.pYYYY_MM data files, so each file loads into one
+-- partition and a query over one month only reads that partition.
+--
+-- MySQL requires the partitioning column in every unique key of a partitioned
+-- table and supports no foreign keys to or from partitioned InnoDB tables:
+-- the primary key becomes (encounter_key, encounter_date_key), encounter_id
+-- is unique together with its date, and the foreign keys of the fact and of
+-- the bridges that reference it are dropped (the ETL resolves every key).
+-- The bridges have no encounter date to partition on; their data files are
+-- split by their encounter's month so a month of fact and bridges loads as a unit.
+-- ============================================================================
+
+ALTER TABLE bridge_encounter_diagnoses DROP FOREIGN KEY bridge_encounter_diagnoses_ibfk_1;
+ALTER TABLE bridge_encounter_procedures DROP FOREIGN KEY bridge_encounter_procedures_ibfk_1;
+ALTER TABLE fact_encounters
+    DROP FOREIGN KEY fact_encounters_ibfk_1,
+    DROP FOREIGN KEY fact_encounters_ibfk_2,
+    DROP FOREIGN KEY fact_encounters_ibfk_3,
+    DROP FOREIGN KEY fact_encounters_ibfk_4,
+    DROP FOREIGN KEY fact_encounters_ibfk_5,
+    DROP FOREIGN KEY fact_encounters_ibfk_6,
+    DROP FOREIGN KEY fact_encounters_ibfk_7,
+    DROP FOREIGN KEY fact_encounters_ibfk_8;
+ALTER TABLE fact_encounters
+    DROP INDEX encounter_id,
+    ADD UNIQUE KEY uk_fact_encounter_id (encounter_id, encounter_date_key),
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (encounter_key, encounter_date_key);
+
+ALTER TABLE fact_encounters
+PARTITION BY RANGE (encounter_date_key) (
+    PARTITION p_before VALUES LESS THAN (20200101),
+    PARTITION p2020_01 VALUES LESS THAN (20200201),
+    PARTITION p2020_02 VALUES LESS THAN (20200301),
+    PARTITION p2020_03 VALUES LESS THAN (20200401),
+    PARTITION p2020_04 VALUES LESS THAN (20200501),
+    PARTITION p2020_05 VALUES LESS THAN (20200601),
+    PARTITION p2020_06 VALUES LESS THAN (20200701),
+    PARTITION p2020_07 VALUES LESS THAN (20200801),
+    PARTITION p2020_08 VALUES LESS THAN (20200901),
+    PARTITION p2020_09 VALUES LESS THAN (20201001),
+    PARTITION p2020_10 VALUES LESS THAN (20201101),
+    PARTITION p2020_11 VALUES LESS THAN (20201201),
+    PARTITION p2020_12 VALUES LESS THAN (20210101),
+    PARTITION p2021_01 VALUES LESS THAN (20210201),
+    PARTITION p2021_02 VALUES LESS THAN (20210301),
+    PARTITION p2021_03 VALUES LESS THAN (20210401),
+    PARTITION p2021_04 VALUES LESS THAN (20210501),
+    PARTITION p2021_05 VALUES LESS THAN (20210601),
+    PARTITION p2021_06 VALUES LESS THAN (20210701),
+    PARTITION p2021_07 VALUES LESS THAN (20210801),
+    PARTITION p2021_08 VALUES LESS THAN (20210901),
+    PARTITION p2021_09 VALUES LESS THAN (20211001),
+    PARTITION p2021_10 VALUES LESS THAN (20211101),
+    PARTITION p2021_11 VALUES LESS THAN (20211201),
+    PARTITION p2021_12 VALUES LESS THAN (20220101),
+    PARTITION p2022_01 VALUES LESS THAN (20220201),
+    PARTITION p2022_02 VALUES LESS THAN (20220301),
+    PARTITION p2022_03 VALUES LESS THAN (20220401),
+    PARTITION p2022_04 VALUES LESS THAN (20220501),
+    PARTITION p2022_05 VALUES LESS THAN (20220601),
+    PARTITION p2022_06 VALUES LESS THAN (20220701),
+    PARTITION p2022_07 VALUES LESS THAN (20220801),
+    PARTITION p2022_08 VALUES LESS THAN (20220901),
+    PARTITION p2022_09 VALUES LESS THAN (20221001),
+    PARTITION p2022_10 VALUES LESS THAN (20221101),
+    PARTITION p2022_11 VALUES LESS THAN (20221201),
+    PARTITION p2022_12 VALUES LESS THAN (20230101),
+    PARTITION p2023_01 VALUES LESS THAN (20230201),
+    PARTITION p2023_02 VALUES LESS THAN (20230301),
+    PARTITION p2023_03 VALUES LESS THAN (20230401),
+    PARTITION p2023_04 VALUES LESS THAN (20230501),
+    PARTITION p2023_05 VALUES LESS THAN (20230601),
+    PARTITION p2023_06 VALUES LESS THAN (20230701),
+    PARTITION p2023_07 VALUES LESS THAN (20230801),
+    PARTITION p2023_08 VALUES LESS THAN (20230901),
+    PARTITION p2023_09 VALUES LESS THAN (20231001),
+    PARTITION p2023_10 VALUES LESS THAN (20231101),
+    PARTITION p2023_11 VALUES LESS THAN (20231201),
+    PARTITION p2023_12 VALUES LESS THAN (20240101),
+    PARTITION p2024_01 VALUES LESS THAN (20240201),
+    PARTITION p2024_02 VALUES LESS THAN (20240301),
+    PARTITION p2024_03 VALUES LESS THAN (20240401),
+    PARTITION p2024_04 VALUES LESS THAN (20240501),
+    PARTITION p2024_05 VALUES LESS THAN (20240601),
+    PARTITION p2024_06 VALUES LESS THAN (20240701),
+    PARTITION p2024_07 VALUES LESS THAN (20240801),
+    PARTITION p2024_08 VALUES LESS THAN (20240901),
+    PARTITION p2024_09 VALUES LESS THAN (20241001),
+    PARTITION p2024_10 VALUES LESS THAN (20241101),
+    PARTITION p2024_11 VALUES LESS THAN (20241201),
+    PARTITION p2024_12 VALUES LESS THAN (20250101),
+    PARTITION p2025_01 VALUES LESS THAN (20250201),
+    PARTITION p2025_02 VALUES LESS THAN (20250301),
+    PARTITION p2025_03 VALUES LESS THAN (20250401),
+    PARTITION p2025_04 VALUES LESS THAN (20250501),
+    PARTITION p2025_05 VALUES LESS THAN (20250601),
+    PARTITION p2025_06 VALUES LESS THAN (20250701),
+    PARTITION p2025_07 VALUES LESS THAN (20250801),
+    PARTITION p2025_08 VALUES LESS THAN (20250901),
+    PARTITION p2025_09 VALUES LESS THAN (20251001),
+    PARTITION p2025_10 VALUES LESS THAN (20251101),
+    PARTITION p2025_11 VALUES LESS THAN (20251201),
+    PARTITION p2025_12 VALUES LESS THAN (20260101),
+    PARTITION p2026_01 VALUES LESS THAN (20260201),
+    PARTITION p2026_02 VALUES LESS THAN (20260301),
+    PARTITION p2026_03 VALUES LESS THAN (20260401),
+    PARTITION p2026_04 VALUES LESS THAN (20260501),
+    PARTITION p2026_05 VALUES LESS THAN (20260601),
+    PARTITION p2026_06 VALUES LESS THAN (20260701),
+    PARTITION p2026_07 VALUES LESS THAN (20260801),
+    PARTITION p2026_08 VALUES LESS THAN (20260901),
+    PARTITION p2026_09 VALUES LESS THAN (20261001),
+    PARTITION p2026_10 VALUES LESS THAN (20261101),
+    PARTITION p2026_11 VALUES LESS THAN (20261201),
+    PARTITION p2026_12 VALUES LESS THAN (20270101),
+    PARTITION p_after VALUES LESS THAN MAXVALUE
+);
@@ -0,0 +1,185 @@
+"""
+Summary Aggregates
+==================
+Dashboard-sized rollups of fact_encounters, accumulated while the fact rows
+stream to disk (no second pass over the fact):
+
+- agg_monthly_specialty: one row per (encounter_year, encounter_month,
+  specialty_key, encounter_type_key), for Q1 (monthly encounters) and Q4
+  (revenue by specialty and month)
+- agg_readmission_specialty_month: one row per (encounter_year,
+  encounter_month, specialty_key) over inpatient encounters, for Q3
+
+Every measure is an additive count or sum, so rows can be rolled up over any
+subset of the grain and ratios are derived at query time:
+
+    average allowed amount  = SUM(total_allowed_amount) / SUM(claim_count)
+    readmission rate        = SUM(readmissions) / SUM(inpatient_encounters)
+    average readmission gap = SUM(total_days_since_last_visit) / SUM(readmissions)
+
+Incremental runs append delta rows (late claims of earlier encounters,
+readmission flags that changed, including negative ones) instead of
+rewriting the tables, so readers always aggregate with SUM(...) GROUP BY.
+Distinct counts (unique patients) do not add up over grain rows or delta
+rows, and an exact one would have to hold every (grain, patient) pair until
+the build ends, so they are left to queries on fact_encounters.
+
+Amounts are summed in integer cents so the totals do not drift.
+"""
+
+from output_formats import ColumnBlock
+
+AGGREGATE_COLUMNS = {
+    "agg_monthly_specialty": (
+        "encounter_year", "encounter_month", "specialty_key", "specialty_name",
+        "encounter_type_key", "encounter_type", "encounter_count", "diagnosis_count", "procedure_count",
+        "claim_count", "total_claim_amount", "total_allowed_amount", "total_length_of_stay_hours",
+    ),
+    "agg_readmission_specialty_month": (
+        "encounter_year", "encounter_month", "specialty_key", "specialty_name",
+        "inpatient_encounters", "readmissions", "total_days_since_last_visit",
+        "total_length_of_stay_days",
+    ),
+}
+
+# fact_encounters columns the aggregates read, in the order _add unpacks them
+_FACT_COLUMNS = (
+    "encounter_year", "encounter_month", "specialty_key", "specialty_name",
+    "encounter_type_key", "encounter_type", "is_inpatient",
+    "diagnosis_count", "procedure_count", "claim_count", "total_claim_amount",
+    "total_allowed_amount", "length_of_stay_hours", "length_of_stay_days",
+    "days_since_last_visit",
+)
+
+
+def cents(amount):
+    return round(float(amount) * 100)
+
+
+def _amount(total_cents):
+    """Cents back to a DECIMAL(12, 2) value; whole amounts render as ints."""
+    return total_cents // 100 if total_cents % 100 == 0 else total_cents / 100
+
+
+class FactAggregates:
+    """Running agg_monthly_specialty / agg_readmission_specialty_month totals.
+
+    Wrap a fact row stream in ``observe`` (tuples or ColumnBlocks in
+    ``fact_columns`` order) and write ``monthly_rows`` /
+    ``readmission_rows`` once it has been drained. Partial aggregates (one
+    per shard) combine with ``merge``, and ``dump`` / ``load`` carry them
+    through a run checkpoint.
+    """
+
+    __slots__ = ("indexes", "monthly", "readmission")
+
+    def __init__(self, fact_columns):
+        self.indexes = tuple(fact_columns.index(column) for column in _FACT_COLUMNS)
+        # (year, month, specialty_key, type_key) -> [specialty_name, type_name, encounters,
+        #   diagnoses, procedures, claims, claim cents, allowed cents, LOS hours]
+        self.monthly = {}
+        # (year, month, specialty_key) -> [specialty_name, inpatient encounters, readmissions,
+        #   days since last visit, LOS days]
+        self.readmission = {}
+
+    def observe(self, rows):
+        """Yield ``rows`` unchanged, adding each fact row to the totals."""
+        indexes = self.indexes
+        for row in rows:
+            if type(row) is ColumnBlock:
+                for values in zip(*(row.columns[i] for i in indexes)):
+                    self._add(*values)
+            else:
+                self._add(*(row[i] for i in indexes))
+            yield row
+
+    def _monthly_totals(self, key, specialty_name, type_name):
+        totals = self.monthly.get(key)
+        if totals is None:
+            totals = self.monthly[key] = [specialty_name, type_name, 0, 0, 0, 0, 0, 0, 0]
+        return totals
+
+    def _add(self, year, month, specialty_key, specialty_name, type_key, type_name, is_inpatient,
+             diagnoses, procedures, claims, claim_amount, allowed_amount, los_hours, los_days, days_since_last):
+        totals = self._monthly_totals((year, month, specialty_key, type_key), specialty_name, type_name)
+        totals[2] += 1
+        totals[3] += diagnoses
+        totals[4] += procedures
+        totals[5] += claims
+        totals[6] += cents(claim_amount)
+        totals[7] += cents(allowed_amount)
+        totals[8] += los_hours or 0
+        if is_inpatient:
+            self.add_readmission_change(year, month, specialty_key, specialty_name, None, days_since_last, los_days, 1)
+
+    def add_claim_change(self, year, month, specialty_key, specialty_name, type_key, type_name,
+                         claims, claim_amount, allowed_amount):
+        """Add late claims of an earlier encounter to its monthly revenue totals."""
+        totals = self._monthly_totals((year, month, specialty_key, type_key), specialty_name, type_name)
+        totals[5] += claims
+        totals[6] += cents(claim_amount)
+        totals[7] += cents(allowed_amount)
+
+    def add_readmission_change(self, year, month, specialty_key, specialty_name, old_days, new_days,
+                               los_days=0, encounters=0):
+        """Add an inpatient encounter, or re-flag an earlier one (old -> new days since last visit)."""
+        key = (year, month, specialty_key)
+        totals = self.readmission.get(key)
+        if totals is None:
+            totals = self.readmission[key] = [specialty_name, 0, 0, 0, 0]
+        totals[1] += encounters
+        totals[2] += (new_days is not None) - (old_days is not None)
+        totals[3] += (new_days or 0) - (old_days or 0)
+        totals[4] += los_days or 0
+
+    def merge(self, other):
+        """Add another FactAggregates' totals to this one."""
+        pairs = ((self.monthly, other.monthly, 2), (self.readmission, other.readmission, 1))
+        for mine, theirs, first_measure in pairs:
+            for key, totals in theirs.items():
+                current = mine.get(key)
+                if current is None:
+                    mine[key] = list(totals)
+                else:
+                    for i in range(first_measure, len(totals)):
+                        current[i] += totals[i]
+
+    def dump(self):
+        """The totals as JSON-able lists (NumPy scalars become ints)."""
+        return {
+            name: [[[_plain(value) for value in key], [_plain(value) for value in totals]]
+                   for key, totals in table.items()]
+            for name, table in (("monthly", self.monthly), ("readmission", self.readmission))
+        }
+
+    def load(self, totals):
+        """Add totals saved by ``dump`` (as ``merge`` does); returns self."""
+        saved = FactAggregates(_FACT_COLUMNS)
+        saved.monthly = {tuple(key): values for key, values in totals["monthly"]}
+        saved.readmission = {tuple(key): values for key, values in totals["readmission"]}
+        self.merge(saved)
+        return self
+
+    def monthly_rows(self):
+        """agg_monthly_specialty rows, in grain order."""
+        for key in sorted(self.monthly, key=_grain_order):
+            year, month, specialty_key, type_key = key
+            name, type_name, encounters, diagnoses, procedures, claims, claimed, allowed, hours = self.monthly[key]
+            yield (
+                year, month, specialty_key, name, type_key, type_name, encounters,
+                diagnoses, procedures, claims, _amount(claimed), _amount(allowed), hours,
+            )
+
+    def readmission_rows(self):
+        """agg_readmission_specialty_month rows, in grain order."""
+        for key in sorted(self.readmission, key=_grain_order):
+            yield key + tuple(self.readmission[key])
+
+
+def _plain(value):
+    return value if value is None or isinstance(value, str) else int(value)
+
+
+def _grain_order(key):
+    # Unknown specialties (None keys) sort last
+    return tuple((value is None, value or 0) for value in key)
@@ -0,0 +1,470 @@
+"""
+OLTP vs Star Schema Query Benchmark
+===================================
+Measures the four business questions from query_analysis.txt (OLTP joins)
+and star_schema_queries.txt (zero-join star schema) instead of estimating
+them.
+
+For every scale factor, both datasets are loaded into in-memory SQLite
+databases built from oltp_schema/oltp_schema.sql and
+olap_schema/star_schema.sql (translated by sqlite_schema.py):
+
+- column types map to SQLite affinities; PRIMARY KEY columns become rowid
+  keys (clustered, as in InnoDB)
+- every INDEX / UNIQUE KEY is created after the load, plus an index on each
+  FOREIGN KEY column (InnoDB creates those implicitly). Column-level UNIQUE
+  constraints become plain indexes, because scaled copies repeat natural
+  codes such as mrn
+- scale factor N loads the data N times, offsetting the ids/keys of the
+  patient, provider and encounter entities (and the rows hanging off them)
+  per copy, while the small reference tables are loaded once
+
+Each query form then runs ``--warmup`` untimed and ``--repetitions`` timed
+executions (fetching every row). The JSON report has per-form percentiles,
+the query plan and result size, and the OLTP/star speedup at the median, so
+schema or index regressions show up as numbers.
+
+The queries are the documented ones translated to SQLite: YEAR()/MONTH()
+become strftime(), DATEDIFF() becomes a julianday() difference.
+
+    python scripts/benchmark_queries.py --scale-factors 1,2,4 --output benchmark_report.json
+"""
+
+import argparse
+import json
+import platform
+import re
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+
+from oltp_source import read_table
+from output_formats import generated_at
+from sqlite_schema import parse_schema
+
+ROOT_DIR = Path(__file__).parent.parent
+
+OLTP_SCHEMA = ROOT_DIR / "oltp_schema" / "oltp_schema.sql"
+STAR_SCHEMA = ROOT_DIR / "olap_schema" / "star_schema.sql"
+
+# OLAP data files whose name differs from the table
+OLAP_FILE_STEMS = {
+    "bridge_encounter_diagnoses": "bridge_diagnoses",
+    "bridge_encounter_procedures": "bridge_procedures",
+}
+
+# Id/key columns offset per scaled copy. A table is copied when its primary
+# key is one of these; the offset of a column is the copy number times the
+# column's largest value, so foreign keys follow the rows they point at.
+SCALED_COLUMNS = {
+    "oltp": (
+        "patient_id", "provider_id", "encounter_id", "encounter_diagnosis_id",
+        "encounter_procedure_id", "billing_id",
+    ),
+    "star": (
+        "patient_key", "patient_id", "provider_key", "provider_id",
+        "encounter_key", "encounter_id", "bridge_id",
+    ),
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+DEFAULT_SCALE_FACTORS = (1, 2, 4)
+
+# (name, title, OLTP query, star schema query, summary aggregate query); the
+# aggregate form reads the agg_* tables with SUM(...) GROUP BY (they hold delta rows;
+# Q1's has no unique patients, which the aggregates do not keep)
+QUERIES = (
+    (
+        "Q1", "Monthly encounters by specialty",
+        """
+        SELECT CAST(strftime('%Y', e.encounter_date) AS INTEGER) AS year,
+               CAST(strftime('%m', e.encounter_date) AS INTEGER) AS month,
+               s.specialty_name, e.encounter_type,
+               COUNT(*) AS total_encounters, COUNT(DISTINCT e.patient_id) AS unique_patients
+        FROM encounters e
+        JOIN providers p ON e.provider_id = p.provider_id
+        JOIN specialties s ON p.specialty_id = s.specialty_id
+        GROUP BY 1, 2, s.specialty_name, e.encounter_type
+        ORDER BY year, month, specialty_name
+        """,
+        """
+        SELECT encounter_year AS year, encounter_month AS month, encounter_month_name AS month_name,
+               specialty_name, encounter_type,
+               COUNT(*) AS total_encounters, COUNT(DISTINCT patient_key) AS unique_patients
+        FROM fact_encounters
+        GROUP BY encounter_year, encounter_month, encounter_month_name, specialty_name, encounter_type
+        ORDER BY encounter_year, encounter_month, specialty_name
+        """,
+        """
+        SELECT encounter_year AS year, encounter_month AS month, specialty_name, encounter_type,
+               SUM(encounter_count) AS total_encounters
+        FROM agg_monthly_specialty
+        GROUP BY encounter_year, encounter_month, specialty_name, encounter_type
+        ORDER BY encounter_year, encounter_month, specialty_name
+        """,
+    ),
+    (
+        "Q2", "Top diagnosis-procedure pairs",
+        """
+        SELECT d.icd10_code, d.icd10_description, pr.cpt_code, pr.cpt_description,
+               COUNT(DISTINCT ed.encounter_id) AS encounter_count
+        FROM encounter_diagnoses ed
+        JOIN diagnoses d USING (diagnosis_id)
+        JOIN encounter_procedures ep ON ed.encounter_id = ep.encounter_id
+        JOIN procedures pr USING (procedure_id)
+        GROUP BY d.icd10_code, d.icd10_description, pr.cpt_code, pr.cpt_description
+        ORDER BY encounter_count DESC
+        LIMIT 20
+        """,
+        """
+        SELECT primary_icd10_code AS icd10_code, primary_icd10_description AS diagnosis, encounter_type,
+               COUNT(*) AS encounter_count, SUM(procedure_count) AS total_procedures
+        FROM fact_encounters
+        WHERE primary_icd10_code IS NOT NULL
+        GROUP BY primary_icd10_code, primary_icd10_description, encounter_type
+        ORDER BY encounter_count DESC
+        LIMIT 20
+        """,
+        None,
+    ),
+    (
+        "Q2-detail", "Top diagnosis-procedure pairs (star: primary diagnosis x procedure codes)",
+        None,
+        """
+        SELECT f.primary_icd10_code, f.primary_icd10_description, proc.cpt_code, proc.cpt_description,
+               COUNT(*) AS pair_count
+        FROM fact_encounters f
+        JOIN bridge_encounter_procedures bep ON f.encounter_key = bep.encounter_key
+        JOIN dim_procedure proc ON bep.procedure_key = proc.procedure_key
+        WHERE f.primary_icd10_code IS NOT NULL
+        GROUP BY f.primary_icd10_code, f.primary_icd10_description, proc.cpt_code, proc.cpt_description
+        ORDER BY pair_count DESC
+        LIMIT 20
+        """,
+        None,
+    ),
+    (
+        "Q3", "30-day readmission rate by specialty",
+        """
+        WITH inpatient_with_prev AS (
+            SELECT e.encounter_id, e.patient_id, e.encounter_date, e.discharge_date, p.specialty_id,
+                   LAG(e.discharge_date) OVER (PARTITION BY e.patient_id ORDER BY e.encounter_date)
+                       AS prev_discharge_date
+            FROM encounters e
+            JOIN providers p USING (provider_id)
+            WHERE e.encounter_type = 'Inpatient'
+        ),
+        readmission_flags AS (
+            SELECT encounter_id, specialty_id,
+                   CASE WHEN prev_discharge_date IS NOT NULL
+                         AND julianday(date(encounter_date)) - julianday(date(prev_discharge_date)) <= 30
+                        THEN 1 ELSE 0 END AS is_readmission
+            FROM inpatient_with_prev
+        )
+        SELECT s.specialty_name, COUNT(*) AS total_discharges, SUM(is_readmission) AS readmissions,
+               ROUND(SUM(is_readmission) * 100.0 / COUNT(*), 2) AS readmission_rate_pct
+        FROM readmission_flags rf
+        JOIN specialties s USING (specialty_id)
+        GROUP BY s.specialty_name
+        ORDER BY readmission_rate_pct DESC
+        """,
+        """
+        SELECT specialty_name, COUNT(*) AS total_inpatient_discharges,
+               SUM(CASE WHEN is_readmission = 1 THEN 1 ELSE 0 END) AS readmissions,
+               ROUND(SUM(CASE WHEN is_readmission = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2)
+                   AS readmission_rate_pct
+        FROM fact_encounters
+        WHERE is_inpatient = 1
+        GROUP BY specialty_name
+        ORDER BY readmission_rate_pct DESC
+        """,
+        """
+        SELECT specialty_name, SUM(inpatient_encounters) AS total_inpatient_discharges,
+               SUM(readmissions) AS readmissions,
+               ROUND(SUM(readmissions) * 100.0 / SUM(inpatient_encounters), 2) AS readmission_rate_pct
+        FROM agg_readmission_specialty_month
+        GROUP BY specialty_name
+        ORDER BY readmission_rate_pct DESC
+        """,
+    ),
+    (
+        "Q4", "Revenue by specialty and month",
+        """
+        SELECT CAST(strftime('%Y', b.claim_date) AS INTEGER) AS year,
+               CAST(strftime('%m', b.claim_date) AS INTEGER) AS month,
+               s.specialty_name, COUNT(*) AS claim_count,
+               SUM(b.claim_amount) AS total_claimed, SUM(b.allowed_amount) AS total_allowed,
+               ROUND(AVG(b.allowed_amount), 2) AS avg_allowed
+        FROM billing b
+        JOIN encounters e USING (encounter_id)
+        JOIN providers p USING (provider_id)
+        JOIN specialties s USING (specialty_id)
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, total_allowed DESC
+        """,
+        """
+        SELECT encounter_year AS year, encounter_month AS month, encounter_month_name AS month_name,
+               specialty_name, COUNT(*) AS encounter_count,
+               SUM(total_claim_amount) AS total_claimed, SUM(total_allowed_amount) AS total_allowed,
+               ROUND(AVG(total_allowed_amount), 2) AS avg_allowed
+        FROM fact_encounters
+        GROUP BY encounter_year, encounter_month, encounter_month_name, specialty_name
+        ORDER BY encounter_year, encounter_month, total_allowed DESC
+        """,
+        """
+        SELECT encounter_year AS year, encounter_month AS month, specialty_name,
+               SUM(encounter_count) AS encounter_count,
+               SUM(total_claim_amount) AS total_claimed, SUM(total_allowed_amount) AS total_allowed,
+               ROUND(SUM(total_allowed_amount) / SUM(encounter_count), 2) AS avg_allowed
+        FROM agg_monthly_specialty
+        GROUP BY encounter_year, encounter_month, specialty_name
+        ORDER BY encounter_year, encounter_month, total_allowed DESC
+        """,
+    ),
+)
+
+
+# agg_* tables read by a summary aggregate query
+_AGG_TABLE_RE = re.compile(r"FROM (agg_\w+)")
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def _load_rows(connection, table, rows):
+    """Insert ``rows`` into ``table``; short rows fill the leading columns only
+    (older data files may predate trailing columns)."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    columns = [column for column, _ in table.columns][:len(first)]
+    cursor = connection.executemany(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        _chain_first(first, rows),
+    )
+    return cursor.rowcount
+
+
+def _chain_first(first, rows):
+    yield first
+    yield from rows
+
+
+def _scale_up(connection, table, scale, scaled_columns):
+    """Append ``scale - 1`` offset copies of a loaded table (no-op for reference tables).
+
+    ``scaled_columns`` maps column -> largest base value (the per-copy offset).
+    Tables without a primary key are the additive summary aggregates: their
+    rows are copied unchanged, which scales every SUM over them by ``scale``.
+    """
+    if scale <= 1:
+        return
+    if table.primary_key is None:
+        base_rows = connection.execute(f"SELECT MAX(rowid) FROM {table.name}").fetchone()[0] or 0
+        for _ in range(1, scale):
+            connection.execute(f"INSERT INTO {table.name} SELECT * FROM {table.name} WHERE rowid <= {base_rows}")
+        return
+    if table.primary_key not in scaled_columns:
+        return
+    columns = [column for column, _ in table.columns]
+    spans = {column: scaled_columns[column] for column in columns if column in scaled_columns}
+    for copy in range(1, scale):
+        select = ", ".join(
+            f"{column} + {copy * spans[column]}" if column in spans else column for column in columns
+        )
+        connection.execute(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) "
+            f"SELECT {select} FROM {table.name} WHERE {table.primary_key} <= {spans[table.primary_key]}"
+        )
+
+
+def load_database(schema_path, source, file_stems, scale, scaled_columns):
+    """Build an in-memory SQLite database from a DDL file and a data source.
+
+    Returns (connection, {table: rows}, load seconds, index seconds). Tables
+    without a data file (e.g. the summary aggregates of an older build) stay empty.
+    """
+    connection = sqlite3.connect(":memory:")
+    tables = parse_schema(schema_path)
+    started = time.perf_counter()
+    for table in tables:
+        connection.execute(table.create_statement())
+        try:
+            _load_rows(connection, table, read_table(source, file_stems.get(table.name, table.name)))
+        except FileNotFoundError:
+            pass
+
+    # Offsets are the largest base value of each scaled column over all tables
+    spans = {}
+    for table in tables:
+        for column, _ in table.columns:
+            if column in scaled_columns:
+                span = connection.execute(f"SELECT MAX({column}) FROM {table.name}").fetchone()[0] or 0
+                spans[column] = max(spans.get(column, 0), span)
+    for table in tables:
+        _scale_up(connection, table, scale, spans)
+    connection.commit()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for table in tables:
+        for statement in table.index_statements():
+            connection.execute(statement)
+    connection.execute("ANALYZE")
+    connection.commit()
+    index_seconds = time.perf_counter() - started
+
+    row_counts = {
+        table.name: connection.execute(f"SELECT COUNT(*) FROM {table.name}").fetchone()[0] for table in tables
+    }
+    return connection, row_counts, load_seconds, index_seconds
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def percentile(sorted_values, pct):
+    """Linearly interpolated percentile of an ascending list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * pct / 100.0
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def time_query(connection, sql, warmup, repetitions):
+    """Run ``sql`` ``warmup`` times untimed, then time ``repetitions`` runs.
+
+    Returns the timing summary (milliseconds), result row count and query plan.
+    """
+    for _ in range(warmup):
+        connection.execute(sql).fetchall()
+    timings = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        rows = connection.execute(sql).fetchall()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    timings.sort()
+    summary = {
+        "min_ms": timings[0],
+        "mean_ms": statistics.fmean(timings),
+        "stdev_ms": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "max_ms": timings[-1],
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = percentile(timings, pct)
+    summary = {name: round(value, 4) for name, value in summary.items()}
+    summary["rows"] = len(rows)
+    summary["plan"] = [detail for _, _, _, detail in connection.execute("EXPLAIN QUERY PLAN " + sql)]
+    return summary
+
+
+def run_benchmark(oltp_path, olap_dir, scale_factors, warmup, repetitions, query_names=None):
+    """Benchmark every query at every scale factor; returns the report dict."""
+    report = {
+        "generated": generated_at(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "oltp_path": str(oltp_path),
+        "olap_dir": str(olap_dir),
+        "warmup": warmup,
+        "repetitions": repetitions,
+        "scales": [],
+    }
+    queries = [query for query in QUERIES if query_names is None or query[0] in query_names]
+    for scale in scale_factors:
+        print(f"\nScale factor {scale}:")
+        oltp, oltp_rows, oltp_load, oltp_index = load_database(
+            OLTP_SCHEMA, oltp_path, {}, scale, SCALED_COLUMNS["oltp"]
+        )
+        star, star_rows, star_load, star_index = load_database(
+            STAR_SCHEMA, olap_dir, OLAP_FILE_STEMS, scale, SCALED_COLUMNS["star"]
+        )
+        print(f"  Loaded OLTP: {oltp_rows['encounters']:,} encounters "
+              f"({oltp_load:.2f}s load, {oltp_index:.2f}s indexes)")
+        print(f"  Loaded star: {star_rows['fact_encounters']:,} facts "
+              f"({star_load:.2f}s load, {star_index:.2f}s indexes)")
+        results = {}
+        for name, title, oltp_sql, star_sql, agg_sql in queries:
+            result = {"title": title}
+            if oltp_sql is not None:
+                result["oltp"] = time_query(oltp, oltp_sql, warmup, repetitions)
+            result["star"] = time_query(star, star_sql, warmup, repetitions)
+            if agg_sql is not None and all(star_rows[table] for table in _AGG_TABLE_RE.findall(agg_sql)):
+                result["agg"] = time_query(star, agg_sql, warmup, repetitions)
+            line = f"  {name:<10} star p50 {result['star']['p50_ms']:9.3f} ms"
+            if oltp_sql is not None:
+                result["speedup_p50"] = round(result["oltp"]["p50_ms"] / max(result["star"]["p50_ms"], 1e-9), 2)
+                line += f"   oltp p50 {result['oltp']['p50_ms']:9.3f} ms   {result['speedup_p50']:.1f}x"
+            if "agg" in result:
+                line += f"   agg p50 {result['agg']['p50_ms']:9.3f} ms"
+            print(line)
+            results[name] = result
+        oltp.close()
+        star.close()
+        report["scales"].append({
+            "scale": scale,
+            "oltp": {
+                "rows": oltp_rows, "load_seconds": round(oltp_load, 4), "index_seconds": round(oltp_index, 4),
+            },
+            "star": {
+                "rows": star_rows, "load_seconds": round(star_load, 4), "index_seconds": round(star_index, 4),
+            },
+            "queries": results,
+        })
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the OLTP and star schema queries in SQLite.")
+    parser.add_argument("--oltp-path", type=Path, default=ROOT_DIR / "data" / "oltp",
+                        help="OLTP data directory or SQLite database (default: data/oltp)")
+    parser.add_argument("--olap-dir", type=Path, default=ROOT_DIR / "data" / "olap",
+                        help="OLAP data directory written by generate_olap_data.py (default: data/olap)")
+    parser.add_argument("--scale-factors", default=",".join(map(str, DEFAULT_SCALE_FACTORS)),
+                        help="comma-separated copies of the data to benchmark at (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=2,
+                        help="untimed runs per query before measuring (default: %(default)s)")
+    parser.add_argument("--repetitions", type=int, default=10,
+                        help="timed runs per query (default: %(default)s)")
+    parser.add_argument("--queries", default=None,
+                        help=f"comma-separated subset of {', '.join(query[0] for query in QUERIES)} (default: all)")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_report.json"),
+                        help="JSON report path (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        args.scale_factors = [int(value) for value in args.scale_factors.split(",")]
+    except ValueError:
+        parser.error("--scale-factors must be comma-separated integers")
+    if min(args.scale_factors) < 1:
+        parser.error("--scale-factors must be at least 1")
+    if args.repetitions < 1:
+        parser.error("--repetitions must be at least 1")
+    if args.queries is not None:
+        args.queries = set(args.queries.split(","))
+        unknown = args.queries - {query[0] for query in QUERIES}
+        if unknown:
+            parser.error(f"unknown queries: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=" * 70)
+    print("OLTP vs Star Schema Query Benchmark (SQLite)")
+    print("=" * 70)
+    report = run_benchmark(
+        args.oltp_path, args.olap_dir, args.scale_factors, args.warmup, args.repetitions, args.queries
+    )
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"\nReport written to: {args.output.absolute()}")
+
+
+if __name__ == "__main__":
+    main()
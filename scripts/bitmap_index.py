@@ -0,0 +1,492 @@
+"""
+Bitmap Indexes
+==============
+Compressed bitmap indexes over the low-cardinality columns of
+fact_encounters, and the filters, counts and breakdowns they answer without
+scanning a row.
+
+The readmission and type/specialty questions filter on columns with 2-25
+distinct values (is_readmission, is_inpatient, encounter_type,
+specialty_name, ...), which B-tree indexes such as idx_fact_readmission
+serve poorly. Here every (column, value) has a bitmap of the encounter_keys
+holding it, so a filter is an OR over a column's values, an AND across
+columns, and its count a popcount.
+
+Bitmaps are Roaring-style: keys are split by their high 16 bits into chunks
+of 65536, and each chunk is a container of the low 16 bits, either a sorted
+array of 16-bit values (at most 4096 keys, 2 bytes a key) or a 65536-bit
+bitmap (8 KB, held as a Python int, so AND/OR run over whole machine words).
+Operations go chunk by chunk and pick the cheaper representation of each
+result.
+
+generate_olap_data.py --bitmap-index fills the index from the fact stream as
+it is written (sharded builds merge the shards' indexes) and saves it next to
+the data as fact_encounters.bitmaps: one JSON header line (rows, and each
+column's values with the offset, size and cardinality of their bitmap)
+followed by the serialized bitmaps, decoded only when a query touches them.
+
+Run standalone to query an index, or to build one from existing output (any
+--format, sharded or partitioned):
+
+    python scripts/bitmap_index.py --olap-dir data/olap --build
+    python scripts/bitmap_index.py --where is_inpatient=1 --where is_readmission=1 --group-by specialty_name
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+from array import array
+from itertools import groupby
+from pathlib import Path
+
+from dictionary_encoding import DictionaryColumn
+from oltp_source import read_table
+from output_formats import ColumnBlock
+
+BITMAPS_FILENAME = "fact_encounters.bitmaps"
+
+# Indexed fact columns (2-25 distinct values each, the calendar's years at most)
+INDEXED_COLUMNS = (
+    "is_readmission", "is_inpatient", "encounter_type", "specialty_name", "department_name",
+    "encounter_year", "encounter_month", "is_weekend",
+)
+
+KEY_COLUMN = "encounter_key"
+
+# A column with more distinct values than this is not worth a bitmap each
+MAX_VALUES = 256
+
+# Largest array container; a denser chunk becomes a bitmap container
+ARRAY_MAX = 4096
+
+# Keys collected per value before they are folded into the bitmaps
+FLUSH_ROWS = 1 << 16
+
+_BITMAP_BYTES = 1 << 13
+_ARRAY, _BITMAP = 0, 1
+
+# Container header: high 16 bits, kind, cardinality - 1
+_CONTAINER = struct.Struct("<HBH")
+_COUNT = struct.Struct("<I")
+
+# Set bit positions of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+def _dense(lows):
+    data = bytearray(_BITMAP_BYTES)
+    for low in lows:
+        data[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(data, "little")
+
+
+def _sparse(bits):
+    lows = array("H")
+    for position, byte in enumerate(bits.to_bytes(_BITMAP_BYTES, "little")):
+        if byte:
+            base = position << 3
+            lows.extend(base + bit for bit in _BYTE_BITS[byte])
+    return lows
+
+
+def _cardinality(container):
+    return _popcount(container) if type(container) is int else len(container)
+
+
+def _and(a, b):
+    """Intersection of two containers, None if empty."""
+    if type(a) is int and type(b) is int:
+        bits = a & b
+        count = _popcount(bits)
+        if not count:
+            return None
+        return _sparse(bits) if count <= ARRAY_MAX else bits
+    if type(a) is int:
+        a, b = b, a
+    if type(b) is int:
+        data = b.to_bytes(_BITMAP_BYTES, "little")
+        lows = array("H", (low for low in a if data[low >> 3] >> (low & 7) & 1))
+    else:
+        lows = array("H", sorted(set(a).intersection(b)))
+    return lows or None
+
+
+def _or(a, b):
+    """Union of two containers."""
+    if type(a) is not int and type(b) is not int:
+        if not a or not b or a[-1] < b[0]:
+            lows = a + b if a else b
+        elif b[-1] < a[0]:
+            lows = b + a
+        else:
+            lows = array("H", sorted(set(a).union(b)))
+        return lows if len(lows) <= ARRAY_MAX else _dense(lows)
+    return (a if type(a) is int else _dense(a)) | (b if type(b) is int else _dense(b))
+
+
+class Bitmap:
+    """A set of non-negative 32-bit keys in Roaring-style containers."""
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks=None):
+        # high 16 bits -> array("H") of sorted low 16 bits, or int bitmap
+        self.chunks = {} if chunks is None else chunks
+
+    @classmethod
+    def from_keys(cls, keys):
+        """Bitmap of distinct ``keys`` (in any order)."""
+        chunks = {}
+        for high, group in groupby(sorted(keys), key=lambda key: key >> 16):
+            lows = array("H", (key & 0xFFFF for key in group))
+            chunks[high] = lows if len(lows) <= ARRAY_MAX else _dense(lows)
+        return cls(chunks)
+
+    def __len__(self):
+        return sum(_cardinality(container) for container in self.chunks.values())
+
+    def __iter__(self):
+        for high in sorted(self.chunks):
+            container = self.chunks[high]
+            base = high << 16
+            for low in container if type(container) is not int else _sparse(container):
+                yield base + low
+
+    def __and__(self, other):
+        small, large = sorted((self.chunks, other.chunks), key=len)
+        chunks = {}
+        for high, container in small.items():
+            if high in large:
+                result = _and(container, large[high])
+                if result is not None:
+                    chunks[high] = result
+        return Bitmap(chunks)
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for high, container in other.chunks.items():
+            mine = chunks.get(high)
+            chunks[high] = container if mine is None else _or(mine, container)
+        return Bitmap(chunks)
+
+    @property
+    def nbytes(self):
+        """Size of the serialized bitmap."""
+        return _COUNT.size + sum(
+            _CONTAINER.size + (_BITMAP_BYTES if type(container) is int else 2 * len(container))
+            for container in self.chunks.values()
+        )
+
+    def to_bytes(self):
+        parts = [_COUNT.pack(len(self.chunks))]
+        for high in sorted(self.chunks):
+            container = self.chunks[high]
+            if type(container) is int:
+                parts.append(_CONTAINER.pack(high, _BITMAP, _popcount(container) - 1))
+                parts.append(container.to_bytes(_BITMAP_BYTES, "little"))
+            else:
+                parts.append(_CONTAINER.pack(high, _ARRAY, len(container) - 1))
+                lows = array("H", container)
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                parts.append(lows.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        (count,), position = _COUNT.unpack_from(data), _COUNT.size
+        chunks = {}
+        for _ in range(count):
+            high, kind, cardinality = _CONTAINER.unpack_from(data, position)
+            position += _CONTAINER.size
+            if kind == _BITMAP:
+                chunks[high] = int.from_bytes(data[position:position + _BITMAP_BYTES], "little")
+                position += _BITMAP_BYTES
+            else:
+                lows = array("H", data[position:position + 2 * (cardinality + 1)].tobytes())
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                chunks[high] = lows
+                position += 2 * (cardinality + 1)
+        return cls(chunks)
+
+
+def value_key(value):
+    """The index key of a column value: its text as the generator writes it
+    (booleans as 1/0), so values read back from any format match; None for NULL."""
+    if value is None or type(value) is str:
+        return value
+    if value is True or value is False or type(value).__name__ == "bool_":
+        return "1" if value else "0"
+    return str(value)
+
+
+def _value_order(key):
+    if key is None:
+        return (0, 0, "")
+    return (1, int(key), "") if key.isdigit() else (2, 0, key)
+
+
+class BitmapIndex:
+    """Bitmaps of every value of the INDEXED_COLUMNS of a fact stream.
+
+    Wrap the stream in ``observe`` (tuples or ColumnBlocks in
+    ``fact_columns`` order), then ``save`` it; shard indexes combine with
+    ``merge``. A loaded index decodes a bitmap the first time a query needs it.
+    """
+
+    __slots__ = ("columns", "indexes", "key_index", "rows", "bitmaps", "pending", "pending_rows", "body")
+
+    def __init__(self, fact_columns, columns=INDEXED_COLUMNS):
+        self.columns = tuple(columns)
+        self.indexes = tuple(fact_columns.index(column) for column in self.columns)
+        self.key_index = fact_columns.index(KEY_COLUMN)
+        self.rows = 0
+        # column -> {value key: Bitmap, or (offset, size) of a bitmap not decoded yet}
+        self.bitmaps = {column: {} for column in self.columns}
+        # column -> {raw value: array of keys} not folded into the bitmaps yet
+        self.pending = {column: {} for column in self.columns}
+        self.pending_rows = 0
+        self.body = None
+
+    def observe(self, rows):
+        """Yield ``rows`` unchanged, adding each row's key to the bitmaps of its values."""
+        key_index = self.key_index
+        columns = [(self.pending[column], index) for column, index in zip(self.columns, self.indexes)]
+        for row in rows:
+            if type(row) is ColumnBlock:
+                keys = row.columns[key_index]
+                for pending, index in columns:
+                    values = row.columns[index]
+                    if type(values) is DictionaryColumn:
+                        for value, group in values.groups(keys).items():
+                            if value in pending:
+                                pending[value].extend(group)
+                            else:
+                                pending[value] = group
+                        continue
+                    for key, value in zip(keys, values):
+                        values = pending.get(value)
+                        if values is None:
+                            values = pending[value] = array("I")
+                        values.append(key)
+                self.pending_rows += len(keys)
+            else:
+                key = int(row[key_index])
+                for pending, index in columns:
+                    value = row[index]
+                    values = pending.get(value)
+                    if values is None:
+                        values = pending[value] = array("I")
+                    values.append(key)
+                self.pending_rows += 1
+            if self.pending_rows >= FLUSH_ROWS:
+                self._flush()
+            yield row
+
+    def _flush(self):
+        for column, pending in self.pending.items():
+            bitmaps = self.bitmaps[column]
+            for value, keys in pending.items():
+                self._add(column, value_key(value), Bitmap.from_keys(keys))
+            pending.clear()
+            if len(bitmaps) > MAX_VALUES:
+                raise ValueError(f"{column} has more than {MAX_VALUES} distinct values; it is not low-cardinality")
+        self.rows += self.pending_rows
+        self.pending_rows = 0
+
+    def _add(self, column, key, bitmap):
+        current = self.bitmap(column, key) if key in self.bitmaps[column] else None
+        self.bitmaps[column][key] = bitmap if current is None else current | bitmap
+
+    def merge(self, other):
+        """OR another index (of other keys, e.g. another shard) into this one."""
+        self._flush()
+        other._flush()
+        for column in self.columns:
+            for key in other.bitmaps[column]:
+                self._add(column, key, other.bitmap(column, key))
+        self.rows += other.rows
+
+    @property
+    def num_bitmaps(self):
+        return sum(len(bitmaps) for bitmaps in self.bitmaps.values())
+
+    def save(self, path):
+        """Write the index to ``path``; returns the path."""
+        self._flush()
+        header, body, offset = {}, [], 0
+        for column in self.columns:
+            header[column] = []
+            for key in sorted(self.bitmaps[column], key=_value_order):
+                bitmap = self.bitmap(column, key)
+                data = bitmap.to_bytes()
+                header[column].append([key, offset, len(data), len(bitmap)])
+                body.append(data)
+                offset += len(data)
+        with open(path, "wb") as f:
+            f.write(json.dumps({"key": KEY_COLUMN, "rows": self.rows, "columns": header}).encode("utf-8") + b"\n")
+            f.writelines(body)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Open an index written by ``save``."""
+        data = Path(path).read_bytes()
+        newline = data.index(b"\n")
+        header = json.loads(data[:newline])
+        index = cls((header["key"], *header["columns"]), header["columns"])
+        index.rows = header["rows"]
+        index.body = memoryview(data)[newline + 1:]
+        for column, entries in header["columns"].items():
+            index.bitmaps[column] = {key: (offset, size) for key, offset, size, _ in entries}
+        return index
+
+    def bitmap(self, column, value):
+        """The bitmap of the rows whose ``column`` holds ``value`` (empty if none do)."""
+        bitmaps = self.bitmaps[column]
+        key = value_key(value)
+        entry = bitmaps.get(key)
+        if entry is None:
+            return Bitmap()
+        if type(entry) is tuple:
+            offset, size = entry
+            entry = bitmaps[key] = Bitmap.from_bytes(self.body[offset:offset + size])
+        return entry
+
+    def values(self, column):
+        """Indexed values of ``column``, in value order."""
+        return sorted(self.bitmaps[column], key=_value_order)
+
+    def all_rows(self):
+        """Bitmap of every indexed row."""
+        result = Bitmap()
+        for key in self.bitmaps[self.columns[0]]:
+            result = result | self.bitmap(self.columns[0], key)
+        return result
+
+    def select(self, filters):
+        """Bitmap of the rows matching every ``(column, values)`` of ``filters``:
+        the OR of a column's value bitmaps, ANDed across columns (smallest
+        first, stopping once nothing is left)."""
+        matches = []
+        for column, values in filters:
+            result = Bitmap()
+            for value in values:
+                result = result | self.bitmap(column, value)
+            matches.append(result)
+        if not matches:
+            return self.all_rows()
+        matches.sort(key=len)
+        result = matches[0]
+        for bitmap in matches[1:]:
+            if not result.chunks:
+                break
+            result = result & bitmap
+        return result
+
+    def count(self, filters):
+        """Rows matching ``filters`` (see select)."""
+        return len(self.select(filters))
+
+    def group_counts(self, column, filters=()):
+        """{value: matching rows} of ``column`` among the rows matching ``filters``."""
+        selected = self.select(filters) if filters else None
+        counts = {}
+        for key in self.values(column):
+            bitmap = self.bitmap(column, key)
+            counts[key] = len(bitmap if selected is None else bitmap & selected)
+        return counts
+
+
+def build_from_files(olap_dir, columns=INDEXED_COLUMNS):
+    """Index the fact table files of a generate_olap_data.py output directory."""
+    # generate_olap_data imports this module, so these are imported on use
+    from bulk_load import read_manifest, table_files
+    from generate_olap_data import TABLE_COLUMNS
+
+    files = table_files(olap_dir, "fact_encounters", read_manifest(olap_dir).get("fact_encounters"))
+    if not files:
+        raise FileNotFoundError(f"no fact_encounters data in {olap_dir}")
+    index = BitmapIndex(TABLE_COLUMNS["fact_encounters"], columns)
+    for directory, file_stem in files:
+        for _ in index.observe(read_table(directory, file_stem)):
+            pass
+    return index
+
+
+def parse_filter(text):
+    """``column=value[,value...]`` -> (column, [values]); true/false stand for 1/0 on is_ columns."""
+    column, separator, values = text.partition("=")
+    if not separator or column not in INDEXED_COLUMNS:
+        raise argparse.ArgumentTypeError(
+            f"expected column=value[,value...] with column one of: {', '.join(INDEXED_COLUMNS)}"
+        )
+    values = values.split(",")
+    if column.startswith("is_"):
+        values = [{"true": "1", "false": "0"}.get(value.lower(), value) for value in values]
+    return column, values
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query (or build) the fact table's bitmap indexes.")
+    parser.add_argument("--olap-dir", type=Path, default=Path(__file__).parent.parent / "data" / "olap",
+                        help="directory written by generate_olap_data.py (default: data/olap)")
+    parser.add_argument("--build", action="store_true",
+                        help=f"(re)build {BITMAPS_FILENAME} from the fact table files first")
+    parser.add_argument("--where", type=parse_filter, action="append", default=[],
+                        help="filter column=value[,value...] (values OR-ed, repeated filters AND-ed)")
+    parser.add_argument("--group-by", choices=INDEXED_COLUMNS, default=None,
+                        help="count the matching rows per value of this column")
+    parser.add_argument("--keys", type=int, default=0,
+                        help="also print the first N matching encounter_keys")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.olap_dir / BITMAPS_FILENAME
+    if args.build:
+        started = time.perf_counter()
+        index = build_from_files(args.olap_dir)
+        index.save(path)
+        print(f"  [OK] {path}: {index.rows:,} rows, {index.num_bitmaps} bitmaps, "
+              f"{path.stat().st_size:,} bytes ({time.perf_counter() - started:.2f}s)")
+    if not path.exists():
+        raise SystemExit(f"error: {path} not found (generate with --bitmap-index, or rerun with --build)")
+    index = BitmapIndex.load(path)
+
+    if not args.where and not args.group_by:
+        for column in index.columns:
+            counts = index.group_counts(column)
+            print(f"  {column}: " + ", ".join(f"{key}={count:,}" for key, count in counts.items()))
+        return
+
+    started = time.perf_counter()
+    selected = index.select(args.where)
+    matching = len(selected)
+    counts = index.group_counts(args.group_by, args.where) if args.group_by else None
+    elapsed = (time.perf_counter() - started) * 1000
+    description = " AND ".join(f"{column} IN ({', '.join(values)})" for column, values in args.where) or "all rows"
+    print(f"  {description}: {matching:,} of {index.rows:,} rows ({elapsed:.2f} ms)")
+    if counts is not None:
+        width = max((len(str(key)) for key in counts), default=0)
+        for key, count in counts.items():
+            if count:
+                print(f"    {str(key):<{width}}  {count:>10,}")
+    if args.keys:
+        keys = [key for _, key in zip(range(args.keys), selected)]
+        print(f"  {KEY_COLUMN}s: {', '.join(map(str, keys))}")
+
+
+if __name__ == "__main__":
+    main()
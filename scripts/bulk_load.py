@@ -0,0 +1,392 @@
+"""
+Dependency-Aware Bulk Loader
+============================
+Loads a generated data directory into a SQLite database in foreign-key
+dependency order, with secondary indexes built after the data is in. SQLite
+stands in for the MySQL / Postgres targets of the loader scripts the
+generators write.
+
+1. The DDL (oltp_schema.sql or star_schema.sql) is parsed with
+   sqlite_schema.parse_schema; the FOREIGN KEY references of each table give
+   the dependency graph (a cycle is an error).
+2. Every table is created without its secondary indexes.
+3. The table loads and index builds run as a task_graph.TaskGraph on worker
+   threads, over a pool of connections. A table's load runs after the loads
+   of the tables it references, so independent tables (the dimensions, the
+   two bridges) load concurrently. Rows are read
+   with oltp_source.read_table (any --format, compressed or not; the part
+   files of a --keep-parts run are found through manifest.json) and inserted
+   in transactions of --transaction-rows rows; a thread parses its next batch
+   while the others hold the write lock.
+4. The secondary indexes (15 on fact_encounters, counting the foreign key
+   indexes) are built once all the data is in, so no insert pays for index
+   maintenance; then ANALYZE. The run report (--report) lists each load and
+   index build and the critical path, as for generate_olap_data.py.
+
+SQLite allows one writer at a time, so concurrent loads overlap parsing with
+inserting rather than inserting in parallel. Foreign keys are declared but
+not enforced during the load (the loader scripts likewise turn off
+FOREIGN_KEY_CHECKS); --check-foreign-keys verifies them afterwards.
+
+    python scripts/bulk_load.py --schema star --data-dir data/olap --database /tmp/star.db
+"""
+
+import argparse
+import json
+import queue
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from compression import SUFFIXES, compression_of
+from generate_olap_data import BRIDGE_TABLES, OLAP_DIR, OLTP_DIR
+from instrumentation import RunReport, file_bytes
+from oltp_source import find_table_file, read_table
+from sharding import MANIFEST_FILENAME
+from sqlite_schema import parse_schema
+from task_graph import TaskGraph
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# --schema -> (DDL file, default data directory, {table: data file stem} where they differ)
+SCHEMAS = {
+    "star": (
+        ROOT_DIR / "olap_schema" / "star_schema.sql", OLAP_DIR,
+        {table_name: filename.rsplit(".", 1)[0] for filename, table_name in BRIDGE_TABLES},
+    ),
+    "oltp": (ROOT_DIR / "oltp_schema" / "oltp_schema.sql", OLTP_DIR, {}),
+}
+
+DEFAULT_WORKERS = 4
+DEFAULT_TRANSACTION_ROWS = 50000
+
+# Seconds a connection waits for the write lock before giving up
+BUSY_TIMEOUT = 600
+
+# Per-stage timings of this run (--report; see instrumentation.py)
+REPORT = RunReport()
+
+# Serializes the progress lines of the loader threads
+_PRINT_LOCK = threading.Lock()
+
+
+# =============================================================================
+# DEPENDENCY GRAPH
+# =============================================================================
+
+def dependency_graph(tables):
+    """{table: names of the tables it references}, in schema order.
+
+    References to tables outside the schema and self-references are ignored.
+    """
+    names = {table.name for table in tables}
+    return {table.name: table.dependencies & names for table in tables}
+
+
+def load_levels(dependencies):
+    """Group tables into levels: each level only references earlier levels.
+
+    Raises ValueError if the foreign keys form a cycle.
+    """
+    levels, loaded = [], set()
+    remaining = dict(dependencies)
+    while remaining:
+        level = [name for name, references in remaining.items() if references <= loaded]
+        if not level:
+            raise ValueError(f"foreign key cycle between {', '.join(sorted(remaining))}")
+        levels.append(level)
+        loaded.update(level)
+        for name in level:
+            del remaining[name]
+    return levels
+
+
+# =============================================================================
+# CONNECTION POOL
+# =============================================================================
+
+class ConnectionPool:
+    """A fixed set of autocommit SQLite connections shared by the loader threads."""
+
+    __slots__ = ("_connections", "_idle")
+
+    def __init__(self, database, size):
+        self._connections = []
+        self._idle = queue.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(
+                database, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+            )
+            # A failed bulk load is rerun from scratch, so skip the fsyncs
+            connection.execute("PRAGMA synchronous = OFF")
+            self._connections.append(connection)
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the enclosed block."""
+        connection = self._idle.get()
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+
+
+# =============================================================================
+# LOADING
+# =============================================================================
+
+def read_manifest(data_dir):
+    """{table: [file entries]} from a sharded run's manifest.json ({} without one)."""
+    path = data_dir / MANIFEST_FILENAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))["tables"]
+
+
+def table_files(data_dir, file_stem, manifest_entries=None):
+    """(directory, file stem) of each data file of a table.
+
+    The files listed in the manifest (the parts of a --keep-parts run), else
+    the table's own file; empty if it has none.
+    """
+    if manifest_entries:
+        files = []
+        for entry in manifest_entries:
+            path = data_dir / entry["file"]
+            name = path.name[:len(path.name) - len(SUFFIXES.get(compression_of(path), ""))]
+            files.append((path.parent, Path(name).stem))
+        return files
+    try:
+        find_table_file(data_dir, file_stem)
+    except FileNotFoundError:
+        return []
+    return [(data_dir, file_stem)]
+
+
+def load_table(pool, table, files, transaction_rows):
+    """Insert a table's data ``files`` in transactions of ``transaction_rows`` rows.
+
+    Short rows fill the leading columns only (older data files may predate
+    trailing columns). Returns (rows, bytes read); a table without data files
+    is left empty and returns None rows.
+    """
+    if not files:
+        return None, 0
+    with REPORT.stage(f"load {table.name}") as stage, pool.connection() as connection:
+        for source_dir, file_stem in files:
+            rows = read_table(source_dir, file_stem)
+            batch = list(islice(rows, transaction_rows))
+            if batch:
+                columns = [column for column, _ in table.columns][:len(batch[0])]
+                insert = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            while batch:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.executemany(insert, batch)
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                connection.execute("COMMIT")
+                stage.count(len(batch))
+                batch = list(islice(rows, transaction_rows))
+            stage.count(0, file_bytes(find_table_file(source_dir, file_stem)))
+    return stage.rows, stage.bytes
+
+
+def build_indexes(pool, table):
+    """Create a table's secondary indexes; returns the index count."""
+    statements = table.index_statements()
+    with REPORT.stage(f"index {table.name}"), pool.connection() as connection:
+        for statement in statements:
+            connection.execute(statement)
+    return len(statements)
+
+
+def _progress(line):
+    with _PRINT_LOCK:
+        print(line, flush=True)
+
+
+def load_graph(pool, tables, dependencies, table_files_of, transaction_rows):
+    """TaskGraph loading every table after the tables it references, then
+    building the indexes of all of them.
+
+    Task "load <table>" produces the value ``<table>``: (rows, bytes read) as
+    load_table returns them. The index builds wait for every load, not only
+    their own table's, so no insert competes with an index build.
+    """
+    graph = TaskGraph()
+    for table in tables:
+
+        def load(table=table):
+            rows, nbytes = load_table(pool, table, table_files_of(table.name), transaction_rows)
+            _progress(f"  [OK] {table.name}: {rows:,} rows" if rows is not None
+                      else f"  [--] {table.name}: no data files")
+            return rows, nbytes
+
+        graph.add(f"load {table.name}", load, outputs=(table.name,),
+                  after=tuple(f"load {name}" for name in sorted(dependencies[table.name])))
+    loads = tuple(f"load {table.name}" for table in tables)
+    for table in tables:
+
+        def index(table=table):
+            count = build_indexes(pool, table)
+            if count:
+                _progress(f"  [OK] {table.name}: {count} index{'es' if count > 1 else ''}")
+
+        graph.add(f"index {table.name}", index, after=loads)
+    return graph
+
+
+def check_foreign_keys(database):
+    """Return {(table, referenced table): rows} of foreign key violations."""
+    violations = {}
+    connection = sqlite3.connect(database)
+    try:
+        for table, _, parent, _ in connection.execute("PRAGMA foreign_key_check"):
+            violations[(table, parent)] = violations.get((table, parent), 0) + 1
+    finally:
+        connection.close()
+    return violations
+
+
+def bulk_load(schema_path, data_dir, database, file_stems, workers, transaction_rows):
+    """Create ``database`` from a DDL file and load ``data_dir`` into it.
+
+    Returns {table: rows loaded, or None when it has no data file}.
+    """
+    tables = parse_schema(schema_path)
+    dependencies = dependency_graph(tables)
+    levels = load_levels(dependencies)
+    manifest = read_manifest(data_dir)
+
+    print("Load order (tables on one level load concurrently):")
+    for level, names in enumerate(levels, 1):
+        print(f"  {level}. {', '.join(names)}")
+
+    connection = sqlite3.connect(database)
+    with REPORT.stage("create tables"):
+        # WAL lets readers and the next writer proceed while a transaction commits
+        connection.execute("PRAGMA journal_mode = WAL")
+        with connection:
+            for table in tables:
+                connection.execute(table.create_statement(foreign_keys=True))
+    connection.close()
+
+    pool = ConnectionPool(database, workers)
+    graph = load_graph(
+        pool, tables, dependencies,
+        lambda name: table_files(data_dir, file_stems.get(name, name), manifest.get(name)), transaction_rows,
+    )
+    print(f"\nLoading {len(tables)} tables from {data_dir}, then building their secondary indexes "
+          f"({workers} workers, {transaction_rows:,} rows per transaction)...")
+    try:
+        with REPORT.stage(f"load and index ({len(tables)} tables, {workers} workers)"):
+            values = graph.run(workers)
+            loaded = {}
+            for table in tables:
+                rows, nbytes = values[table.name]
+                loaded[table.name] = rows
+                REPORT.count(rows or 0, nbytes)
+    finally:
+        pool.close()
+    schedule = REPORT.sections["task_graph"] = graph.schedule()
+    print(f"\nCritical path ({schedule['critical_path_seconds']:.2f}s of {schedule['wall_seconds']:.2f}s): "
+          f"{' -> '.join(schedule['critical_path'])}")
+
+    connection = sqlite3.connect(database)
+    with REPORT.stage("analyze"):
+        connection.execute("ANALYZE")
+        connection.commit()
+        # Back to a single database file
+        connection.execute("PRAGMA journal_mode = DELETE")
+    connection.close()
+    return loaded
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk-load a data directory into SQLite in foreign key order, building indexes last."
+    )
+    parser.add_argument("--schema", choices=tuple(SCHEMAS), default="star",
+                        help="schema to create and load (default: %(default)s)")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="data directory, any --format (default: data/olap for star, data/oltp for oltp)")
+    parser.add_argument("--database", type=Path, required=True,
+                        help="SQLite database file to create")
+    parser.add_argument("--replace", action="store_true",
+                        help="replace --database if it already exists")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="loader threads and pooled connections (default: %(default)s)")
+    parser.add_argument("--transaction-rows", type=int, default=DEFAULT_TRANSACTION_ROWS,
+                        help="rows inserted per transaction (default: %(default)s)")
+    parser.add_argument("--check-foreign-keys", action="store_true",
+                        help="verify every foreign key after the load; exit with status 1 on violations")
+    parser.add_argument("--report", type=Path, default=None,
+                        help="write a JSON run report (wall/CPU time, rows/s, bytes and peak RSS per stage)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.transaction_rows < 1:
+        parser.error("--transaction-rows must be at least 1")
+    if args.data_dir is None:
+        args.data_dir = SCHEMAS[args.schema][1]
+    if not args.data_dir.is_dir():
+        parser.error(f"--data-dir {args.data_dir} is not a directory")
+    if args.database.exists() and not args.replace:
+        parser.error(f"--database {args.database} already exists (use --replace to overwrite it)")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    schema_path, _, file_stems = SCHEMAS[args.schema]
+
+    print("\n" + "=" * 70)
+    print("Bulk Load (SQLite)")
+    print("=" * 70 + "\n")
+
+    if args.database.exists():
+        args.database.unlink()
+    args.database.parent.mkdir(parents=True, exist_ok=True)
+    loaded = bulk_load(schema_path, args.data_dir, args.database, file_stems, args.workers, args.transaction_rows)
+
+    violations = {}
+    if args.check_foreign_keys:
+        print("\nChecking foreign keys...")
+        with REPORT.stage("foreign key check"):
+            violations = check_foreign_keys(args.database)
+        for (table, parent), rows in sorted(violations.items()):
+            print(f"  [FAIL] {table} -> {parent}: {rows:,} rows")
+        if not violations:
+            print("  [OK] no violations")
+
+    print("\n" + "=" * 70)
+    print("BULK LOAD COMPLETE")
+    print("=" * 70)
+    print(f"  {sum(rows or 0 for rows in loaded.values()):,} rows in {len(loaded)} tables")
+    print(f"\nDatabase written to: {args.database.absolute()}")
+    print("\nStage timings (slowest first):")
+    for line in REPORT.summary_lines():
+        print(line)
+    if args.report:
+        print(f"\nRun report written to: {REPORT.write(args.report, argv)}")
+    print()
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
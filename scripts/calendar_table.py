@@ -0,0 +1,130 @@
+"""
+Calendar Table
+==============
+The date dimension, computed once as packed arrays indexed by day offset
+(days since the calendar's first date). dim_date rows and the date
+attributes of fact and bridge rows are array lookups instead of per-row
+strftime / isocalendar / weekday calls:
+
+    day = calendar.offset(encounter_date.toordinal())
+    calendar.date_keys[day]     # 20240315
+    calendar.iso_dates[day]     # '2024-03-15'
+    calendar.weekdays[day]      # 5 (ISO, 1=Monday)
+
+The arrays are filled by walking the range day by day, so a multi-decade
+calendar costs a few hundred KB and well under a second. ``offset`` widens
+the calendar in place when a date outside it turns up (stray source dates
+still resolve, and arrays already bound to local names stay valid).
+"""
+
+from array import array
+from calendar import monthrange
+from datetime import date
+
+MONTH_NAMES = ["", "January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+SECONDS_PER_DAY = 86400
+
+
+class Calendar:
+    """Packed per-day calendar attributes for the days ``start`` .. ``end`` (inclusive)."""
+
+    __slots__ = (
+        "first_ordinal", "num_days", "date_keys", "years", "months", "days", "quarters", "weeks",
+        "weekdays", "iso_dates",
+    )
+
+    def __init__(self, start, end):
+        self.first_ordinal = start.toordinal()
+        self.num_days = 0
+        self.date_keys = array("i")     # YYYYMMDD
+        self.years = array("h")
+        self.months = array("b")        # 1-12
+        self.days = array("b")          # day of month
+        self.quarters = array("b")      # 1-4
+        self.weeks = array("b")         # ISO week of year
+        self.weekdays = array("b")      # ISO weekday, 1=Monday
+        self.iso_dates = []             # 'YYYY-MM-DD'
+        self._fill(self.first_ordinal, end.toordinal(), append=True)
+
+    def __len__(self):
+        return self.num_days
+
+    def offset(self, ordinal):
+        """Day offset of a proleptic ordinal (``date.toordinal()``), widening the calendar if needed."""
+        day = ordinal - self.first_ordinal
+        if 0 <= day < self.num_days:
+            return day
+        self.cover(ordinal, ordinal)
+        return ordinal - self.first_ordinal
+
+    def cover(self, first_ordinal, last_ordinal):
+        """Widen the calendar (in place) to include the days ``first_ordinal`` .. ``last_ordinal``."""
+        if first_ordinal < self.first_ordinal:
+            self._fill(first_ordinal, self.first_ordinal - 1, append=False)
+        last = self.first_ordinal + self.num_days - 1
+        if last_ordinal > last:
+            self._fill(last + 1, last_ordinal, append=True)
+
+    def _fill(self, first_ordinal, last_ordinal, append):
+        columns = (
+            array("i"), array("h"), array("b"), array("b"), array("b"), array("b"), array("b"), [],
+        )
+        date_keys, years, months, days, quarters, weeks, weekdays, iso_dates = columns
+        start = date.fromordinal(first_ordinal)
+        year, month, day = start.year, start.month, start.day
+        week, weekday = start.isocalendar()[1:]
+        month_length = monthrange(year, month)[1]
+        for _ in range(last_ordinal - first_ordinal + 1):
+            date_keys.append(year * 10000 + month * 100 + day)
+            years.append(year)
+            months.append(month)
+            days.append(day)
+            quarters.append((month - 1) // 3 + 1)
+            weeks.append(week)
+            weekdays.append(weekday)
+            iso_dates.append(f"{year:04d}-{month:02d}-{day:02d}")
+            
+            day += 1
+            if day > month_length:
+                day, month = 1, month + 1
+                if month > 12:
+                    month, year = 1, year + 1
+                month_length = monthrange(year, month)[1]
+            weekday = weekday % 7 + 1
+            if weekday == 1:
+                # Week 1 is the one with the year's first Thursday: its Monday falls on Dec 29 - Jan 4
+                week = 1 if (month == 12 and day >= 29) or (month == 1 and day <= 4) else week + 1
+        
+        targets = (
+            self.date_keys, self.years, self.months, self.days, self.quarters, self.weeks, self.weekdays,
+            self.iso_dates,
+        )
+        for target, values in zip(targets, columns):
+            if append:
+                target.extend(values)
+            else:
+                target[0:0] = values
+        if not append:
+            self.first_ordinal = first_ordinal
+        self.num_days += last_ordinal - first_ordinal + 1
+
+    def timestamp(self, seconds):
+        """'YYYY-MM-DD HH:MM:SS' of seconds since the start of ordinal day 0."""
+        day, secs = divmod(seconds, SECONDS_PER_DAY)
+        hours, secs = divmod(secs, 3600)
+        minutes, secs = divmod(secs, 60)
+        return f"{self.iso_dates[self.offset(day)]} {hours:02d}:{minutes:02d}:{secs:02d}"
+
+    def dim_date_rows(self):
+        """Yield the dim_date rows of every day in the calendar (fiscal year == calendar year)."""
+        for day in range(self.num_days):
+            year, quarter, weekday = self.years[day], self.quarters[day], self.weekdays[day]
+            yield (
+                self.date_keys[day], self.iso_dates[day], year, quarter, self.months[day],
+                MONTH_NAMES[self.months[day]], self.weeks[day], self.days[day], weekday,
+                DAY_NAMES[weekday - 1], weekday >= 6, year, quarter,
+            )
@@ -0,0 +1,119 @@
+"""
+Run Checkpoints
+===============
+Resumable random builds (``--resume`` on generate_olap_data.py).
+
+A checkpoint.json in the output directory records what an interrupted run
+had finished:
+
+- settings: everything the output depends on (seed, row counts, shards,
+  backend, skew, format, compression, calendar). A checkpoint left by a run
+  with other settings is refused, as its files would not fit.
+- stages: finished tables, with their files (rows, size on disk), the value
+  later stages need from them (e.g. the providers of dim_provider) and the
+  state of the global random stream after the stage, which serial builds
+  draw every table from.
+- chunks: finished shards of a sharded table: the part files, the id offsets
+  the shard started from and its partial aggregates.
+
+An entry only counts while all its files are still on disk with the recorded
+size; a part that a merge already consumed, or a file cut short, is written
+again. The checkpoint is rewritten atomically after every entry, so a crash
+leaves the previous one intact, and it is deleted once the run is complete.
+
+Shards draw from their own derived seeds (sharding.py), so a restarted run
+regenerates the missing shards exactly and the merged output is identical
+to an uninterrupted run (with SOURCE_DATE_EPOCH pinning the banners).
+"""
+
+import json
+import os
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+
+
+def rng_state(rng):
+    """State of a random.Random (or the random module) as JSON-able lists."""
+    version, internal, gauss_next = rng.getstate()
+    return [version, list(internal), gauss_next]
+
+
+def restore_rng(rng, state):
+    """Restore a state saved by rng_state."""
+    version, internal, gauss_next = state
+    rng.setstate((version, tuple(internal), gauss_next))
+
+
+class Checkpoint:
+    """Finished stages and chunks of one run, kept in ``output_dir/checkpoint.json``."""
+
+    __slots__ = ("output_dir", "path", "settings", "stages", "chunks", "resumed")
+
+    def __init__(self, output_dir, settings):
+        """Open the checkpoint of ``output_dir``, or start one.
+
+        ``settings`` is a JSON-able dict; raises ValueError when an existing
+        checkpoint was written with different settings.
+        """
+        self.output_dir = output_dir
+        self.path = output_dir / CHECKPOINT_FILENAME
+        self.settings = json.loads(json.dumps(settings))
+        self.stages, self.chunks = {}, {}
+        self.resumed = self.path.exists()
+        if self.resumed:
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+            if saved["settings"] != self.settings:
+                changed = sorted(
+                    key for key in self.settings.keys() | saved["settings"].keys()
+                    if self.settings.get(key) != saved["settings"].get(key)
+                )
+                raise ValueError(
+                    f"{self.path} was written by a run with other settings ({', '.join(changed)}); "
+                    f"rerun with those settings or delete it"
+                )
+            self.stages, self.chunks = saved["stages"], saved["chunks"]
+
+    def _valid(self, entry):
+        return entry is not None and all(
+            (self.output_dir / name).is_file() and os.path.getsize(self.output_dir / name) == size
+            for name, size in entry["files"]
+        )
+
+    def _files(self, paths):
+        return [
+            [path.relative_to(self.output_dir).as_posix(), os.path.getsize(path)]
+            for path in (self.output_dir / path for path in paths)
+        ]
+
+    def stage(self, name):
+        """The entry of finished stage ``name``, or None."""
+        entry = self.stages.get(name)
+        return entry if self._valid(entry) else None
+
+    def complete_stage(self, name, paths, **values):
+        """Record stage ``name`` as finished with its files (relative to the
+        output directory or absolute) and ``values``."""
+        self.stages[name] = {"files": self._files(paths), **values}
+        self._save()
+
+    def chunk(self, name, shard):
+        """The entry of finished shard ``shard`` of ``name``, or None."""
+        entry = self.chunks.get(f"{name}/{shard}")
+        return entry if self._valid(entry) else None
+
+    def complete_chunk(self, name, shard, paths, **values):
+        """Record shard ``shard`` of ``name`` as finished."""
+        self.chunks[f"{name}/{shard}"] = {"files": self._files(paths), **values}
+        self._save()
+
+    def _save(self):
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        temporary.write_text(
+            json.dumps({"settings": self.settings, "stages": self.stages, "chunks": self.chunks}) + "\n",
+            encoding="utf-8",
+        )
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        """Delete the checkpoint after a complete run."""
+        self.path.unlink(missing_ok=True)
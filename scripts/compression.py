@@ -0,0 +1,124 @@
+"""
+Compressed Data Files
+=====================
+Streaming gzip / zstd compression for the generators' data files, and
+transparent decompression for everything that reads them back.
+
+A compressed file keeps its data suffix and gains the codec's, e.g.
+``fact_encounters.tsv.gz`` or ``encounters.sql.zst``; readers pick the codec
+from that suffix. Both codecs allow concatenated streams, so per-shard part
+files are merged by copying their compressed bytes (no recompression).
+
+gzip is built in; zstd needs the optional ``zstandard`` package
+(pip install zstandard).
+"""
+
+import gzip
+import io
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; only zstd output/input needs it
+    zstandard = None
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+
+LEVEL_RANGES = {"gzip": (1, 9), "zstd": (1, 22)}
+
+# Shell command that streams a file of each codec to stdout (for loader scripts)
+DECOMPRESS_COMMANDS = {"none": "cat", "gzip": "gzip -dc", "zstd": "zstd -dc"}
+
+
+def compressed_name(filename, compression="none"):
+    """``filename`` with the codec suffix appended (unchanged for "none")."""
+    return filename + SUFFIXES.get(compression, "")
+
+
+def compression_of(path):
+    """Codec of a data file, from its suffix ("none" if it has none)."""
+    name = str(path)
+    for compression, suffix in SUFFIXES.items():
+        if name.endswith(suffix):
+            return compression
+    return "none"
+
+
+def data_suffix(path):
+    """Suffix of a data file under any codec suffix: ``x.tsv.gz`` -> ``.tsv``."""
+    name = str(path)
+    return Path(name[:len(name) - len(SUFFIXES.get(compression_of(name), ""))]).suffix
+
+
+def check_compression(compression, level=None):
+    """Return an error message if ``compression`` / ``level`` cannot be used, else None."""
+    if compression == "zstd" and zstandard is None:
+        return "zstd compression requires zstandard (pip install zstandard)"
+    if level is not None:
+        if compression == "none":
+            return "a compression level needs gzip or zstd compression"
+        low, high = LEVEL_RANGES[compression]
+        if not low <= level <= high:
+            return f"{compression} compression level must be between {low} and {high}"
+    return None
+
+
+def _binary_writer(raw, compression, level):
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        # mtime=0 keeps compressed output reproducible
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=level, mtime=0)
+    return zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+
+
+def open_text_output(path, compression="none", level=None):
+    """Open ``path`` for streaming UTF-8 text output through ``compression``."""
+    if compression == "none":
+        return open(path, "w", encoding="utf-8", newline="")
+    raw = open(path, "wb")
+    return _ClosingTextWrapper(_binary_writer(raw, compression, level), raw)
+
+
+def open_text_input(path):
+    """Open a (possibly compressed) data file for UTF-8 text input."""
+    compression = compression_of(path)
+    if compression == "none":
+        return open(path, encoding="utf-8", newline="")
+    raw = open(path, "rb")
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+    else:
+        if zstandard is None:
+            raw.close()
+            raise RuntimeError(f"{path}: reading zstd files requires zstandard (pip install zstandard)")
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=False)
+    return _ClosingTextWrapper(stream, raw)
+
+
+def compress_text(text, compression="none", level=None):
+    """``text`` as the bytes of one complete stream (for appending to a concatenated file)."""
+    data = text.encode("utf-8")
+    if compression == "none":
+        return data
+    raw = io.BytesIO()
+    with _binary_writer(raw, compression, level) as writer:
+        writer.write(data)
+    return raw.getvalue()
+
+
+class _ClosingTextWrapper(io.TextIOWrapper):
+    """Text layer over a codec stream that also closes the underlying file."""
+
+    def __init__(self, stream, raw):
+        super().__init__(stream, encoding="utf-8", newline="")
+        self._raw = raw
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
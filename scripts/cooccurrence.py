@@ -0,0 +1,294 @@
+"""
+Diagnosis-Procedure Co-occurrence
+=================================
+Which procedures go with which diagnoses (Query 2 of star_schema_queries.txt),
+counted straight from the two bridge tables instead of joining
+fact_encounters -> bridge_encounter_procedures -> dim_procedure in SQL.
+
+An encounter with diagnoses D and procedures P counts once for every pair in
+D x P. Both bridges are written in encounter_key order (each table file,
+shard part and monthly partition; the files of a table are merged back into
+that order), so CooccurrenceMatrix.observe streams them side by side, groups
+each by encounter_key and merges the two, holding one encounter at a time.
+The counts go into a sparse matrix, diagnosis_key -> {procedure_key:
+encounters}, with only the pairs that occur, plus the encounters per
+diagnosis and per procedure:
+
+    support(d, p)    = encounters(d, p) / encounters
+    confidence(d, p) = encounters(d, p) / encounters(d)
+    lift(d, p)       = encounters(d, p) * encounters / (encounters(d) * encounters(p))
+
+where ``encounters`` counts the encounters with any bridge row. A lift
+above 1 means the procedure comes with the diagnosis more often than chance.
+
+Every count is additive, so the matrix is kept in cooccurrence.json in the
+OLAP directory and ``--update`` adds the increments/NNNNN/ batches that
+incremental ETL runs wrote since (a batch has the bridge rows of its own new
+encounters only). ``--primary-only`` pairs only the primary (sequence 1)
+diagnosis of each encounter, like Query 2's one-join variant.
+
+    python scripts/cooccurrence.py --olap-dir data/olap --build
+    python scripts/cooccurrence.py --update --top 20 --by lift --min-count 25
+"""
+
+import argparse
+import heapq
+import json
+import os
+import time
+from pathlib import Path
+
+from bulk_load import read_manifest, table_files
+from generate_olap_data import INCREMENTS_DIRNAME
+from oltp_source import read_table
+
+COOCCURRENCE_FILENAME = "cooccurrence.json"
+
+# (table, OLAP file stem) of the two bridges
+DIAGNOSIS_BRIDGE = ("bridge_encounter_diagnoses", "bridge_diagnoses")
+PROCEDURE_BRIDGE = ("bridge_encounter_procedures", "bridge_procedures")
+
+# Pair rankings: the index of the statistic in a top_pairs entry
+RANKINGS = {"count": 2, "support": 3, "confidence": 4, "lift": 5}
+
+
+def _encounter_key(row):
+    return int(row[1])
+
+
+def _encounter_groups(rows, table_name, primary_only=False):
+    """(encounter_key, distinct keys in column 2) for each encounter of a
+    bridge row stream in encounter_key order."""
+    key, values = None, None
+    for row in rows:
+        if primary_only and int(row[3]) != 1:
+            continue
+        encounter_key = int(row[1])
+        if encounter_key != key:
+            if values is not None:
+                if encounter_key < key:
+                    raise ValueError(f"{table_name} is not in encounter_key order ({key} before {encounter_key})")
+                yield key, list(values)
+            key, values = encounter_key, {}
+        values[int(row[2])] = None
+    if values is not None:
+        yield key, list(values)
+
+
+def _merge_encounters(diagnosis_groups, procedure_groups):
+    """(encounter_key, diagnoses, procedures) from the two grouped streams;
+    an encounter missing from one side gets no keys from it."""
+    diagnosis = next(diagnosis_groups, None)
+    procedure = next(procedure_groups, None)
+    while diagnosis is not None or procedure is not None:
+        if procedure is None or (diagnosis is not None and diagnosis[0] < procedure[0]):
+            yield diagnosis[0], diagnosis[1], ()
+            diagnosis = next(diagnosis_groups, None)
+        elif diagnosis is None or procedure[0] < diagnosis[0]:
+            yield procedure[0], (), procedure[1]
+            procedure = next(procedure_groups, None)
+        else:
+            yield diagnosis[0], diagnosis[1], procedure[1]
+            diagnosis = next(diagnosis_groups, None)
+            procedure = next(procedure_groups, None)
+
+
+class CooccurrenceMatrix:
+    """Sparse diagnosis x procedure encounter counts, with the per-key
+    totals that support, confidence and lift divide by."""
+
+    __slots__ = ("primary_only", "encounters", "diagnoses", "procedures", "pairs", "batches")
+
+    def __init__(self, primary_only=False):
+        self.primary_only = primary_only
+        self.encounters = 0
+        self.diagnoses = {}     # diagnosis_key -> encounters
+        self.procedures = {}    # procedure_key -> encounters
+        self.pairs = {}         # diagnosis_key -> {procedure_key: encounters}
+        self.batches = []       # names of the increments/NNNNN batches counted
+
+    def __len__(self):
+        return sum(len(row) for row in self.pairs.values())
+
+    def add_encounter(self, diagnoses, procedures):
+        """Count one encounter's distinct diagnosis and procedure keys."""
+        self.encounters += 1
+        procedure_counts = self.procedures
+        for procedure in procedures:
+            procedure_counts[procedure] = procedure_counts.get(procedure, 0) + 1
+        for diagnosis in diagnoses:
+            self.diagnoses[diagnosis] = self.diagnoses.get(diagnosis, 0) + 1
+            row = self.pairs.get(diagnosis)
+            if row is None:
+                row = self.pairs[diagnosis] = {}
+            for procedure in procedures:
+                row[procedure] = row.get(procedure, 0) + 1
+
+    def observe(self, diagnosis_rows, procedure_rows):
+        """Count the encounters of bridge_encounter_diagnoses and
+        bridge_encounter_procedures row streams in encounter_key order;
+        returns how many were added."""
+        encounters = _merge_encounters(
+            _encounter_groups(diagnosis_rows, DIAGNOSIS_BRIDGE[0], self.primary_only),
+            _encounter_groups(procedure_rows, PROCEDURE_BRIDGE[0]),
+        )
+        added = 0
+        for _, diagnoses, procedures in encounters:
+            self.add_encounter(diagnoses, procedures)
+            added += 1
+        return added
+
+    def pair(self, diagnosis, procedure):
+        """(diagnosis_key, procedure_key, encounters, support, confidence, lift) of a pair."""
+        count = self.pairs.get(diagnosis, {}).get(procedure, 0)
+        if not count:
+            return (diagnosis, procedure, 0, 0.0, 0.0, 0.0)
+        with_diagnosis, with_procedure = self.diagnoses[diagnosis], self.procedures[procedure]
+        return (
+            diagnosis, procedure, count, count / self.encounters, count / with_diagnosis,
+            count * self.encounters / (with_diagnosis * with_procedure),
+        )
+
+    def top_pairs(self, n=20, by="count", min_count=1):
+        """The ``n`` pairs ranking highest ``by`` one of RANKINGS among the
+        pairs with at least ``min_count`` encounters, as ``pair`` tuples."""
+        statistic = RANKINGS[by]
+        candidates = (
+            self.pair(diagnosis, procedure)
+            for diagnosis, row in self.pairs.items()
+            for procedure, count in row.items()
+            if count >= min_count
+        )
+        return heapq.nlargest(n, candidates, key=lambda entry: (entry[statistic], entry[2], -entry[0], -entry[1]))
+
+    def save(self, path):
+        """Write the matrix to ``path`` (replaced atomically)."""
+        data = {
+            "primary_only": self.primary_only,
+            "encounters": self.encounters,
+            "batches": self.batches,
+            "diagnoses": sorted(self.diagnoses.items()),
+            "procedures": sorted(self.procedures.items()),
+            "pairs": [
+                [diagnosis, procedure, count]
+                for diagnosis in sorted(self.pairs)
+                for procedure, count in sorted(self.pairs[diagnosis].items())
+            ],
+        }
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(json.dumps(data) + "\n", encoding="utf-8")
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a matrix written by ``save``."""
+        data = json.loads(path.read_text(encoding="utf-8"))
+        matrix = cls(data["primary_only"])
+        matrix.encounters = data["encounters"]
+        matrix.batches = data["batches"]
+        matrix.diagnoses = dict(map(tuple, data["diagnoses"]))
+        matrix.procedures = dict(map(tuple, data["procedures"]))
+        for diagnosis, procedure, count in data["pairs"]:
+            matrix.pairs.setdefault(diagnosis, {})[procedure] = count
+        return matrix
+
+
+def bridge_rows(data_dir, table):
+    """Rows of a bridge ``(table, file stem)`` from every file of ``data_dir``
+    (the table file, shard parts or monthly partitions) in encounter_key order."""
+    table_name, file_stem = table
+    files = table_files(data_dir, file_stem, read_manifest(data_dir).get(table_name))
+    streams = [read_table(directory, stem) for directory, stem in files]
+    if len(streams) == 1:
+        return iter(streams[0])
+    return heapq.merge(*streams, key=_encounter_key)
+
+
+def _batch_dirs(olap_dir):
+    increments = olap_dir / INCREMENTS_DIRNAME
+    return sorted(path for path in increments.iterdir() if path.is_dir()) if increments.is_dir() else []
+
+
+def update(matrix, olap_dir):
+    """Add the increments/NNNNN batches of ``olap_dir`` that ``matrix`` has not
+    counted yet; returns the encounters added."""
+    added = 0
+    for batch_dir in _batch_dirs(olap_dir):
+        if batch_dir.name not in matrix.batches:
+            added += matrix.observe(bridge_rows(batch_dir, DIAGNOSIS_BRIDGE), bridge_rows(batch_dir, PROCEDURE_BRIDGE))
+            matrix.batches.append(batch_dir.name)
+    return added
+
+
+def build(olap_dir, primary_only=False):
+    """Count the bridges of ``olap_dir`` and of all its increment batches."""
+    matrix = CooccurrenceMatrix(primary_only)
+    matrix.observe(bridge_rows(olap_dir, DIAGNOSIS_BRIDGE), bridge_rows(olap_dir, PROCEDURE_BRIDGE))
+    update(matrix, olap_dir)
+    return matrix
+
+
+def labels(olap_dir, file_stem):
+    """{key: (code, description)} of dim_diagnosis or dim_procedure, including
+    rows added by increment batches."""
+    found = {}
+    for directory in [olap_dir] + _batch_dirs(olap_dir):
+        if table_files(directory, file_stem):
+            found.update((int(row[0]), (row[2], row[3])) for row in read_table(directory, file_stem))
+    return found
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rank diagnosis-procedure pairs from the OLAP bridge tables.")
+    parser.add_argument("--olap-dir", type=Path, default=Path(__file__).parent.parent / "data" / "olap",
+                        help="directory written by generate_olap_data.py (default: data/olap)")
+    parser.add_argument("--build", action="store_true",
+                        help=f"(re)count {COOCCURRENCE_FILENAME} from the bridges and all increment batches")
+    parser.add_argument("--update", action="store_true",
+                        help="add the increment batches written since the last --build or --update")
+    parser.add_argument("--primary-only", action="store_true",
+                        help="with --build: pair only each encounter's primary diagnosis")
+    parser.add_argument("--top", type=int, default=20, help="pairs to list (default: %(default)s)")
+    parser.add_argument("--by", choices=RANKINGS, default="count", help="rank pairs by (default: %(default)s)")
+    parser.add_argument("--min-count", type=int, default=1,
+                        help="only rank pairs seen in at least this many encounters (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.olap_dir / COOCCURRENCE_FILENAME
+    if args.build or args.update:
+        started = time.perf_counter()
+        if args.build:
+            matrix = build(args.olap_dir, args.primary_only)
+            added = matrix.encounters
+        elif path.exists():
+            matrix = CooccurrenceMatrix.load(path)
+            added = update(matrix, args.olap_dir)
+        else:
+            raise SystemExit(f"error: {path} not found (rerun with --build)")
+        matrix.save(path)
+        print(f"  [OK] {path}: {added:,} encounters added, {matrix.encounters:,} total, "
+              f"{len(matrix):,} pairs ({time.perf_counter() - started:.2f}s)")
+    if not path.exists():
+        raise SystemExit(f"error: {path} not found (rerun with --build)")
+    matrix = CooccurrenceMatrix.load(path)
+
+    started = time.perf_counter()
+    top = matrix.top_pairs(args.top, args.by, args.min_count)
+    elapsed = (time.perf_counter() - started) * 1000
+    scope = "primary diagnosis" if matrix.primary_only else "diagnosis"
+    print(f"  Top {len(top)} {scope}-procedure pairs by {args.by} of {len(matrix):,} pairs "
+          f"over {matrix.encounters:,} encounters ({elapsed:.2f} ms)")
+    diagnoses, procedures = labels(args.olap_dir, "dim_diagnosis"), labels(args.olap_dir, "dim_procedure")
+    print(f"    {'icd10':<8}  {'cpt':<6}  {'encounters':>10}  {'support':>8}  {'confidence':>10}  {'lift':>6}")
+    for diagnosis, procedure, count, support, confidence, lift in top:
+        icd10, icd10_description = diagnoses.get(diagnosis, (f"#{diagnosis}", ""))
+        cpt, cpt_description = procedures.get(procedure, (f"#{procedure}", ""))
+        print(f"    {icd10:<8}  {cpt:<6}  {count:>10,}  {support:>8.2%}  {confidence:>10.2%}  {lift:>6.2f}  "
+              f"{icd10_description} / {cpt_description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Dictionary Encoding
+===================
+Dictionary-encoded string columns for the fact table.
+
+Every fact_encounters row repeats its provider's specialty, department and
+name, its encounter type and its primary diagnosis as full strings, although
+each column only has a few dozen to a few thousand distinct values. Held as
+a ValueDictionary (the distinct values, numbered in order of appearance) and
+an ``array("i")`` of codes, such a column costs 4 bytes per row instead of an
+8-byte reference per row plus the strings, and work that depends only on the
+value (rendering, quoting, grouping) is done once per distinct value:
+
+- DictionaryColumn is a ColumnBlock column in this form. The numpy fact
+  stream yields its string columns as DictionaryColumns (the codes are the
+  provider, type and diagnosis indexes it draws anyway), the writers in
+  output_formats.py render each dictionary entry once and look the rows up,
+  and PartitionedWriter splits a block by its codes.
+- dimension_cache.DimensionCache encodes the denormalized attributes of the
+  OLTP transform with ValueDictionary.
+- export_parquet.py converts the fact's string columns to Arrow dictionary
+  arrays, which Parquet stores as dictionary pages and readers get back as
+  dictionary columns.
+- bitmap_index.BitmapIndex groups the rows of a DictionaryColumn by code and
+  looks up each distinct value's bitmap once.
+"""
+
+from array import array
+
+# The fact's denormalized string columns (see olap_schema/star_schema.sql)
+FACT_STRING_COLUMNS = (
+    "encounter_month_name", "specialty_name", "specialty_code", "department_name", "provider_name",
+    "encounter_type", "primary_icd10_code", "primary_icd10_description",
+)
+
+
+class ValueDictionary:
+    """Distinct values of a column, each with an int code (its position in ``values``)."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        """Code of ``value``, added to the dictionary if it is new."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values):
+        """Codes of ``values`` as an ``array("i")``."""
+        codes, code = self.codes, self.code
+        return array("i", [codes[value] if value in codes else code(value) for value in values])
+
+    def column(self, values):
+        """``values`` as a DictionaryColumn over this dictionary."""
+        return DictionaryColumn(self.encode(values), self.values)
+
+
+class DictionaryColumn:
+    """A column given as int ``codes`` into a list of distinct ``values``.
+
+    Reads like the decoded sequence (``len``, iteration, indexing), so code
+    that is not dictionary-aware can take it where a list is expected.
+    """
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def __getitem__(self, position):
+        return self.values[self.codes[position]]
+
+    def take(self, positions):
+        """The rows at ``positions``, still encoded over the same values."""
+        codes = self.codes
+        return DictionaryColumn(array("i", [codes[position] for position in positions]), self.values)
+
+    def groups(self, keys):
+        """{value: array("I") of the ``keys`` of its rows}, grouped by code."""
+        grouped = [None] * len(self.values)
+        for code, key in zip(self.codes, keys):
+            group = grouped[code]
+            if group is None:
+                group = grouped[code] = array("I")
+            group.append(key)
+        return {self.values[code]: group for code, group in enumerate(grouped) if group is not None}
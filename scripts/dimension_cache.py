@@ -0,0 +1,120 @@
+"""
+Dimension Caches
+================
+Compact in-memory lookups for the OLTP -> star schema transform, sized for
+millions of dimension rows:
+
+- KeyMap: natural id -> integer (surrogate key or row position) in a typed
+  array indexed by id, since OLTP ids are dense auto-increment values. Ids
+  far outside the array's range go to an overflow dict, so a few sparse
+  ids cannot blow the array up.
+- DimensionCache: a dimension's rows by position, with natural id ->
+  position in a KeyMap, the surrogate keys in an array, and every
+  attribute dictionary encoded (an int code per row plus a
+  dictionary_encoding.ValueDictionary of the distinct values).
+  Denormalized strings are stored once per distinct value, not once per
+  row.
+
+The fact builder keeps row positions instead of natural ids and reads each
+denormalized attribute with two list lookups (``values[codes[position]]``):
+8 bytes per id and 4 bytes per attribute per row, versus a dict entry plus
+a tuple per row.
+"""
+
+from array import array
+
+from dictionary_encoding import ValueDictionary
+
+# KeyMap slot of an id without a value (keys and positions are never negative)
+_MISSING = -1
+
+# Ids up to this far past the end of a KeyMap's array extend it; ids beyond
+# that (or negative ones) are kept in the overflow dict
+_DENSE_SLACK = 1 << 20
+
+
+class KeyMap:
+    """Natural id -> non-negative int, with the dict ``get`` / ``[]=`` / ``in`` interface."""
+
+    __slots__ = ("values", "overflow", "size")
+
+    def __init__(self, items=()):
+        self.values = array("q")
+        self.overflow = {}
+        self.size = 0
+        for natural_id, value in items:
+            self[natural_id] = value
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, natural_id):
+        return self.get(natural_id) is not None
+
+    def get(self, natural_id, default=None):
+        if 0 <= natural_id < len(self.values):
+            value = self.values[natural_id]
+            return default if value == _MISSING else value
+        return self.overflow.get(natural_id, default)
+
+    def __setitem__(self, natural_id, value):
+        values = self.values
+        if 0 <= natural_id < len(values) + _DENSE_SLACK:
+            if natural_id >= len(values):
+                values.extend(array("q", [_MISSING]) * (natural_id + 1 - len(values)))
+            self.size += values[natural_id] == _MISSING
+            values[natural_id] = value
+        else:
+            self.size += natural_id not in self.overflow
+            self.overflow[natural_id] = value
+
+
+class DimensionCache:
+    """Surrogate keys and dictionary-encoded attributes of a dimension, by row position.
+
+    ``attributes`` names the cached columns; ``add`` takes their values in
+    that order. Hot loops bind ``keys`` and ``column(name)`` once and index
+    them by the position that ``position`` returned.
+    """
+
+    __slots__ = ("attributes", "positions", "keys", "codes", "values", "dictionaries")
+
+    def __init__(self, attributes):
+        self.attributes = tuple(attributes)
+        self.positions = KeyMap()
+        self.keys = array("q")
+        self.codes = [array("i") for _ in self.attributes]
+        self.dictionaries = [ValueDictionary() for _ in self.attributes]
+        self.values = [dictionary.values for dictionary in self.dictionaries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, natural_id, key, attributes):
+        """Cache (or replace) a row; returns its position."""
+        position = self.positions.get(natural_id)
+        if position is None:
+            position = self.positions[natural_id] = len(self.keys)
+            self.keys.append(key)
+            for codes, dictionary, value in zip(self.codes, self.dictionaries, attributes):
+                codes.append(dictionary.code(value))
+        else:
+            self.keys[position] = key
+            for codes, dictionary, value in zip(self.codes, self.dictionaries, attributes):
+                codes[position] = dictionary.code(value)
+        return position
+
+    def position(self, natural_id):
+        """Row position of a natural id, or None if it is not cached."""
+        return self.positions.get(natural_id)
+
+    def column(self, name):
+        """(codes, values) of an attribute: row ``p`` has ``values[codes[p]]``."""
+        i = self.attributes.index(name)
+        return self.codes[i], self.values[i]
+
+    def row(self, position):
+        """(key, *attributes) of the row at ``position``, decoded."""
+        return (self.keys[position],) + tuple(
+            values[codes[position]] for codes, values in zip(self.codes, self.values)
+        )
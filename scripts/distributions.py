@@ -0,0 +1,134 @@
+"""
+Data Distributions
+==================
+Volume scaling and skew models for the random generators (``--scale``,
+``--patient-skew``, ``--provider-skew``, ``--seasonality``).
+
+Real encounter data is far from uniform: a few frequent-flyer patients and
+busy providers account for a large share of encounters, and volumes peak in
+the winter. Uniform keys hide hot-key and index-contention effects, so the
+generators can draw from:
+
+- zipf_sampler: positions ``0 .. size-1`` where the k-th most frequent has
+  weight ``1 / k**exponent``. Ranks are spread over the range by a stride
+  coprime with ``size``, so hot keys are scattered across the id space
+  instead of all sitting in the first index pages.
+- seasonal_sampler: day offsets of a date range weighted by a yearly cosine
+  peaking in mid-January (flu season), ``amplitude`` 0 (flat) to <1.
+
+distinct_sample draws small sets without replacement (an encounter's
+diagnoses or procedures) by a partial Fisher-Yates shuffle: one draw per
+member and no retries, however many members are already taken.
+
+With exponent / amplitude 0 a Sampler makes exactly the draws the generators
+always made (``rng.randint`` over the same range), so default output is
+unchanged. vectorized.sample is the NumPy counterpart of Sampler.index.
+"""
+
+import math
+from array import array
+from bisect import bisect_right
+from datetime import date
+from functools import lru_cache
+from itertools import accumulate
+
+# Reference day of the seasonal peak (only its day of year matters)
+SEASONAL_PEAK = date(2000, 1, 15).toordinal()
+
+DAYS_PER_YEAR = 365.2425
+
+
+def scaled(count, scale):
+    """``count`` rows at scale factor ``scale`` (at least one)."""
+    return max(1, round(count * scale))
+
+
+class Sampler:
+    """Draws positions ``0 .. size-1``, uniformly or by cumulative weights."""
+
+    __slots__ = ("size", "cumulative", "total", "stride")
+
+    def __init__(self, size, weights=None, stride=1):
+        self.size = size
+        self.cumulative = None if weights is None else array("d", accumulate(weights))
+        self.total = self.cumulative[-1] if weights is not None else float(size)
+        self.stride = stride
+
+    def index(self, rng):
+        """One position drawn with a random.Random."""
+        if self.cumulative is None:
+            return rng.randint(0, self.size - 1)
+        rank = min(bisect_right(self.cumulative, rng.random() * self.total), self.size - 1)
+        return rank * self.stride % self.size
+
+
+def _coprime_stride(size):
+    """A stride near size / golden ratio that visits every position of ``size`` once."""
+    stride = max(1, int(size * 0.6180339887))
+    while math.gcd(stride, size) != 1:
+        stride += 1
+    return stride
+
+
+@lru_cache(maxsize=8)
+def zipf_sampler(size, exponent=0.0):
+    """Zipf-skewed positions; uniform when ``exponent`` is 0."""
+    if exponent <= 0:
+        return Sampler(size)
+    return Sampler(size, (k ** -exponent for k in range(1, size + 1)), _coprime_stride(size))
+
+
+@lru_cache(maxsize=8)
+def seasonal_sampler(first_ordinal, num_days, amplitude=0.0):
+    """Day offsets of ``num_days`` days from ``first_ordinal``, seasonally weighted."""
+    if amplitude <= 0:
+        return Sampler(num_days)
+    phase = 2 * math.pi / DAYS_PER_YEAR
+    return Sampler(
+        num_days,
+        (1 + amplitude * math.cos(phase * (first_ordinal + day - SEASONAL_PEAK)) for day in range(num_days)),
+    )
+
+
+def distinct_sample(rng, pool, k):
+    """``k`` distinct entries of the list ``pool``, in draw order.
+
+    Shuffles the first ``k`` slots of ``pool`` in place; the pool stays a
+    permutation of its entries, so it is reused across calls as it is.
+    """
+    size = len(pool)
+    for j in range(k):
+        r = j + int(rng.random() * (size - j))
+        pool[j], pool[r] = pool[r], pool[j]
+    return pool[:k]
+
+
+class Skew:
+    """Skew settings handed to the row generators (and, pickled, to shard workers)."""
+
+    __slots__ = ("patients", "providers", "seasonality")
+
+    def __init__(self, patients=0.0, providers=0.0, seasonality=0.0):
+        self.patients = patients
+        self.providers = providers
+        self.seasonality = seasonality
+
+    def __str__(self):
+        if not (self.patients or self.providers or self.seasonality):
+            return "uniform"
+        return (
+            f"Zipf {self.patients:g} patients, Zipf {self.providers:g} providers, "
+            f"seasonality {self.seasonality:g}"
+        )
+
+    def patient_sampler(self, size):
+        return zipf_sampler(size, self.patients)
+
+    def provider_sampler(self, size):
+        return zipf_sampler(size, self.providers)
+
+    def day_sampler(self, first_ordinal, num_days):
+        return seasonal_sampler(first_ordinal, num_days, self.seasonality)
+
+
+UNIFORM = Skew()
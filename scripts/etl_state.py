@@ -0,0 +1,241 @@
+"""
+Incremental ETL State
+=====================
+What an incremental ``--source oltp --incremental`` refresh remembers between
+runs, kept in one SQLite file (default: <output dir>/etl_state.db) so a run's
+watermarks, key maps and stay history are committed together or not at all:
+
+- watermark: name -> JSON value (batch number, last encounter_id, last
+  billing_id, next fact/bridge keys)
+- dimension_keys: (dimension, natural id) -> (surrogate key, row hash), used
+  to keep surrogate keys stable and to spot changed dimension rows (for the
+  SCD2 dim_patient: the current version's key and hash)
+- inpatient_stays: every inpatient stay with its current readmission days,
+  indexed by natural patient_id so a refresh only reads the patients it
+  touches
+- encounter_groups: the summary-aggregate grain of every fact row (year,
+  month, specialty, encounter type), indexed by encounter_key and natural
+  encounter_id, so changes to earlier facts (readmission flags, late claims)
+  can be applied to the aggregates as delta rows
+"""
+
+import hashlib
+import json
+import sqlite3
+
+STATE_FILENAME = "etl_state.db"
+
+# Patients per "IN (...)" lookup (SQLite's default host parameter limit is 999)
+_LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermark (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dimension_keys (
+    dimension TEXT NOT NULL,
+    natural_id INTEGER NOT NULL,
+    surrogate_key INTEGER NOT NULL,
+    row_hash INTEGER NOT NULL,
+    PRIMARY KEY (dimension, natural_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS inpatient_stays (
+    encounter_key INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    admit_seconds INTEGER NOT NULL,
+    discharge_seconds INTEGER NOT NULL,
+    days_since_last INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_stays_patient ON inpatient_stays (patient_id);
+CREATE TABLE IF NOT EXISTS encounter_groups (
+    encounter_key INTEGER PRIMARY KEY,
+    encounter_id INTEGER NOT NULL,
+    encounter_year INTEGER NOT NULL,
+    encounter_month INTEGER NOT NULL,
+    specialty_key INTEGER,
+    encounter_type_key INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_groups_encounter_id ON encounter_groups (encounter_id);
+"""
+
+
+def row_hash(values):
+    """Stable signed 64-bit hash of a row's values (fits an SQLite INTEGER)."""
+    digest = hashlib.blake2b(repr(tuple(values)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class SurrogateKeys:
+    """Natural id -> surrogate key; unseen ids get the key after the largest one."""
+
+    __slots__ = ("keys", "next_key")
+
+    def __init__(self, keys=None):
+        self.keys = dict(keys or {})
+        self.next_key = max(self.keys.values(), default=0) + 1
+
+    def __call__(self, natural_id):
+        key = self.keys.get(natural_id)
+        if key is None:
+            key = self.keys[natural_id] = self.next_key
+            self.next_key += 1
+        return key
+
+
+class ClaimWatermark:
+    """Highest billing_id processed.
+
+    billing is insert-only with increasing ids, so the next run reads the
+    claims past this id whatever their claim_date: a claim entered late and
+    dated before the newest claim already loaded is still picked up. (A
+    billing row edited in place is not seen again.)
+
+    A state written before billing ids were tracked only has the latest
+    claim_date and the billing_ids processed on it (``claim_date``,
+    ``billing_ids``). The first run on it scans billing from that day, as
+    those runs did, and records a billing_id watermark from then on; claims
+    dated before that day that were already in billing stay unprocessed.
+    """
+
+    __slots__ = ("billing_id", "claim_date", "billing_ids")
+
+    def __init__(self, billing_id=0, claim_date="", billing_ids=()):
+        self.billing_id = billing_id
+        self.claim_date = claim_date
+        self.billing_ids = set(billing_ids)
+
+    @property
+    def legacy(self):
+        """True for a claim_date watermark of an older state."""
+        return bool(self.claim_date)
+
+    def since(self, new_encounters):
+        """read_table filter of the billing rows to scan; ``new_encounters``
+        is the filter of the run's new encounters."""
+        if self.legacy:
+            return dict(new_encounters, claim_date=self.claim_date)
+        return {"billing_id": self.billing_id + 1}
+
+    def seen(self, billing_id, claim_date):
+        if self.legacy:
+            return claim_date == self.claim_date and billing_id in self.billing_ids
+        return billing_id <= self.billing_id
+
+    def advance(self, billing_id):
+        if billing_id > self.billing_id:
+            self.billing_id = billing_id
+
+
+class EtlState:
+    """SQLite-backed state store; use as a context manager to commit on success."""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+
+    @property
+    def initialized(self):
+        """True once a full build has recorded its state."""
+        return self.get("batch") is not None
+
+    def get(self, name, default=None):
+        row = self.connection.execute("SELECT value FROM watermark WHERE name = ?", (name,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, name, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO watermark (name, value) VALUES (?, ?)", (name, json.dumps(value))
+        )
+
+    def claim_watermark(self):
+        billing_id = self.get("last_billing_id")
+        if billing_id is None:
+            return ClaimWatermark(0, self.get("claim_date", ""), self.get("claim_billing_ids", []))
+        return ClaimWatermark(billing_id)
+
+    def set_claim_watermark(self, watermark):
+        self.set("last_billing_id", watermark.billing_id)
+
+    def dimension_keys(self, dimension):
+        """{natural id: (surrogate key, row hash)} of one dimension, in one query."""
+        cursor = self.connection.execute(
+            "SELECT natural_id, surrogate_key, row_hash FROM dimension_keys WHERE dimension = ?", (dimension,)
+        )
+        return {natural_id: (key, digest) for natural_id, key, digest in cursor}
+
+    def iter_dimension_keys(self, dimension):
+        """Stream (natural id, surrogate key, row hash) of one dimension in natural id order."""
+        return self.connection.execute(
+            "SELECT natural_id, surrogate_key, row_hash FROM dimension_keys WHERE dimension = ? "
+            "ORDER BY natural_id",
+            (dimension,),
+        )
+
+    def save_dimension_keys(self, dimension, entries):
+        """Record (natural id, surrogate key, row hash) entries of one dimension."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO dimension_keys VALUES (?, ?, ?, ?)",
+            ((dimension, natural_id, key, digest) for natural_id, key, digest in entries),
+        )
+
+    def _select_in(self, select, column, values):
+        """Rows of ``select`` + `` WHERE column IN (...)``, looked up in batches."""
+        values = sorted(values)
+        rows = []
+        for start in range(0, len(values), _LOOKUP_BATCH):
+            batch = values[start:start + _LOOKUP_BATCH]
+            rows += self.connection.execute(f"{select} WHERE {column} IN ({', '.join('?' * len(batch))})", batch)
+        return rows
+
+    def stays_for(self, patient_ids):
+        """Stored stays of the given patients as
+        (patient_id, admit_seconds, discharge_seconds, encounter_key, days_since_last)."""
+        return self._select_in(
+            "SELECT patient_id, admit_seconds, discharge_seconds, encounter_key, days_since_last "
+            "FROM inpatient_stays",
+            "patient_id", patient_ids,
+        )
+
+    def groups_for(self, encounter_keys):
+        """{encounter_key: (year, month, specialty_key, encounter_type_key)} of the given fact rows."""
+        rows = self._select_in(
+            "SELECT encounter_key, encounter_year, encounter_month, specialty_key, encounter_type_key "
+            "FROM encounter_groups",
+            "encounter_key", encounter_keys,
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def groups_by_id(self, encounter_ids):
+        """{encounter_id: (encounter_key, year, month, specialty_key, encounter_type_key)}
+        of the loaded encounters among ``encounter_ids``."""
+        rows = self._select_in(
+            "SELECT encounter_id, encounter_key, encounter_year, encounter_month, specialty_key, encounter_type_key "
+            "FROM encounter_groups",
+            "encounter_id", encounter_ids,
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def save_groups(self, groups):
+        """Record (encounter_key, encounter_id, year, month, specialty_key, encounter_type_key) rows."""
+        self.connection.executemany("INSERT OR REPLACE INTO encounter_groups VALUES (?, ?, ?, ?, ?, ?)", groups)
+
+    def save_stays(self, stays):
+        """Insert or update (patient_id, admit, discharge, encounter_key, days_since_last) stays."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO inpatient_stays "
+            "(patient_id, admit_seconds, discharge_seconds, encounter_key, days_since_last) "
+            "VALUES (?, ?, ?, ?, ?)",
+            stays,
+        )
@@ -0,0 +1,246 @@
+"""
+Partitioned Parquet Export
+==========================
+Exports the fact and bridge tables written by generate_olap_data.py to
+Parquet datasets that can be queried straight from files:
+
+    <output dir>/fact_encounters/encounter_year=2024/encounter_month=3/part-0.parquet
+    <output dir>/bridge_encounter_diagnoses/encounter_year=2024/encounter_month=3/part-0.parquet
+    <output dir>/bridge_encounter_procedures/...
+
+All three tables are partitioned by the encounter's year and month (hive
+style, so engines recover the two columns from the path and prune whole
+directories on them). Bridge rows take the partition of their encounter; the
+fact table is read first and only an encounter_key -> month array is kept.
+The fact's denormalized string columns are converted to Arrow dictionary
+arrays (dictionary_encoding.ValueDictionary codes per batch) and written as
+Parquet dictionary pages, so they load back as dictionary columns; every row
+group carries min/max statistics for predicate pushdown.
+
+The OLAP files can be in any of the generator's output formats. The
+parts of a --keep-parts run and the monthly files of a --partition-by month
+run (parts/, partitions/) are read one by one as their manifest.json lists
+them. Requires
+pyarrow. Typical use:
+
+    python scripts/generate_olap_data.py --format tsv
+    python scripts/export_parquet.py --olap-dir data/olap --output-dir data/olap_parquet
+"""
+
+import argparse
+from array import array
+from itertools import chain
+from pathlib import Path
+
+from bulk_load import read_manifest, table_files
+from dictionary_encoding import FACT_STRING_COLUMNS, ValueDictionary
+from generate_olap_data import OLAP_DIR, TABLE_COLUMNS
+from oltp_source import read_table
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is optional; only this export needs it
+    pa = ds = None
+
+# (table_name, OLAP file stem) of every exported table; the fact comes first
+EXPORTED_TABLES = (
+    ("fact_encounters", "fact_encounters"),
+    ("bridge_encounter_diagnoses", "bridge_diagnoses"),
+    ("bridge_encounter_procedures", "bridge_procedures"),
+)
+
+PARTITION_COLUMNS = ("encounter_year", "encounter_month")
+
+# Arrow type of every column that is not an INT (see olap_schema/star_schema.sql)
+COLUMN_TYPES = {
+    "encounter_date": "timestamp",
+    "discharge_date": "timestamp",
+    "procedure_date": "date",
+    **dict.fromkeys(FACT_STRING_COLUMNS, "dictionary"),
+    "is_weekend": "bool",
+    "is_inpatient": "bool",
+    "is_readmission": "bool",
+    "total_claim_amount": "decimal",
+    "total_allowed_amount": "decimal",
+}
+
+COMPRESSIONS = ("zstd", "snappy", "gzip", "none")
+
+DEFAULT_ROW_GROUP_SIZE = 128 * 1024
+
+# Rows converted to Arrow at a time
+_BATCH_ROWS = 64 * 1024
+
+
+def arrow_type(column):
+    kind = COLUMN_TYPES.get(column, "int")
+    return {
+        "int": pa.int32(),
+        "string": pa.string(),
+        "dictionary": pa.dictionary(pa.int32(), pa.string()),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("s"),
+        "date": pa.date32(),
+        "decimal": pa.decimal128(12, 2),
+    }[kind]
+
+
+def arrow_schema(table_name):
+    """Arrow schema of an exported table: its columns, then any partition columns it lacks."""
+    columns = TABLE_COLUMNS[table_name]
+    extra = tuple(column for column in PARTITION_COLUMNS if column not in columns)
+    return pa.schema([pa.field(column, arrow_type(column)) for column in columns + extra])
+
+
+def _arrow_column(values, target):
+    """Convert one column of parsed values to ``target``.
+
+    Text formats yield strings and SQL files yield Python values, so every
+    value goes through its text form and Arrow's string casts; that keeps
+    decimals exact whichever format the file was in. Dictionary columns
+    are encoded with a dictionary of the batch's distinct strings.
+    """
+    if pa.types.is_dictionary(target):
+        dictionary = ValueDictionary()
+        codes = [None if value is None else dictionary.code(str(value)) for value in values]
+        return pa.DictionaryArray.from_arrays(
+            pa.array(codes, target.index_type), pa.array(dictionary.values, target.value_type)
+        )
+    strings = pa.array([None if value is None else str(value) for value in values], pa.string())
+    return strings if target == pa.string() else strings.cast(target)
+
+
+def _record_batch(schema, rows, partitions=None):
+    columns = list(zip(*rows))
+    if partitions is not None:
+        columns += partitions
+    arrays = [_arrow_column(values, field.type) for values, field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == _BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def table_rows(olap_dir, table_name, file_stem):
+    """Rows of a table from every file of ``olap_dir``: the files listed in
+    its manifest.json (shard parts or monthly partitions), else the table file.
+
+    Partitioned files are not in encounter_key order across files; the
+    export does not need them to be, as bridge rows look their encounter's
+    month up in the array the fact fills.
+    """
+    olap_dir = Path(olap_dir)
+    files = table_files(olap_dir, file_stem, read_manifest(olap_dir).get(table_name))
+    if not files:
+        raise FileNotFoundError(f"no {file_stem} data file in {olap_dir}")
+    return chain.from_iterable(read_table(directory, stem) for directory, stem in files)
+
+
+def fact_batches(olap_dir, encounter_months):
+    """Record batches of the fact table; fills ``encounter_months``
+    (encounter_key -> year * 12 + month - 1, 0 if unknown)."""
+    schema = arrow_schema("fact_encounters")
+    columns = TABLE_COLUMNS["fact_encounters"]
+    key_idx, year_idx, month_idx = (columns.index(c) for c in ("encounter_key",) + PARTITION_COLUMNS)
+    for batch in _batched(table_rows(olap_dir, "fact_encounters", "fact_encounters")):
+        for row in batch:
+            key = int(row[key_idx])
+            if key >= len(encounter_months):
+                encounter_months.extend([0] * (key + 1 - len(encounter_months)))
+            encounter_months[key] = int(row[year_idx]) * 12 + int(row[month_idx]) - 1
+        yield _record_batch(schema, batch)
+
+
+def bridge_batches(olap_dir, table_name, file_stem, encounter_months):
+    """Record batches of a bridge table, each row tagged with its encounter's year and month."""
+    schema = arrow_schema(table_name)
+    key_idx = TABLE_COLUMNS[table_name].index("encounter_key")
+    for batch in _batched(table_rows(olap_dir, table_name, file_stem)):
+        months = []
+        for row in batch:
+            key = int(row[key_idx])
+            month = encounter_months[key] if key < len(encounter_months) else 0
+            if not month:
+                raise ValueError(f"{table_name}: encounter_key {key} is not in fact_encounters")
+            months.append(month)
+        yield _record_batch(schema, batch, [[m // 12 for m in months], [m % 12 + 1 for m in months]])
+
+
+def write_partitioned(path, schema, batches, compression="zstd", row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Write record batches as a hive-partitioned Parquet dataset; returns the row count."""
+    written = 0
+
+    def counted():
+        nonlocal written
+        for batch in batches:
+            written += batch.num_rows
+            yield batch
+
+    string_columns = [
+        field.name for field in schema if field.type == pa.string() or pa.types.is_dictionary(field.type)
+    ]
+    options = ds.ParquetFileFormat().make_write_options(
+        compression=None if compression == "none" else compression,
+        use_dictionary=string_columns,
+        write_statistics=True,
+    )
+    partitioning = ds.partitioning(
+        pa.schema([schema.field(column) for column in PARTITION_COLUMNS]), flavor="hive"
+    )
+    ds.write_dataset(
+        counted(), path, schema=schema, format="parquet", partitioning=partitioning,
+        file_options=options, basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching", preserve_order=True,
+        min_rows_per_group=min(row_group_size, _BATCH_ROWS), max_rows_per_group=row_group_size,
+    )
+    return written
+
+
+def export_star_schema(olap_dir, output_dir, compression="zstd", row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Export the fact and bridge tables of ``olap_dir`` to partitioned Parquet under ``output_dir``."""
+    encounter_months = array("i")
+    for table_name, file_stem in EXPORTED_TABLES:
+        if table_name == "fact_encounters":
+            batches = fact_batches(olap_dir, encounter_months)
+        else:
+            batches = bridge_batches(olap_dir, table_name, file_stem, encounter_months)
+        path = Path(output_dir) / table_name
+        written = write_partitioned(path, arrow_schema(table_name), batches, compression, row_group_size)
+        num_partitions = sum(1 for _ in path.glob("*/*/*.parquet"))
+        print(f"  [OK] {table_name}: {written:,} rows in {num_partitions} partitions")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the OLAP fact and bridge tables to partitioned Parquet.")
+    parser.add_argument("--olap-dir", type=Path, default=OLAP_DIR,
+                        help="directory written by generate_olap_data.py (default: data/olap)")
+    parser.add_argument("--output-dir", type=Path, default=OLAP_DIR.parent / "olap_parquet",
+                        help="dataset root; one directory per table (default: data/olap_parquet)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="zstd",
+                        help="Parquet compression codec (default: %(default)s)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help="maximum rows per row group (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if pa is None:
+        parser.error("Parquet export requires pyarrow (pip install pyarrow)")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Exporting {args.olap_dir} to Parquet...")
+    export_star_schema(args.olap_dir, args.output_dir, args.compression, args.row_group_size)
+    print(f"\nDataset written to: {args.output_dir.absolute()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,73 @@ Generates OLAP dimension and fact table data from OLTP source data.
 Includes aggressive denormalization for zero-join queries.
 """
 
+import argparse
 import random
-from datetime import datetime, timedelta
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
+from aggregates import AGGREGATE_COLUMNS, FactAggregates
+from bitmap_index import BITMAPS_FILENAME, BitmapIndex
+from calendar_table import MONTH_NAMES, SECONDS_PER_DAY, Calendar
+from checkpoint import Checkpoint, restore_rng, rng_state
+from compression import COMPRESSIONS, check_compression
+from distributions import UNIFORM, Skew, distinct_sample, scaled
+from dictionary_encoding import DictionaryColumn, ValueDictionary
+from dimension_cache import DimensionCache, KeyMap
+from etl_state import STATE_FILENAME, ClaimWatermark, EtlState, SurrogateKeys, row_hash
+from instrumentation import RunReport, file_bytes
+from oltp_source import read_table
+from partitioning import (
+    PARTITIONED_TABLES, PARTITIONINGS, PARTITIONS_DIRNAME, PartitionedWriter, date_key_month, partition_ddl,
+    partition_filename, partition_name,
+)
+from output_formats import (
+    DEFAULT_BATCH_SIZE, FORMATS, ColumnBlock, TableWriter, generated_at, output_filename, update_statement,
+    write_loader_scripts, write_statements, write_table,
+)
+from readmission import find_readmissions
+from scd2 import Scd2Processor, VersionMap
+from sharding import (
+    assemble_table, open_part, part_path, run_parallel, shard_random, shard_ranges, write_manifest,
+)
+from task_graph import TaskGraph
+
+try:
+    import numpy as np
+    import vectorized
+except ImportError:  # NumPy is optional; only --backend numpy needs it
+    np = vectorized = None
+
 # Seed for reproducibility
-random.seed(42)
+SEED = 42
+random.seed(SEED)
 
 # Paths
 OLTP_DIR = Path(__file__).parent.parent / "data" / "oltp"
 OLAP_DIR = Path(__file__).parent.parent / "data" / "olap"
 
+# Output format (overridable from the command line)
+OUTPUT_FORMAT = "insert"
+BATCH_SIZE = DEFAULT_BATCH_SIZE
+COMPRESSION = "none"
+COMPRESSION_LEVEL = None
+
+# Data volume (random source; multiplied by --scale)
+NUM_PATIENTS = 10000
+NUM_PROVIDERS = 500
+NUM_ENCOUNTERS = 10000
+
+# Encounter dates of the random source span these days (inclusive)
+ENCOUNTER_START = datetime(2020, 1, 1)
+ENCOUNTER_END = datetime(2025, 12, 31)
+
+# Last day a random encounter's dates can reach: inpatient stays last up to
+# 14 days and procedures fall up to 3 days after admission. dim_date must
+# cover ENCOUNTER_START .. LAST_ENCOUNTER_DAY.
+LAST_ENCOUNTER_DAY = ENCOUNTER_END + timedelta(days=14)
+
 # =============================================================================
 # STATIC DATA (copied from OLTP generator for consistency)
 # =============================================================================
@@ -77,6 +133,11 @@ ENCOUNTER_TYPES = [
     ("ER", "Emergency", False, 6.0),
 ]
 
+# Random-source encounter mix (60% outpatient, 25% inpatient, 15% ER) and
+# claim amount range (low, high), both indexed like ENCOUNTER_TYPES
+ENCOUNTER_TYPE_WEIGHTS = [60, 25, 15]
+CLAIM_AMOUNT_RANGES = [(100, 2000), (5000, 100000), (500, 10000)]
+
 FIRST_NAMES = [
     "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
     "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
@@ -89,43 +150,432 @@ LAST_NAMES = [
     "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas",
 ]
 
-MONTH_NAMES = ["", "January", "February", "March", "April", "May", "June",
-               "July", "August", "September", "October", "November", "December"]
+# Column order of every generated row (matches olap_schema/star_schema.sql)
+TABLE_COLUMNS = {
+    "dim_date": (
+        "date_key", "calendar_date", "year", "quarter", "month", "month_name", "week_of_year",
+        "day_of_month", "day_of_week", "day_name", "is_weekend", "fiscal_year", "fiscal_quarter",
+    ),
+    "dim_specialty": ("specialty_key", "specialty_id", "specialty_name", "specialty_code"),
+    "dim_department": ("department_key", "department_id", "department_name", "floor", "capacity"),
+    "dim_encounter_type": ("encounter_type_key", "type_code", "type_name", "is_inpatient", "avg_los_hours"),
+    "dim_diagnosis": ("diagnosis_key", "diagnosis_id", "icd10_code", "icd10_description"),
+    "dim_procedure": ("procedure_key", "procedure_id", "cpt_code", "cpt_description"),
+    "dim_patient": (
+        "patient_key", "patient_id", "first_name", "last_name", "full_name", "date_of_birth",
+        "age", "age_group", "gender", "gender_desc", "mrn", "effective_date", "expiration_date", "is_current",
+    ),
+    "dim_provider": (
+        "provider_key", "provider_id", "first_name", "last_name", "full_name", "credential",
+        "specialty_key", "specialty_id", "specialty_name", "specialty_code",
+        "department_key", "department_id", "department_name",
+    ),
+    "fact_encounters": (
+        "encounter_key", "encounter_id", "encounter_date_key", "discharge_date_key",
+        "patient_key", "provider_key", "department_key", "encounter_type_key", "specialty_key",
+        "primary_diagnosis_key", "encounter_date", "discharge_date", "encounter_year",
+        "encounter_month", "encounter_month_name", "encounter_quarter", "encounter_day_of_week",
+        "is_weekend", "specialty_name", "specialty_code", "department_name", "provider_name",
+        "encounter_type", "is_inpatient", "primary_icd10_code", "primary_icd10_description",
+        "diagnosis_count", "procedure_count", "total_claim_amount", "total_allowed_amount",
+        "claim_count", "length_of_stay_hours", "length_of_stay_days", "is_readmission",
+        "days_since_last_visit",
+    ),
+    "bridge_encounter_diagnoses": ("bridge_id", "encounter_key", "diagnosis_key", "diagnosis_sequence"),
+    "bridge_encounter_procedures": ("bridge_id", "encounter_key", "procedure_key", "procedure_date"),
+    **AGGREGATE_COLUMNS,
+}
 
-DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# (table_name, filename, columns) of every file written, in load order
+LOADED_TABLES = []
 
+# Per-stage timings of this run (--report / --progress; see instrumentation.py)
+REPORT = RunReport()
 
-def escape_sql(value):
-    """Escape single quotes in SQL strings."""
-    if value is None:
-        return "NULL"
-    return str(value).replace("'", "''")
+# Finished stages and shards of a resumable random build (--resume; see checkpoint.py)
+CHECKPOINT = None
 
+# Fact and bridge files split by encounter month (--partition-by; see partitioning.py)
+PARTITION_BY = "none"
 
-def write_sql_file(filename, table_name, rows, total_rows):
-    """Write SQL INSERT statements to a file."""
-    filepath = OLAP_DIR / filename
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(f"-- ============================================================================\n")
-        f.write(f"-- {table_name.upper()} - INSERT statements\n")
-        f.write(f"-- ============================================================================\n")
-        f.write(f"-- Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"-- Total rows: {total_rows:,}\n")
-        f.write(f"-- ============================================================================\n\n")
-        
-        for row in rows:
-            f.write(row + "\n")
+# Bitmap indexes of the fact's low-cardinality columns (--bitmap-index; see bitmap_index.py)
+BITMAP_INDEX = False
+
+# manifest.json entries of the tables written as several files (kept shard
+# parts, partitions): {table_name: [{"file", "rows", ...}]}
+MANIFEST = {}
+
+# Calendar range covered by dim_date (--calendar-start / --calendar-end)
+DIM_DATE_START = datetime(2020, 1, 1)
+DIM_DATE_END = datetime(2026, 12, 31)
+
+# Packed per-day date attributes: dim_date rows, and the date columns of every
+# fact and bridge row by day offset (see calendar_table.py)
+CALENDAR = Calendar(DIM_DATE_START, DIM_DATE_END)
+
+# effective_date of the first version of every dim_patient (SCD2) row
+SCD2_START_DATE = DIM_DATE_START.strftime("%Y-%m-%d")
+
+# Diagnoses (1-5) and procedures (0-4) per encounter: (counts, weights)
+DIAGNOSES_PER_ENCOUNTER = ([1, 2, 3, 4, 5], [15, 40, 30, 10, 5])
+PROCEDURES_PER_ENCOUNTER = ([0, 1, 2, 3, 4], [20, 40, 25, 10, 5])
+
+# Bridge rows buffered by the fact stream between writes to the bridge files
+BRIDGE_BUFFER_ROWS = 4096
+
+# (filename, table_name) of the bridge tables the fact stream writes
+BRIDGE_TABLES = [
+    ("bridge_diagnoses.sql", "bridge_encounter_diagnoses"),
+    ("bridge_procedures.sql", "bridge_encounter_procedures"),
+]
+
+
+# =============================================================================
+# ICD-10 DIAGNOSES / CPT PROCEDURES (same code lists as the OLTP generator)
+# =============================================================================
+
+ICD10_CATEGORIES = {
+    "I": [
+        ("I10", "Essential hypertension"),
+        ("I11.9", "Hypertensive heart disease without heart failure"),
+        ("I21.0", "ST elevation myocardial infarction of anterior wall"),
+        ("I21.3", "ST elevation myocardial infarction unspecified site"),
+        ("I25.10", "Atherosclerotic heart disease native coronary artery"),
+        ("I48.0", "Paroxysmal atrial fibrillation"),
+        ("I48.91", "Unspecified atrial fibrillation"),
+        ("I50.9", "Heart failure unspecified"),
+        ("I63.9", "Cerebral infarction unspecified"),
+        ("I70.0", "Atherosclerosis of aorta"),
+    ],
+    "J": [
+        ("J06.9", "Acute upper respiratory infection unspecified"),
+        ("J18.9", "Pneumonia unspecified organism"),
+        ("J20.9", "Acute bronchitis unspecified"),
+        ("J44.1", "COPD with acute exacerbation"),
+        ("J45.20", "Mild intermittent asthma uncomplicated"),
+        ("J45.40", "Moderate persistent asthma uncomplicated"),
+        ("J96.00", "Acute respiratory failure"),
+        ("J98.4", "Other disorders of lung"),
+    ],
+    "E": [
+        ("E11.9", "Type 2 diabetes mellitus without complications"),
+        ("E11.65", "Type 2 diabetes mellitus with hyperglycemia"),
+        ("E11.21", "Type 2 diabetes mellitus with diabetic nephropathy"),
+        ("E11.40", "Type 2 diabetes mellitus with diabetic neuropathy"),
+        ("E78.00", "Pure hypercholesterolemia unspecified"),
+        ("E78.5", "Hyperlipidemia unspecified"),
+        ("E03.9", "Hypothyroidism unspecified"),
+        ("E66.9", "Obesity unspecified"),
+    ],
+    "K": [
+        ("K21.0", "GERD with esophagitis"),
+        ("K29.70", "Gastritis unspecified without bleeding"),
+        ("K35.80", "Unspecified acute appendicitis"),
+        ("K40.90", "Unilateral inguinal hernia"),
+        ("K57.30", "Diverticulosis of large intestine"),
+        ("K80.20", "Calculus of gallbladder"),
+        ("K92.0", "Hematemesis"),
+        ("K92.1", "Melena"),
+    ],
+    "M": [
+        ("M54.5", "Low back pain"),
+        ("M17.11", "Primary osteoarthritis right knee"),
+        ("M17.12", "Primary osteoarthritis left knee"),
+        ("M25.561", "Pain in right knee"),
+        ("M25.562", "Pain in left knee"),
+        ("M79.3", "Panniculitis unspecified"),
+        ("M81.0", "Age-related osteoporosis"),
+        ("M62.830", "Muscle spasm of back"),
+    ],
+    "N": [
+        ("N18.3", "Chronic kidney disease stage 3"),
+        ("N18.4", "Chronic kidney disease stage 4"),
+        ("N18.5", "Chronic kidney disease stage 5"),
+        ("N39.0", "Urinary tract infection"),
+        ("N40.0", "Benign prostatic hyperplasia"),
+        ("N17.9", "Acute kidney failure unspecified"),
+        ("N20.0", "Calculus of kidney"),
+    ],
+    "F": [
+        ("F32.1", "Major depressive disorder moderate"),
+        ("F32.9", "Major depressive disorder unspecified"),
+        ("F41.1", "Generalized anxiety disorder"),
+        ("F41.9", "Anxiety disorder unspecified"),
+        ("F10.10", "Alcohol use disorder mild"),
+        ("F17.210", "Nicotine dependence cigarettes"),
+        ("F33.0", "Major depressive disorder recurrent"),
+    ],
+    "G": [
+        ("G43.909", "Migraine unspecified"),
+        ("G47.00", "Insomnia unspecified"),
+        ("G20", "Parkinson disease"),
+        ("G35", "Multiple sclerosis"),
+        ("G40.909", "Epilepsy unspecified"),
+        ("G89.29", "Other chronic pain"),
+    ],
+    "S": [
+        ("S06.0X0A", "Concussion initial"),
+        ("S52.501A", "Fracture right radius initial"),
+        ("S82.001A", "Fracture right tibia initial"),
+        ("S42.001A", "Fracture right clavicle initial"),
+        ("S72.001A", "Fracture right femur initial"),
+    ],
+    "Z": [
+        ("Z23", "Encounter for immunization"),
+        ("Z00.00", "General adult medical examination"),
+        ("Z12.11", "Screening for colon cancer"),
+        ("Z87.891", "Personal history of nicotine dependence"),
+        ("Z96.1", "Presence of intraocular lens"),
+    ],
+}
+
+CPT_CATEGORIES = {
+    "Evaluation": [
+        ("99201", "Office visit new patient level 1"),
+        ("99202", "Office visit new patient level 2"),
+        ("99203", "Office visit new patient level 3"),
+        ("99204", "Office visit new patient level 4"),
+        ("99205", "Office visit new patient level 5"),
+        ("99211", "Office visit established level 1"),
+        ("99212", "Office visit established level 2"),
+        ("99213", "Office visit established level 3"),
+        ("99214", "Office visit established level 4"),
+        ("99215", "Office visit established level 5"),
+        ("99281", "ED visit level 1"),
+        ("99282", "ED visit level 2"),
+        ("99283", "ED visit level 3"),
+        ("99284", "ED visit level 4"),
+        ("99285", "ED visit level 5"),
+    ],
+    "Surgery": [
+        ("27447", "Total knee arthroplasty"),
+        ("27130", "Total hip arthroplasty"),
+        ("47562", "Laparoscopic cholecystectomy"),
+        ("49505", "Inguinal hernia repair"),
+        ("44950", "Appendectomy"),
+        ("33533", "CABG single arterial"),
+        ("35301", "Carotid endarterectomy"),
+        ("63030", "Lumbar laminotomy"),
+        ("29881", "Knee arthroscopy"),
+        ("47600", "Cholecystectomy"),
+    ],
+    "Radiology": [
+        ("71046", "Chest X-ray 2 views"),
+        ("71250", "CT thorax without contrast"),
+        ("71260", "CT thorax with contrast"),
+        ("74176", "CT abdomen pelvis without"),
+        ("74177", "CT abdomen pelvis with"),
+        ("70553", "MRI brain with and without"),
+        ("73721", "MRI joint lower extremity"),
+        ("76700", "Ultrasound abdominal"),
+        ("76856", "Ultrasound pelvic"),
+        ("77067", "Screening mammography"),
+    ],
+    "Cardiology": [
+        ("93000", "ECG complete"),
+        ("93306", "Echocardiography complete"),
+        ("93458", "Coronary angiography"),
+        ("93510", "Left heart catheterization"),
+        ("92928", "PCI single vessel"),
+        ("33249", "ICD insertion"),
+        ("33208", "Pacemaker dual chamber"),
+    ],
+    "Laboratory": [
+        ("80053", "Comprehensive metabolic panel"),
+        ("80061", "Lipid panel"),
+        ("85025", "CBC with differential"),
+        ("84443", "TSH"),
+        ("83036", "Hemoglobin A1c"),
+        ("82947", "Glucose blood"),
+        ("80048", "Basic metabolic panel"),
+        ("82565", "Creatinine blood"),
+    ],
+}
+
+
+def write_sql_file(filename, table_name, rows, total_rows=None, encounter_month=None):
+    """Stream a table's rows to a file in the selected OUTPUT_FORMAT.
+
+    ``rows`` is any iterable of value tuples (typically a lazy generator); it
+    is drained straight to disk, so a table is never held in memory. When
+    ``total_rows`` is not known up front, the row count is written as a
+    trailing comment. The file is streamed through the selected COMPRESSION.
+    With PARTITION_BY the fact and bridges go to one file per month instead
+    (bridges need ``encounter_month``, see partitioned_writer).
+    Returns the number of rows written.
+    """
+    filename = output_filename(filename, OUTPUT_FORMAT, COMPRESSION)
+    columns = TABLE_COLUMNS[table_name]
+    if PARTITION_BY != "none" and table_name in PARTITIONED_TABLES:
+        with REPORT.stage(table_name):
+            with partitioned_writer(filename, table_name, encounter_month) as writer:
+                writer.write(REPORT.track(rows))
+            return register_partitions(filename, table_name, writer.partitions)
+    with REPORT.stage(table_name) as stage:
+        written = write_table(
+            OLAP_DIR / filename, table_name.upper(), table_name, columns, REPORT.track(rows),
+            OUTPUT_FORMAT, BATCH_SIZE, total_rows, COMPRESSION, COMPRESSION_LEVEL,
+        )
+        stage.count(written, file_bytes(OLAP_DIR / filename))
+    LOADED_TABLES.append((table_name, filename, columns))
     
-    print(f"  [OK] {filename}: {total_rows:,} rows")
+    print(f"  [OK] {filename}: {written:,} rows")
+    return written
+
+
+def partition_router(table_name, open_writer, encounter_month=None):
+    """PartitionedWriter of a fact (by encounter_date_key) or bridge table (by
+    ``encounter_month(encounter_key)``, the YYYYMM of the bridge row's encounter)."""
+    columns = TABLE_COLUMNS[table_name]
+    if table_name == "fact_encounters":
+        return PartitionedWriter(open_writer, columns.index("encounter_date_key"))
+    return PartitionedWriter(open_writer, columns.index("encounter_key"), encounter_month)
+
+
+def partitioned_writer(filename, table_name, encounter_month=None):
+    """Writer of a table's monthly files, partitions/<table>.pYYYY_MM.<ext>."""
+    def open_writer(month):
+        (OLAP_DIR / PARTITIONS_DIRNAME).mkdir(exist_ok=True)
+        return TableWriter(
+            OLAP_DIR / PARTITIONS_DIRNAME / partition_filename(filename, month),
+            f"{table_name.upper()} {partition_name(month)}", table_name, TABLE_COLUMNS[table_name], OUTPUT_FORMAT,
+            BATCH_SIZE, None, COMPRESSION, COMPRESSION_LEVEL,
+        )
+    
+    return partition_router(table_name, open_writer, encounter_month)
+
+
+def register_partitions(filename, table_name, partitions):
+    """Register the monthly files of a table ({month: rows}) in LOADED_TABLES and
+    MANIFEST and add them to the current REPORT stage; returns the total rows."""
+    columns = TABLE_COLUMNS[table_name]
+    MANIFEST[table_name] = []
+    for month, rows in partitions.items():
+        name = f"{PARTITIONS_DIRNAME}/{partition_filename(filename, month)}"
+        LOADED_TABLES.append((table_name, name, columns))
+        MANIFEST[table_name].append({"file": name, "rows": rows, "partition": partition_name(month)})
+    total = sum(partitions.values())
+    REPORT.count(total, file_bytes(*(OLAP_DIR / entry["file"] for entry in MANIFEST[table_name])))
+    print(f"  [OK] {filename}: {total:,} rows in {len(partitions)} partitions")
+    return total
+
+
+def table_paths(table_name):
+    """Paths of the files registered for ``table_name`` so far."""
+    return [OLAP_DIR / filename for name, filename, _ in LOADED_TABLES if name == table_name]
+
+
+@contextmanager
+def bridge_writers(encounter_month=None):
+    """Open both bridge table files for a fact stream to fill (see generate_fact_rows).
+
+    Yields (diagnosis writer, procedure writer); on exit the files are
+    finished and registered, and their rows and bytes are added to the
+    current REPORT stage. With PARTITION_BY the writers split the rows by
+    ``encounter_month`` (see partition_router).
+    """
+    filenames = [output_filename(filename, OUTPUT_FORMAT, COMPRESSION) for filename, _ in BRIDGE_TABLES]
+    if PARTITION_BY != "none":
+        writers = [
+            partitioned_writer(filename, table_name, encounter_month)
+            for filename, (_, table_name) in zip(filenames, BRIDGE_TABLES)
+        ]
+    else:
+        writers = [
+            TableWriter(
+                OLAP_DIR / filename, table_name.upper(), table_name, TABLE_COLUMNS[table_name], OUTPUT_FORMAT,
+                BATCH_SIZE, None, COMPRESSION, COMPRESSION_LEVEL,
+            )
+            for filename, (_, table_name) in zip(filenames, BRIDGE_TABLES)
+        ]
+    try:
+        yield writers
+    finally:
+        for writer in writers:
+            writer.close()
+    
+    for filename, (_, table_name), writer in zip(filenames, BRIDGE_TABLES, writers):
+        if PARTITION_BY != "none":
+            register_partitions(filename, table_name, writer.partitions)
+            continue
+        REPORT.count(writer.written, file_bytes(OLAP_DIR / filename))
+        LOADED_TABLES.append((table_name, filename, TABLE_COLUMNS[table_name]))
+        print(f"  [OK] {filename}: {writer.written:,} rows")
+
+
+def write_update_file(filename, table_name, statements):
+    """Write UPDATE statements against ``table_name`` as a SQL script (whatever
+    the OUTPUT_FORMAT); the loader scripts run it after the table's data."""
+    with REPORT.stage(f"{table_name} updates") as stage:
+        written = write_statements(OLAP_DIR / filename, f"{table_name.upper()} UPDATES", statements)
+        stage.count(written, file_bytes(OLAP_DIR / filename))
+    LOADED_TABLES.append((table_name, filename, None))
+    
+    print(f"  [OK] {filename}: {written:,} statements")
+    return written
+
+
+def write_aggregate_files(aggregates):
+    """Write the summary aggregates accumulated while the fact was written
+    (tables without rows are skipped)."""
+    for filename, table_name, rows in (
+        ("agg_monthly_specialty.sql", "agg_monthly_specialty", aggregates.monthly_rows()),
+        ("agg_readmission_specialty_month.sql", "agg_readmission_specialty_month", aggregates.readmission_rows()),
+    ):
+        rows = list(rows)
+        if rows:
+            write_sql_file(filename, table_name, rows, len(rows))
+
+
+def fact_bitmap_index():
+    """A BitmapIndex for a fact stream to fill with --bitmap-index, else None."""
+    return BitmapIndex(TABLE_COLUMNS["fact_encounters"]) if BITMAP_INDEX else None
+
+
+def indexed(rows, bitmaps):
+    """``rows``, added to ``bitmaps`` as they stream by unless it is None."""
+    return rows if bitmaps is None else bitmaps.observe(rows)
 
 
-def generate_date(start_year=2020, end_year=2025):
-    """Generate a random date."""
-    start = datetime(start_year, 1, 1)
-    end = datetime(end_year, 12, 31)
-    delta = end - start
-    random_days = random.randint(0, delta.days)
-    return start + timedelta(days=random_days)
+def write_bitmap_index(bitmaps):
+    """Save the fact's bitmap index next to the data (nothing without --bitmap-index)."""
+    if bitmaps is None:
+        return
+    path = OLAP_DIR / BITMAPS_FILENAME
+    with REPORT.stage("bitmap index") as stage:
+        bitmaps.save(path)
+        stage.count(bitmaps.rows, file_bytes(path))
+    print(f"  [OK] {path.name}: {len(bitmaps.columns)} columns, {bitmaps.num_bitmaps} bitmaps")
+
+
+def run_stage(name, write):
+    """Run ``write()``, one stage of a random build, unless CHECKPOINT holds it finished.
+
+    ``write`` writes the stage's files (registering them in LOADED_TABLES and
+    MANIFEST) and returns a JSON-able value that later stages need; a skipped
+    stage returns the recorded value. Serial builds draw every table from the
+    global random stream, so its state after the stage is recorded and
+    restored on a skip.
+    """
+    if CHECKPOINT is None:
+        return write()
+    entry = CHECKPOINT.stage(name)
+    if entry is not None:
+        LOADED_TABLES.extend(
+            (table_name, filename, columns and tuple(columns)) for table_name, filename, columns in entry["tables"]
+        )
+        MANIFEST.update(entry["manifest"])
+        restore_rng(random, entry["random_state"])
+        print(f"  [--] {name}: finished by an earlier run (checkpoint)")
+        return entry["value"]
+    first, listed = len(LOADED_TABLES), set(MANIFEST)
+    value = write()
+    tables = LOADED_TABLES[first:]
+    CHECKPOINT.complete_stage(
+        name, [filename for _, filename, _ in tables], tables=tables, value=value, random_state=rng_state(random),
+        manifest={table_name: MANIFEST[table_name] for table_name in MANIFEST.keys() - listed},
+    )
+    return value
 
 
 def calculate_age_group(dob):
@@ -146,524 +596,1820 @@ def calculate_age_group(dob):
         return "75+"
 
 
-def main():
-    print("\n" + "=" * 70)
-    print("OLAP Star Schema Data Generator")
-    print("=" * 70 + "\n")
-    
-    # Ensure output directory exists
-    OLAP_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # -------------------------------------------------------------------------
-    # 1. DIM_DATE (2 years of dates)
-    # -------------------------------------------------------------------------
-    print("Generating dimension tables...")
-    
-    date_rows = []
-    start_date = datetime(2020, 1, 1)
-    end_date = datetime(2026, 12, 31)
-    current_date = start_date
-    
-    while current_date <= end_date:
-        date_key = int(current_date.strftime("%Y%m%d"))
-        year = current_date.year
-        quarter = (current_date.month - 1) // 3 + 1
-        month = current_date.month
-        month_name = MONTH_NAMES[month]
-        week_of_year = current_date.isocalendar()[1]
-        day_of_month = current_date.day
-        day_of_week = current_date.weekday() + 1  # 1=Monday
-        day_name = DAY_NAMES[current_date.weekday()]
-        is_weekend = "TRUE" if day_of_week >= 6 else "FALSE"
-        
-        date_rows.append(
-            f"INSERT INTO dim_date VALUES ({date_key}, '{current_date.strftime('%Y-%m-%d')}', "
-            f"{year}, {quarter}, {month}, '{month_name}', {week_of_year}, {day_of_month}, "
-            f"{day_of_week}, '{day_name}', {is_weekend}, {year}, {quarter});"
-        )
-        current_date += timedelta(days=1)
-    
-    write_sql_file("dim_date.sql", "dim_date", date_rows, len(date_rows))
-    
-    # -------------------------------------------------------------------------
-    # 2. DIM_SPECIALTY (25 rows)
-    # -------------------------------------------------------------------------
-    specialty_rows = []
-    for i, (name, code) in enumerate(SPECIALTIES, 1):
-        specialty_rows.append(
-            f"INSERT INTO dim_specialty VALUES ({i}, {i}, '{escape_sql(name)}', '{code}');"
-        )
-    write_sql_file("dim_specialty.sql", "dim_specialty", specialty_rows, len(SPECIALTIES))
-    
-    # -------------------------------------------------------------------------
-    # 3. DIM_DEPARTMENT (20 rows)
-    # -------------------------------------------------------------------------
-    dept_rows = []
-    for i, (name, floor, capacity) in enumerate(DEPARTMENTS, 1):
-        dept_rows.append(
-            f"INSERT INTO dim_department VALUES ({i}, {i}, '{escape_sql(name)}', {floor}, {capacity});"
-        )
-    write_sql_file("dim_department.sql", "dim_department", dept_rows, len(DEPARTMENTS))
-    
-    # -------------------------------------------------------------------------
-    # 4. DIM_ENCOUNTER_TYPE (3 rows)
-    # -------------------------------------------------------------------------
-    enc_type_rows = []
-    for i, (code, name, is_inpatient, avg_los) in enumerate(ENCOUNTER_TYPES, 1):
-        is_inp = "TRUE" if is_inpatient else "FALSE"
-        enc_type_rows.append(
-            f"INSERT INTO dim_encounter_type VALUES ({i}, '{code}', '{name}', {is_inp}, {avg_los});"
-        )
-    write_sql_file("dim_encounter_type.sql", "dim_encounter_type", enc_type_rows, len(ENCOUNTER_TYPES))
-    
-    # -------------------------------------------------------------------------
-    # 5. DIM_DIAGNOSIS (72 rows - from OLTP)
-    # -------------------------------------------------------------------------
-    # Read from OLTP diagnoses
-    ICD10_CATEGORIES = {
-        "I": [
-            ("I10", "Essential hypertension"),
-            ("I11.9", "Hypertensive heart disease without heart failure"),
-            ("I21.0", "ST elevation myocardial infarction of anterior wall"),
-            ("I21.3", "ST elevation myocardial infarction unspecified site"),
-            ("I25.10", "Atherosclerotic heart disease native coronary artery"),
-            ("I48.0", "Paroxysmal atrial fibrillation"),
-            ("I48.91", "Unspecified atrial fibrillation"),
-            ("I50.9", "Heart failure unspecified"),
-            ("I63.9", "Cerebral infarction unspecified"),
-            ("I70.0", "Atherosclerosis of aorta"),
-        ],
-        "J": [
-            ("J06.9", "Acute upper respiratory infection unspecified"),
-            ("J18.9", "Pneumonia unspecified organism"),
-            ("J20.9", "Acute bronchitis unspecified"),
-            ("J44.1", "COPD with acute exacerbation"),
-            ("J45.20", "Mild intermittent asthma uncomplicated"),
-            ("J45.40", "Moderate persistent asthma uncomplicated"),
-            ("J96.00", "Acute respiratory failure"),
-            ("J98.4", "Other disorders of lung"),
-        ],
-        "E": [
-            ("E11.9", "Type 2 diabetes mellitus without complications"),
-            ("E11.65", "Type 2 diabetes mellitus with hyperglycemia"),
-            ("E11.21", "Type 2 diabetes mellitus with diabetic nephropathy"),
-            ("E11.40", "Type 2 diabetes mellitus with diabetic neuropathy"),
-            ("E78.00", "Pure hypercholesterolemia unspecified"),
-            ("E78.5", "Hyperlipidemia unspecified"),
-            ("E03.9", "Hypothyroidism unspecified"),
-            ("E66.9", "Obesity unspecified"),
-        ],
-        "K": [
-            ("K21.0", "GERD with esophagitis"),
-            ("K29.70", "Gastritis unspecified without bleeding"),
-            ("K35.80", "Unspecified acute appendicitis"),
-            ("K40.90", "Unilateral inguinal hernia"),
-            ("K57.30", "Diverticulosis of large intestine"),
-            ("K80.20", "Calculus of gallbladder"),
-            ("K92.0", "Hematemesis"),
-            ("K92.1", "Melena"),
-        ],
-        "M": [
-            ("M54.5", "Low back pain"),
-            ("M17.11", "Primary osteoarthritis right knee"),
-            ("M17.12", "Primary osteoarthritis left knee"),
-            ("M25.561", "Pain in right knee"),
-            ("M25.562", "Pain in left knee"),
-            ("M79.3", "Panniculitis unspecified"),
-            ("M81.0", "Age-related osteoporosis"),
-            ("M62.830", "Muscle spasm of back"),
-        ],
-        "N": [
-            ("N18.3", "Chronic kidney disease stage 3"),
-            ("N18.4", "Chronic kidney disease stage 4"),
-            ("N18.5", "Chronic kidney disease stage 5"),
-            ("N39.0", "Urinary tract infection"),
-            ("N40.0", "Benign prostatic hyperplasia"),
-            ("N17.9", "Acute kidney failure unspecified"),
-            ("N20.0", "Calculus of kidney"),
-        ],
-        "F": [
-            ("F32.1", "Major depressive disorder moderate"),
-            ("F32.9", "Major depressive disorder unspecified"),
-            ("F41.1", "Generalized anxiety disorder"),
-            ("F41.9", "Anxiety disorder unspecified"),
-            ("F10.10", "Alcohol use disorder mild"),
-            ("F17.210", "Nicotine dependence cigarettes"),
-            ("F33.0", "Major depressive disorder recurrent"),
-        ],
-        "G": [
-            ("G43.909", "Migraine unspecified"),
-            ("G47.00", "Insomnia unspecified"),
-            ("G20", "Parkinson disease"),
-            ("G35", "Multiple sclerosis"),
-            ("G40.909", "Epilepsy unspecified"),
-            ("G89.29", "Other chronic pain"),
-        ],
-        "S": [
-            ("S06.0X0A", "Concussion initial"),
-            ("S52.501A", "Fracture right radius initial"),
-            ("S82.001A", "Fracture right tibia initial"),
-            ("S42.001A", "Fracture right clavicle initial"),
-            ("S72.001A", "Fracture right femur initial"),
-        ],
-        "Z": [
-            ("Z23", "Encounter for immunization"),
-            ("Z00.00", "General adult medical examination"),
-            ("Z12.11", "Screening for colon cancer"),
-            ("Z87.891", "Personal history of nicotine dependence"),
-            ("Z96.1", "Presence of intraocular lens"),
-        ],
-    }
-    
-    diag_rows = []
-    diag_id = 1
-    all_diagnoses = []
+def all_diagnoses():
+    """Return (diagnosis_key, code, description) for every ICD-10 code."""
+    rows = []
     for category, codes in ICD10_CATEGORIES.items():
         for code, desc in codes:
-            all_diagnoses.append((diag_id, code, desc))
-            diag_rows.append(
-                f"INSERT INTO dim_diagnosis VALUES ({diag_id}, {diag_id}, '{code}', '{escape_sql(desc)}');"
-            )
-            diag_id += 1
-    write_sql_file("dim_diagnosis.sql", "dim_diagnosis", diag_rows, len(all_diagnoses))
-    num_diagnoses = len(all_diagnoses)
-    
-    # -------------------------------------------------------------------------
-    # 6. DIM_PROCEDURE (60 rows)
-    # -------------------------------------------------------------------------
-    CPT_CATEGORIES = {
-        "Evaluation": [
-            ("99201", "Office visit new patient level 1"),
-            ("99202", "Office visit new patient level 2"),
-            ("99203", "Office visit new patient level 3"),
-            ("99204", "Office visit new patient level 4"),
-            ("99205", "Office visit new patient level 5"),
-            ("99211", "Office visit established level 1"),
-            ("99212", "Office visit established level 2"),
-            ("99213", "Office visit established level 3"),
-            ("99214", "Office visit established level 4"),
-            ("99215", "Office visit established level 5"),
-            ("99281", "ED visit level 1"),
-            ("99282", "ED visit level 2"),
-            ("99283", "ED visit level 3"),
-            ("99284", "ED visit level 4"),
-            ("99285", "ED visit level 5"),
-        ],
-        "Surgery": [
-            ("27447", "Total knee arthroplasty"),
-            ("27130", "Total hip arthroplasty"),
-            ("47562", "Laparoscopic cholecystectomy"),
-            ("49505", "Inguinal hernia repair"),
-            ("44950", "Appendectomy"),
-            ("33533", "CABG single arterial"),
-            ("35301", "Carotid endarterectomy"),
-            ("63030", "Lumbar laminotomy"),
-            ("29881", "Knee arthroscopy"),
-            ("47600", "Cholecystectomy"),
-        ],
-        "Radiology": [
-            ("71046", "Chest X-ray 2 views"),
-            ("71250", "CT thorax without contrast"),
-            ("71260", "CT thorax with contrast"),
-            ("74176", "CT abdomen pelvis without"),
-            ("74177", "CT abdomen pelvis with"),
-            ("70553", "MRI brain with and without"),
-            ("73721", "MRI joint lower extremity"),
-            ("76700", "Ultrasound abdominal"),
-            ("76856", "Ultrasound pelvic"),
-            ("77067", "Screening mammography"),
-        ],
-        "Cardiology": [
-            ("93000", "ECG complete"),
-            ("93306", "Echocardiography complete"),
-            ("93458", "Coronary angiography"),
-            ("93510", "Left heart catheterization"),
-            ("92928", "PCI single vessel"),
-            ("33249", "ICD insertion"),
-            ("33208", "Pacemaker dual chamber"),
-        ],
-        "Laboratory": [
-            ("80053", "Comprehensive metabolic panel"),
-            ("80061", "Lipid panel"),
-            ("85025", "CBC with differential"),
-            ("84443", "TSH"),
-            ("83036", "Hemoglobin A1c"),
-            ("82947", "Glucose blood"),
-            ("80048", "Basic metabolic panel"),
-            ("82565", "Creatinine blood"),
-        ],
-    }
-    
-    proc_rows = []
-    proc_id = 1
-    all_procedures = []
+            rows.append((len(rows) + 1, code, desc))
+    return rows
+
+
+def all_procedures():
+    """Return (procedure_key, code, description) for every CPT code."""
+    rows = []
     for category, codes in CPT_CATEGORIES.items():
         for code, desc in codes:
-            all_procedures.append((proc_id, code, desc))
-            proc_rows.append(
-                f"INSERT INTO dim_procedure VALUES ({proc_id}, {proc_id}, '{code}', '{escape_sql(desc)}');"
-            )
-            proc_id += 1
-    write_sql_file("dim_procedure.sql", "dim_procedure", proc_rows, len(all_procedures))
-    num_procedures = len(all_procedures)
-    
-    # -------------------------------------------------------------------------
-    # 7. DIM_PATIENT (10,000 rows)
-    # -------------------------------------------------------------------------
-    print("\nGenerating patient dimension...")
-    NUM_PATIENTS = 10000
-    patient_rows = []
-    patients = []
-    
-    for i in range(1, NUM_PATIENTS + 1):
-        first_name = random.choice(FIRST_NAMES)
-        last_name = random.choice(LAST_NAMES)
+            rows.append((len(rows) + 1, code, desc))
+    return rows
+
+
+# =============================================================================
+# ROW STREAMS
+# =============================================================================
+# Each table is produced by a generator that yields one value tuple per row.
+# Only the compact state later tables need is retained: provider attributes
+# (one tuple per provider). The fact stream draws each encounter's diagnosis
+# and procedure sets once and writes the bridge rows for them as it goes, so
+# the bridges always agree with the fact's counts and primary diagnosis.
+# Random draws go through ``rng``: the global stream for a serial run, or a
+# shard's own random.Random for a sharded run. Readmission flags need every
+# inpatient stay of a patient, so the fact stream is replayed once from the
+# same random state to collect the stays (see fact_readmissions) before it is
+# written.
+
+def generate_dim_specialty_rows():
+    for i, (name, code) in enumerate(SPECIALTIES, 1):
+        yield (i, i, name, code)
+
+
+def generate_dim_department_rows():
+    for i, (name, floor, capacity) in enumerate(DEPARTMENTS, 1):
+        yield (i, i, name, floor, capacity)
+
+
+def generate_dim_encounter_type_rows():
+    for i, (code, name, is_inpatient, avg_los) in enumerate(ENCOUNTER_TYPES, 1):
+        yield (i, code, name, is_inpatient, avg_los)
+
+
+def generate_dim_diagnosis_rows(diagnoses):
+    for diag_key, code, desc in diagnoses:
+        yield (diag_key, diag_key, code, desc)
+
+
+def generate_dim_procedure_rows(procedures):
+    for proc_key, code, desc in procedures:
+        yield (proc_key, proc_key, code, desc)
+
+
+def generate_dim_patient_rows(patient_ids, rng=random):
+    for i in patient_ids:
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
         full_name = f"{first_name} {last_name}"
         
         # Generate DOB (ages 1-95)
-        age_days = random.randint(365, 365 * 95)
+        age_days = rng.randint(365, 365 * 95)
         dob = datetime(2025, 1, 1) - timedelta(days=age_days)
         age = age_days // 365
         age_group = calculate_age_group(dob)
         
-        gender = random.choice(["M", "F"])
+        gender = rng.choice(["M", "F"])
         gender_desc = "Male" if gender == "M" else "Female"
         mrn = f"MRN{i:08d}"
         
-        patients.append({
-            "key": i,
-            "id": i,
-            "first_name": first_name,
-            "last_name": last_name,
-            "dob": dob,
-            "age": age,
-            "gender": gender
-        })
-        
-        patient_rows.append(
-            f"INSERT INTO dim_patient VALUES ({i}, {i}, '{first_name}', '{last_name}', "
-            f"'{full_name}', '{dob.strftime('%Y-%m-%d')}', {age}, '{age_group}', "
-            f"'{gender}', '{gender_desc}', '{mrn}');"
+        yield (
+            i, i, first_name, last_name, full_name, dob.strftime("%Y-%m-%d"),
+            age, age_group, gender, gender_desc, mrn, SCD2_START_DATE, None, True,
         )
-    
-    write_sql_file("dim_patient.sql", "dim_patient", patient_rows, NUM_PATIENTS)
-    
-    # -------------------------------------------------------------------------
-    # 8. DIM_PROVIDER (500 rows with denormalized specialty/department)
-    # -------------------------------------------------------------------------
-    print("Generating provider dimension...")
-    NUM_PROVIDERS = 500
-    provider_rows = []
-    providers = []
-    
-    for i in range(1, NUM_PROVIDERS + 1):
-        first_name = random.choice(FIRST_NAMES)
-        last_name = random.choice(LAST_NAMES)
+
+
+def generate_dim_provider_rows(num_providers, providers, rng=random):
+    """Yield dim_provider rows, appending each provider's denormalized
+    attributes to ``providers`` as
+    (specialty_id, specialty_name, specialty_code, dept_id, dept_name, full_name).
+    """
+    for i in range(1, num_providers + 1):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
         full_name = f"{first_name} {last_name}"
-        credential = random.choice(["MD", "DO", "MD", "MD", "DO"])
+        credential = rng.choice(["MD", "DO", "MD", "MD", "DO"])
         
-        specialty_idx = random.randint(0, len(SPECIALTIES) - 1)
+        specialty_idx = rng.randint(0, len(SPECIALTIES) - 1)
         specialty_id = specialty_idx + 1
         specialty_name, specialty_code = SPECIALTIES[specialty_idx]
         
-        dept_idx = random.randint(0, len(DEPARTMENTS) - 1)
+        dept_idx = rng.randint(0, len(DEPARTMENTS) - 1)
         dept_id = dept_idx + 1
         dept_name = DEPARTMENTS[dept_idx][0]
         
-        providers.append({
-            "key": i,
-            "id": i,
-            "name": full_name,
-            "specialty_id": specialty_id,
-            "specialty_name": specialty_name,
-            "specialty_code": specialty_code,
-            "dept_id": dept_id,
-            "dept_name": dept_name
-        })
+        providers.append((specialty_id, specialty_name, specialty_code, dept_id, dept_name, full_name))
         
-        provider_rows.append(
-            f"INSERT INTO dim_provider VALUES ({i}, {i}, '{first_name}', '{last_name}', "
-            f"'{full_name}', '{credential}', {specialty_id}, {specialty_id}, "
-            f"'{specialty_name}', '{specialty_code}', {dept_id}, {dept_id}, '{escape_sql(dept_name)}');"
+        yield (
+            i, i, first_name, last_name, full_name, credential, specialty_id, specialty_id,
+            specialty_name, specialty_code, dept_id, dept_id, dept_name,
         )
+
+
+def generate_fact_rows(encounter_ids, patient_ids, providers, diagnoses, num_procedures, rng=random,
+                       readmissions=None, skew=UNIFORM, bridges=None, counts=None, first_bridge_ids=(1, 1)):
+    """Yield fact_encounters rows with all denormalized attributes, writing the
+    bridge rows of each encounter in the same pass.
+
+    Patients are drawn from the ``patient_ids`` range (all patients for a
+    serial run, the co-partitioned patient range for a shard, which keeps
+    readmission detection shard-local). Each encounter's diagnoses and
+    procedures are drawn once, without replacement; the first diagnosis is
+    the primary one, and the set sizes are the fact's diagnosis_count and
+    procedure_count. Their bridge rows (ids from ``first_bridge_ids``) are
+    buffered and written to ``bridges``, a (diagnosis, procedure) pair of
+    TableWriters, or dropped when it is None (the readmission replay).
+
+    ``counts`` optionally supplies (diagnosis counts, procedure counts) per
+    encounter (sharded runs pre-draw them to know each shard's bridge id
+    offsets); otherwise they are drawn inline from ``rng``. ``readmissions``
+    maps encounter_key -> days since the previous discharge (see
+    fact_readmissions); without it no encounter is flagged. Patients,
+    providers and dates follow ``skew`` (see distributions.py).
+    """
+    diagnosis_pool = list(range(1, len(diagnoses) + 1))
+    procedure_pool = list(range(1, num_procedures + 1))
+    diagnosis_rows, procedure_rows = [], []
+    diagnosis_id, procedure_id = first_bridge_ids
+    first_ordinal = ENCOUNTER_START.toordinal()
+    draw_patient = skew.patient_sampler(len(patient_ids)).index
+    draw_provider = skew.provider_sampler(len(providers)).index
+    draw_day = skew.day_sampler(first_ordinal, (ENCOUNTER_END - ENCOUNTER_START).days + 1).index
+    if readmissions is None:
+        readmissions = {}
+    calendar = CALENDAR
+    date_keys, years, months, quarters, weekdays, iso_dates = (
+        calendar.date_keys, calendar.years, calendar.months, calendar.quarters, calendar.weekdays, calendar.iso_dates
+    )
     
-    write_sql_file("dim_provider.sql", "dim_provider", provider_rows, NUM_PROVIDERS)
-    
-    # -------------------------------------------------------------------------
-    # 9. FACT_ENCOUNTERS (10,000 rows with denormalized attributes)
-    # -------------------------------------------------------------------------
-    print("\nGenerating fact table (with denormalized attributes)...")
-    NUM_ENCOUNTERS = 10000
-    fact_rows = []
-    encounters = []
-    
-    # Create a map of patient -> previous encounters for readmission detection
-    patient_encounters = {}
-    
-    for i in range(1, NUM_ENCOUNTERS + 1):
-        # Select patient and provider
-        patient_idx = random.randint(0, NUM_PATIENTS - 1)
-        patient = patients[patient_idx]
+    for n, i in enumerate(encounter_ids):
+        # Select patient and provider (surrogate key == natural key)
+        patient_key = draw_patient(rng) + patient_ids.start
         
-        provider_idx = random.randint(0, NUM_PROVIDERS - 1)
-        provider = providers[provider_idx]
+        provider_key = draw_provider(rng) + 1
+        specialty_id, specialty_name, specialty_code, dept_id, dept_name, provider_name = providers[provider_key - 1]
         
         # Select encounter type (60% outpatient, 25% inpatient, 15% ER)
-        enc_type_weights = [60, 25, 15]
-        enc_type_idx = random.choices([0, 1, 2], weights=enc_type_weights)[0]
+        enc_type_idx = rng.choices([0, 1, 2], weights=ENCOUNTER_TYPE_WEIGHTS)[0]
         enc_type_code, enc_type_name, is_inpatient, avg_los = ENCOUNTER_TYPES[enc_type_idx]
         
-        # Generate dates
-        encounter_date = generate_date(2020, 2025)
+        # Generate dates (admitted at midnight; length of stay in seconds)
+        ordinal = first_ordinal + draw_day(rng)
         
         if is_inpatient:
-            los_days = random.randint(1, 14)
-            discharge_date = encounter_date + timedelta(days=los_days)
+            stay = rng.randint(1, 14) * SECONDS_PER_DAY
         elif enc_type_name == "Emergency":
-            los_hours = random.randint(1, 24)
-            discharge_date = encounter_date + timedelta(hours=los_hours)
+            stay = rng.randint(1, 24) * 3600
+        else:
+            stay = rng.randint(1, 4) * 3600
+        admitted = ordinal * SECONDS_PER_DAY
+        
+        # Calculate derived values (calendar lookups by day offset)
+        day = calendar.offset(ordinal)
+        discharge_day = calendar.offset((admitted + stay) // SECONDS_PER_DAY)
+        month = months[day]
+        day_of_week = weekdays[day]
+        
+        los_hours_calc = stay // 3600
+        los_days_calc = stay // SECONDS_PER_DAY
+        
+        # Counts (random but realistic): 1-5 diagnoses, 0-4 procedures
+        if counts is None:
+            diagnosis_count = rng.choices(DIAGNOSES_PER_ENCOUNTER[0], weights=DIAGNOSES_PER_ENCOUNTER[1])[0]
+            procedure_count = rng.choices(PROCEDURES_PER_ENCOUNTER[0], weights=PROCEDURES_PER_ENCOUNTER[1])[0]
         else:
-            los_hours = random.randint(1, 4)
-            discharge_date = encounter_date + timedelta(hours=los_hours)
-        
-        # Calculate derived values
-        date_key = int(encounter_date.strftime("%Y%m%d"))
-        discharge_key = int(discharge_date.strftime("%Y%m%d"))
-        year = encounter_date.year
-        month = encounter_date.month
-        month_name = MONTH_NAMES[month]
-        quarter = (month - 1) // 3 + 1
-        day_of_week = encounter_date.weekday() + 1
-        is_weekend = "TRUE" if day_of_week >= 6 else "FALSE"
-        
-        los_hours_calc = int((discharge_date - encounter_date).total_seconds() // 3600)
-        los_days_calc = int((discharge_date - encounter_date).days)
-        
-        # Counts (random but realistic)
-        diagnosis_count = random.choices([1, 2, 3, 4, 5], weights=[15, 40, 30, 10, 5])[0]
-        procedure_count = random.choices([0, 1, 2, 3, 4], weights=[20, 40, 25, 10, 5])[0]
-        
-        # Primary diagnosis
-        primary_diag_idx = random.randint(0, num_diagnoses - 1)
-        primary_diag = all_diagnoses[primary_diag_idx]
-        primary_diag_key = primary_diag[0]
-        primary_icd10_code = primary_diag[1]
-        primary_icd10_desc = primary_diag[2]
+            diagnosis_count, procedure_count = counts[0][n], counts[1][n]
+        
+        # Diagnosis and procedure sets (bridge rows); the first diagnosis is the primary one
+        diagnosis_keys = distinct_sample(rng, diagnosis_pool, diagnosis_count)
+        for seq, diag_key in enumerate(diagnosis_keys, 1):
+            diagnosis_rows.append((diagnosis_id, i, diag_key, seq))
+            diagnosis_id += 1
+        for proc_key in distinct_sample(rng, procedure_pool, procedure_count):
+            proc_day = calendar.offset(ordinal + rng.randint(0, 3))
+            procedure_rows.append((procedure_id, i, proc_key, iso_dates[proc_day]))
+            procedure_id += 1
+        primary_diag_key, primary_icd10_code, primary_icd10_desc = diagnoses[diagnosis_keys[0] - 1]
         
         # Billing amounts
-        if enc_type_name == "Outpatient":
-            claim_amount = round(random.uniform(100, 2000), 2)
-        elif enc_type_name == "Emergency":
-            claim_amount = round(random.uniform(500, 10000), 2)
+        claim_low, claim_high = CLAIM_AMOUNT_RANGES[enc_type_idx]
+        claim_amount = round(rng.uniform(claim_low, claim_high), 2)
+        
+        allowed_amount = round(claim_amount * rng.uniform(0.6, 0.9), 2)
+        
+        days_since_last = readmissions.get(i)
+        is_readmission = days_since_last is not None
+        
+        yield (
+            i, i,  # encounter_key, encounter_id
+            date_keys[day], date_keys[discharge_day],  # date keys
+            patient_key, provider_key, dept_id,  # FK to dims
+            enc_type_idx + 1, specialty_id, primary_diag_key,  # more FKs
+            calendar.timestamp(admitted),  # encounter_date
+            calendar.timestamp(admitted + stay),  # discharge_date
+            years[day], month, MONTH_NAMES[month], quarters[day], day_of_week, day_of_week >= 6,  # date attrs
+            specialty_name, specialty_code,  # specialty
+            dept_name, provider_name,  # dept, provider name
+            enc_type_name, is_inpatient,  # encounter type
+            primary_icd10_code, primary_icd10_desc,  # primary diag
+            diagnosis_count, procedure_count,  # counts
+            claim_amount, allowed_amount, 1,  # billing
+            los_hours_calc, los_days_calc, is_readmission, days_since_last,  # derived
+        )
+        
+        if len(diagnosis_rows) >= BRIDGE_BUFFER_ROWS:
+            _flush_bridges(bridges, diagnosis_rows, procedure_rows)
+    _flush_bridges(bridges, diagnosis_rows, procedure_rows)
+
+
+def _flush_bridges(bridges, diagnosis_rows, procedure_rows):
+    """Write buffered bridge rows (or drop them without ``bridges``) and empty the buffers."""
+    if bridges is not None:
+        bridges[0].write(diagnosis_rows)
+        bridges[1].write(procedure_rows)
+    diagnosis_rows.clear()
+    procedure_rows.clear()
+
+
+def fact_readmissions(fact_rows, months=None):
+    """Return {encounter_key: days since previous discharge} for the 30-day
+    readmissions among a fact stream's inpatient stays.
+
+    ``fact_rows`` is an unflagged replay of the stream about to be written
+    (same ids and random state), as tuples or ColumnBlocks; only the
+    encounter, patient and date keys of inpatient rows are kept. The YYYYMM
+    of every encounter, in stream order, is appended to ``months`` if given
+    (the bridge routing of --partition-by).
+    """
+    # encounter_key, date_key, discharge_date_key, patient_key, is_inpatient
+    stay_columns = (0, 2, 3, 4, 23)
+    
+    def date_key_seconds(date_key):
+        return date(date_key // 10000, date_key // 100 % 100, date_key % 100).toordinal() * SECONDS_PER_DAY
+    
+    def stays():
+        for row in fact_rows:
+            if type(row) is ColumnBlock:
+                rows = zip(*(row.columns[i] for i in stay_columns))
+                if months is not None:
+                    months.extend(date_key_month(date_key) for date_key in row.columns[2])
+            else:
+                rows = [[row[i] for i in stay_columns]]
+                if months is not None:
+                    months.append(date_key_month(row[2]))
+            for encounter_key, date_key, discharge_key, patient_key, is_inpatient in rows:
+                if is_inpatient:
+                    yield patient_key, date_key_seconds(date_key), date_key_seconds(discharge_key), encounter_key
+    
+    return find_readmissions(stays())
+
+
+# =============================================================================
+# VECTORIZED ROW STREAMS (--backend numpy)
+# =============================================================================
+# Same tables, columns and distributions as the random streams above, but each
+# chunk of rows draws whole columns with NumPy (see vectorized.py) and is
+# yielded as one ColumnBlock for the writers to render in bulk. The random
+# stream differs from the pure-Python backend, so the rows do too.
+
+AGE_GROUP_BOUNDS = [18, 35, 50, 65, 75]
+AGE_GROUPS = ["0-17", "18-34", "35-49", "50-64", "65-74", "75+"]
+
+
+def generate_dim_patient_rows_np(patient_ids, rng):
+    """Vectorized generate_dim_patient_rows; ``rng`` is a numpy Generator."""
+    first_names = np.array(FIRST_NAMES, dtype=object)
+    last_names = np.array(LAST_NAMES, dtype=object)
+    genders = np.array(["M", "F"], dtype=object)
+    gender_descs = np.array(["Male", "Female"], dtype=object)
+    age_groups = np.array(AGE_GROUPS, dtype=object)
+    today = datetime(2025, 1, 1).toordinal()
+    
+    for ids in vectorized.chunked(patient_ids):
+        n = len(ids)
+        first = first_names[rng.integers(0, len(FIRST_NAMES), n)]
+        last = last_names[rng.integers(0, len(LAST_NAMES), n)]
+        age_days = rng.integers(365, 365 * 95 + 1, n)
+        ages = age_days // 365
+        gender = rng.integers(0, 2, n)
+        yield ColumnBlock([
+            ids, ids, first.tolist(), last.tolist(), (first + " " + last).tolist(),
+            vectorized.format_dates(today - age_days), ages.tolist(),
+            age_groups[np.searchsorted(AGE_GROUP_BOUNDS, ages, side="right")].tolist(),
+            genders[gender].tolist(), gender_descs[gender].tolist(), [f"MRN{i:08d}" for i in ids],
+            [SCD2_START_DATE] * n, [None] * n, [True] * n,
+        ])
+
+
+def generate_fact_rows_np(encounter_ids, patient_ids, providers, diagnoses, num_procedures, rng,
+                          readmissions=None, skew=UNIFORM, bridges=None, counts=None, first_bridge_ids=(1, 1)):
+    """Vectorized generate_fact_rows; ``rng`` is a numpy Generator and ``counts`` is required.
+
+    The bridge rows of each chunk are written to ``bridges`` as one
+    ColumnBlock per table. The fact's string columns are DictionaryColumns:
+    the provider, type, month and primary diagnosis indexes drawn for the
+    chunk select codes into one dictionary per column.
+    """
+    diagnosis_counts_all, procedure_counts_all = (np.asarray(column) for column in counts)
+    diagnosis_id, procedure_id = first_bridge_ids
+    provider_columns = [np.array(column, dtype=object) for column in zip(*providers)]
+    provider_specialty_ids, provider_dept_ids = provider_columns[0], provider_columns[3]
+    diagnosis_columns = [np.array(column, dtype=object) for column in zip(*diagnoses)]
+    diagnosis_keys = diagnosis_columns[0]
+    
+    def encoded(column):
+        """(code of each entry, dictionary values) of a provider or diagnosis string column."""
+        dictionary = ValueDictionary()
+        return np.asarray(dictionary.encode(column)), dictionary.values
+    
+    # specialty name and code, department name, provider name by provider index
+    provider_strings = [encoded(provider_columns[i]) for i in (1, 2, 4, 5)]
+    # ICD-10 code and description by diagnosis index
+    diagnosis_strings = [encoded(diagnosis_columns[i]) for i in (1, 2)]
+    type_names = [name for _, name, _, _ in ENCOUNTER_TYPES]
+    type_inpatient = np.array([is_inpatient for _, _, is_inpatient, _ in ENCOUNTER_TYPES])
+    claim_low = np.array([low for low, _ in CLAIM_AMOUNT_RANGES], dtype=np.float64)
+    claim_high = np.array([high for _, high in CLAIM_AMOUNT_RANGES], dtype=np.float64)
+    calendar = CALENDAR
+    first_ordinal = ENCOUNTER_START.toordinal()
+    last_ordinal = ENCOUNTER_END.toordinal()
+    # Procedures fall up to 3 days after admission
+    calendar.cover(first_ordinal, last_ordinal + 3)
+    iso_dates, iso_first_ordinal = np.array(calendar.iso_dates, dtype=object), calendar.first_ordinal
+    patient_sampler = skew.patient_sampler(len(patient_ids))
+    provider_sampler = skew.provider_sampler(len(providers))
+    day_sampler = skew.day_sampler(first_ordinal, last_ordinal - first_ordinal + 1)
+    inpatient_type = [name for _, name, _, _ in ENCOUNTER_TYPES].index("Inpatient")
+    emergency_type = [name for _, name, _, _ in ENCOUNTER_TYPES].index("Emergency")
+    if readmissions is None:
+        readmissions = {}
+    
+    for ids in vectorized.chunked(encounter_ids):
+        n = len(ids)
+        lo = ids.start - encounter_ids.start
+        patient_keys = patient_ids.start + vectorized.sample(rng, patient_sampler, n)
+        provider_idx = vectorized.sample(rng, provider_sampler, n)
+        types = vectorized.weighted_indexes(rng, ENCOUNTER_TYPE_WEIGHTS, n)
+        ordinals = first_ordinal + vectorized.sample(rng, day_sampler, n)
+        
+        # Length of stay in seconds: 1-14 days inpatient, 1-24 hours ER, 1-4 hours outpatient
+        inpatient = types == inpatient_type
+        stay = rng.integers(1, 5, n) * 3600
+        emergency = types == emergency_type
+        stay[emergency] = rng.integers(1, 25, int(emergency.sum())) * 3600
+        stay[inpatient] = rng.integers(1, 15, int(inpatient.sum())) * SECONDS_PER_DAY
+        admitted = ordinals * SECONDS_PER_DAY
+        discharged = admitted + stay
+        
+        calendar.cover(int(ordinals.min()), int(discharged.max()) // SECONDS_PER_DAY)
+        days = ordinals - calendar.first_ordinal
+        date_keys, years, months, quarters, weekdays = (
+            vectorized.lookup(column, days)
+            for column in (calendar.date_keys, calendar.years, calendar.months, calendar.quarters, calendar.weekdays)
+        )
+        discharge_keys = vectorized.lookup(
+            calendar.date_keys, discharged // SECONDS_PER_DAY - calendar.first_ordinal
+        )
+        
+        # Diagnosis and procedure sets (bridge rows); the first diagnosis is the primary one
+        diagnosis_counts = diagnosis_counts_all[lo:lo + n]
+        procedure_counts = procedure_counts_all[lo:lo + n]
+        encounter_keys = np.arange(ids.start, ids.stop)
+        bridge_encounters, bridge_diagnoses, sequences = vectorized.explode(
+            encounter_keys, diagnosis_counts, vectorized.distinct_samples(rng, diagnosis_counts, len(diagnoses))
+        )
+        primary = bridge_diagnoses[sequences == 1] - 1
+        proc_encounters, bridge_procedures, _ = vectorized.explode(
+            encounter_keys, procedure_counts, vectorized.distinct_samples(rng, procedure_counts, num_procedures)
+        )
+        proc_days = np.repeat(ordinals, procedure_counts) + rng.integers(0, 4, len(proc_encounters))
+        if bridges is not None:
+            bridges[0].write([ColumnBlock([
+                range(diagnosis_id, diagnosis_id + len(bridge_encounters)), bridge_encounters.tolist(),
+                bridge_diagnoses.tolist(), sequences.tolist(),
+            ])])
+            bridges[1].write([ColumnBlock([
+                range(procedure_id, procedure_id + len(proc_encounters)), proc_encounters.tolist(),
+                bridge_procedures.tolist(), iso_dates[proc_days - iso_first_ordinal].tolist(),
+            ])])
+        diagnosis_id += len(bridge_encounters)
+        procedure_id += len(proc_encounters)
+        claim_amounts = vectorized.uniform_amounts(rng, claim_low[types], claim_high[types])
+        allowed_amounts = np.round(claim_amounts * rng.uniform(0.6, 0.9, n), 2)
+        
+        days_since_last = [None] * n
+        if readmissions:
+            days_since_last = [readmissions.get(key) for key in ids]
+        is_readmission = [days is not None for days in days_since_last]
+        
+        dept_ids = provider_dept_ids[provider_idx].tolist()
+        specialty_ids = provider_specialty_ids[provider_idx].tolist()
+        specialty_names, specialty_codes, dept_names, provider_names = (
+            DictionaryColumn(vectorized.codes(codes[provider_idx]), values) for codes, values in provider_strings
+        )
+        icd10_codes, icd10_descs = (
+            DictionaryColumn(vectorized.codes(codes[primary]), values) for codes, values in diagnosis_strings
+        )
+        yield ColumnBlock([
+            ids, ids,
+            date_keys.tolist(), discharge_keys.tolist(),
+            patient_keys.tolist(), (provider_idx + 1).tolist(), dept_ids,
+            (types + 1).tolist(), specialty_ids, diagnosis_keys[primary].tolist(),
+            vectorized.format_timestamps(admitted),
+            vectorized.format_timestamps(discharged),
+            years.tolist(), months.tolist(), DictionaryColumn(vectorized.codes(months), MONTH_NAMES),
+            quarters.tolist(), weekdays.tolist(), (weekdays >= 6).tolist(),
+            specialty_names, specialty_codes, dept_names, provider_names,
+            DictionaryColumn(vectorized.codes(types), type_names), type_inpatient[types].tolist(),
+            icd10_codes, icd10_descs,
+            diagnosis_counts.tolist(), procedure_counts.tolist(),
+            claim_amounts.tolist(), allowed_amounts.tolist(), [1] * n,
+            (stay // 3600).tolist(), (stay // SECONDS_PER_DAY).tolist(), is_readmission, days_since_last,
+        ])
+
+
+# =============================================================================
+# OLTP -> STAR SCHEMA TRANSFORM (--source oltp)
+# =============================================================================
+# Implements the joins from etl_design.txt as hash joins with one scan per
+# source table: lookup tables and dimensions are loaded into dicts keyed by
+# natural key, encounters are scanned once into typed column arrays, and
+# billing / diagnosis / procedure rows are aggregated per encounter by array
+# index. The bridges are emitted during their own scan; the fact is emitted
+# last from the encounter arrays.
+#
+# Surrogate keys come from an etl_state.SurrogateKeys: numbered in source
+# order for a full build, or continued from the persisted key maps by an
+# incremental refresh (see INCREMENTAL REFRESH below).
+
+# Denormalized provider attributes cached for the fact (see dimension_cache.py)
+PROVIDER_ATTRIBUTES = ("specialty_key", "specialty_name", "specialty_code", "provider_name")
+
+# Encounter type name or code -> index into ENCOUNTER_TYPES
+ENCOUNTER_TYPE_LOOKUP = {}
+for _idx, (_code, _name, _, _) in enumerate(ENCOUNTER_TYPES):
+    ENCOUNTER_TYPE_LOOKUP[_name] = ENCOUNTER_TYPE_LOOKUP[_code] = _idx
+
+
+def parse_timestamp(value):
+    """Convert an OLTP DATE/DATETIME value to seconds since 0001-01-01 (-1 for NULL)."""
+    if value is None or value == "":
+        return -1
+    dt = datetime.fromisoformat(str(value))
+    return dt.toordinal() * SECONDS_PER_DAY + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def sql_amount(value):
+    """Round a summed DECIMAL(12, 2) measure; whole amounts render as ints."""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+
+class EncounterColumns:
+    """Column store of the scanned OLTP encounters plus their aggregates.
+
+    Position ``i`` holds the encounter with surrogate key ``first_key + i``;
+    per-row storage is a handful of typed array slots instead of a dict per
+    row, and providers are referenced by their DimensionCache position.
+    ``last_id`` is the largest encounter_id scanned, skipped rows included.
+    """
+
+    __slots__ = (
+        "first_key", "last_id", "key_by_id", "encounter_ids", "patient_ids", "patient_keys",
+        "provider_positions", "department_ids",
+        "type_indexes", "admit_seconds", "discharge_seconds", "diagnosis_counts",
+        "primary_diagnosis_ids", "procedure_counts", "claim_totals", "allowed_totals",
+        "claim_counts", "skipped",
+    )
+
+    def __init__(self, first_key=1):
+        self.first_key = first_key
+        self.last_id = 0
+        self.key_by_id = KeyMap()
+        self.encounter_ids = array("q")
+        self.patient_ids = array("q")
+        self.patient_keys = array("q")
+        self.provider_positions = array("i")
+        self.department_ids = array("q")
+        self.type_indexes = bytearray()
+        self.admit_seconds = array("q")
+        self.discharge_seconds = array("q")
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.encounter_ids)
+
+    def allocate_aggregates(self):
+        n = len(self)
+        self.diagnosis_counts = array("i", bytes(4 * n))
+        self.primary_diagnosis_ids = array("q", [-1]) * n
+        self.procedure_counts = array("i", bytes(4 * n))
+        self.claim_totals = array("d", bytes(8 * n))
+        self.allowed_totals = array("d", bytes(8 * n))
+        self.claim_counts = array("i", bytes(4 * n))
+
+
+def etl_dim_specialty_rows(source, specialties, keys=None):
+    """Yield dim_specialty rows; fills ``specialties`` id -> (key, name, code)."""
+    keys = SurrogateKeys() if keys is None else keys
+    for row in read_table(source, "specialties"):
+        specialty_id, name, code = int(row[0]), row[1], row[2]
+        key = keys(specialty_id)
+        specialties[specialty_id] = (key, name, code)
+        yield (key, specialty_id, name, code)
+
+
+def etl_dim_department_rows(source, departments, keys=None):
+    """Yield dim_department rows; fills ``departments`` id -> (key, name)."""
+    keys = SurrogateKeys() if keys is None else keys
+    for row in read_table(source, "departments"):
+        department_id, name = int(row[0]), row[1]
+        key = keys(department_id)
+        floor = None if row[2] is None else int(row[2])
+        capacity = None if row[3] is None else int(row[3])
+        departments[department_id] = (key, name)
+        yield (key, department_id, name, floor, capacity)
+
+
+def etl_dim_diagnosis_rows(source, diagnoses, keys=None):
+    """Yield dim_diagnosis rows; fills ``diagnoses`` id -> (key, code, description)."""
+    keys = SurrogateKeys() if keys is None else keys
+    for row in read_table(source, "diagnoses"):
+        diagnosis_id, code, desc = int(row[0]), row[1], row[2]
+        key = keys(diagnosis_id)
+        diagnoses[diagnosis_id] = (key, code, desc)
+        yield (key, diagnosis_id, code, desc)
+
+
+def etl_dim_procedure_rows(source, procedures, keys=None):
+    """Yield dim_procedure rows; fills ``procedures`` id -> key."""
+    keys = SurrogateKeys() if keys is None else keys
+    for row in read_table(source, "procedures"):
+        procedure_id, code, desc = int(row[0]), row[1], row[2]
+        key = keys(procedure_id)
+        procedures[procedure_id] = key
+        yield (key, procedure_id, code, desc)
+
+
+def etl_dim_patient_rows(source, patient_keys, versions=None):
+    """Yield dim_patient (SCD2) version rows; fills ``patient_keys`` (a KeyMap) id -> current key.
+
+    ``versions`` (an scd2.Scd2Processor) decides which patients start a new
+    version; by default every patient gets a first version effective from
+    SCD2_START_DATE.
+    """
+    today = datetime(2025, 1, 1)
+    if versions is None:
+        versions = Scd2Processor(VersionMap(), SCD2_START_DATE)
+    for row in read_table(source, "patients"):
+        patient_id, first_name, last_name, dob, gender, mrn = row
+        patient_id = int(patient_id)
+        full_name = f"{first_name} {last_name}"
+        
+        if dob is None:
+            dob_str, age, age_group = None, None, None
         else:
-            claim_amount = round(random.uniform(5000, 100000), 2)
-        
-        allowed_amount = round(claim_amount * random.uniform(0.6, 0.9), 2)
-        
-        # Readmission detection
-        is_readmission = "FALSE"
-        days_since_last = "NULL"
-        
-        if is_inpatient and patient["id"] in patient_encounters:
-            prev_encounters = patient_encounters[patient["id"]]
-            for prev in prev_encounters:
-                if prev["is_inpatient"] and prev["discharge_date"]:
-                    days_diff = (encounter_date - prev["discharge_date"]).days
-                    if 0 < days_diff <= 30:
-                        is_readmission = "TRUE"
-                        days_since_last = days_diff
-                        break
-        
-        # Track for future readmission detection
-        if patient["id"] not in patient_encounters:
-            patient_encounters[patient["id"]] = []
-        patient_encounters[patient["id"]].append({
-            "encounter_date": encounter_date,
-            "discharge_date": discharge_date,
-            "is_inpatient": is_inpatient
-        })
-        
-        encounters.append({
-            "key": i,
-            "patient_key": patient["key"],
-            "provider_key": provider["key"],
-            "date": encounter_date
-        })
-        
-        # Build the INSERT statement with all denormalized attributes
-        is_inp_str = "TRUE" if is_inpatient else "FALSE"
-        
-        fact_rows.append(
-            f"INSERT INTO fact_encounters VALUES ("
-            f"{i}, {i}, "  # encounter_key, encounter_id
-            f"{date_key}, {discharge_key}, "  # date keys
-            f"{patient['key']}, {provider['key']}, {provider['dept_id']}, "  # FK to dims
-            f"{enc_type_idx + 1}, {provider['specialty_id']}, {primary_diag_key}, "  # more FKs
-            f"'{encounter_date.strftime('%Y-%m-%d %H:%M:%S')}', "  # encounter_date
-            f"'{discharge_date.strftime('%Y-%m-%d %H:%M:%S')}', "  # discharge_date
-            f"{year}, {month}, '{month_name}', {quarter}, {day_of_week}, {is_weekend}, "  # date attrs
-            f"'{provider['specialty_name']}', '{provider['specialty_code']}', "  # specialty
-            f"'{escape_sql(provider['dept_name'])}', '{provider['name']}', "  # dept, provider name
-            f"'{enc_type_name}', {is_inp_str}, "  # encounter type
-            f"'{primary_icd10_code}', '{escape_sql(primary_icd10_desc)}', "  # primary diag
-            f"{diagnosis_count}, {procedure_count}, "  # counts
-            f"{claim_amount}, {allowed_amount}, 1, "  # billing
-            f"{los_hours_calc}, {los_days_calc}, {is_readmission}, {days_since_last}"  # derived
-            f");"
-        )
-    
-    write_sql_file("fact_encounters.sql", "fact_encounters", fact_rows, NUM_ENCOUNTERS)
+            dob_dt = datetime.fromisoformat(str(dob))
+            dob_str = dob_dt.strftime("%Y-%m-%d")
+            age = (today - dob_dt).days // 365
+            age_group = calculate_age_group(dob_dt)
+        gender_desc = {"M": "Male", "F": "Female"}.get(gender)
+        
+        attributes = (first_name, last_name, full_name, dob_str, age, age_group, gender, gender_desc, mrn)
+        key, is_new_version = versions(patient_id, attributes)
+        patient_keys[patient_id] = key
+        if is_new_version:
+            yield (key, patient_id) + attributes + (versions.effective_date, None, True)
+
+
+def etl_dim_provider_rows(source, specialties, departments, providers, keys=None):
+    """Yield dim_provider rows (joined to specialty and department).
+
+    Caches every provider's key and PROVIDER_ATTRIBUTES in ``providers`` (a DimensionCache).
+    """
+    unknown_specialty = (None, None, None)
+    unknown_department = (None, None)
+    keys = SurrogateKeys() if keys is None else keys
+    for row in read_table(source, "providers"):
+        provider_id, first_name, last_name, credential, specialty_id, department_id = row
+        provider_id = int(provider_id)
+        key = keys(provider_id)
+        specialty_id = None if specialty_id is None else int(specialty_id)
+        department_id = None if department_id is None else int(department_id)
+        full_name = f"{first_name} {last_name}"
+        
+        specialty_key, specialty_name, specialty_code = specialties.get(specialty_id, unknown_specialty)
+        department_key, department_name = departments.get(department_id, unknown_department)
+        
+        providers.add(provider_id, key, (specialty_key, specialty_name, specialty_code, full_name))
+        yield (
+            key, provider_id, first_name, last_name, full_name, credential,
+            specialty_key, specialty_id, specialty_name, specialty_code,
+            department_key, department_id, department_name,
+        )
+
+
+def scan_encounters(source, patient_keys, providers, departments, first_key=1, since=None):
+    """Single scan of OLTP encounters into an EncounterColumns store.
+
+    Mirrors the INNER JOINs of the fact load: encounters whose patient,
+    provider (with a specialty), department or type cannot be resolved are
+    counted in ``skipped`` and left out. A refresh passes the ``since``
+    filter of read_table and the next free fact key as ``first_key``.
+    """
+    encounters = EncounterColumns(first_key)
+    specialty_codes, specialty_keys = providers.column("specialty_key")
+    for row in read_table(source, "encounters", since):
+        encounter_id, patient_id, provider_id, encounter_type, enc_date, dis_date, department_id = row
+        encounter_id = int(encounter_id)
+        encounters.last_id = max(encounters.last_id, encounter_id)
+        patient_key = patient_keys.get(int(patient_id))
+        provider = providers.position(int(provider_id))
+        department_id = None if department_id is None else int(department_id)
+        type_idx = ENCOUNTER_TYPE_LOOKUP.get(encounter_type)
+        if (patient_key is None or provider is None or specialty_keys[specialty_codes[provider]] is None
+                or department_id not in departments or type_idx is None):
+            encounters.skipped += 1
+            continue
+        
+        encounters.key_by_id[encounter_id] = first_key + len(encounters)
+        encounters.encounter_ids.append(encounter_id)
+        encounters.patient_ids.append(int(patient_id))
+        encounters.patient_keys.append(patient_key)
+        encounters.provider_positions.append(provider)
+        encounters.department_ids.append(department_id)
+        encounters.type_indexes.append(type_idx)
+        encounters.admit_seconds.append(parse_timestamp(enc_date))
+        encounters.discharge_seconds.append(parse_timestamp(dis_date))
+    encounters.allocate_aggregates()
+    return encounters
+
+
+def aggregate_billing(source, encounters, since=None, processed=None, late_claims=None):
+    """Single scan of billing: SUM(claim), SUM(allowed), COUNT(*) per encounter.
+
+    Returns the etl_state.ClaimWatermark reached. A refresh passes the
+    ``since`` filter (``processed.since``), the ``processed`` watermark of
+    the previous run (rows it already covered are skipped) and a
+    ``late_claims`` dict that collects encounter_id -> [claim, allowed,
+    count] for claims of encounters outside this scan.
+    """
+    key_by_id, first_key = encounters.key_by_id, encounters.first_key
+    claim_totals, allowed_totals, claim_counts = (
+        encounters.claim_totals, encounters.allowed_totals, encounters.claim_counts
+    )
+    watermark = ClaimWatermark(0 if processed is None else processed.billing_id)
+    for row in read_table(source, "billing", since):
+        billing_id, encounter_id = int(row[0]), int(row[1])
+        claim_date = "" if row[4] is None else str(row[4])[:10]
+        if processed is not None and processed.seen(billing_id, claim_date):
+            continue
+        watermark.advance(billing_id)
+        
+        key = key_by_id.get(encounter_id)
+        if key is None:
+            if late_claims is not None:
+                totals = late_claims.setdefault(encounter_id, [0.0, 0.0, 0])
+                totals[0] += float(row[2] or 0)
+                totals[1] += float(row[3] or 0)
+                totals[2] += 1
+            continue
+        idx = key - first_key
+        claim_totals[idx] += float(row[2] or 0)
+        allowed_totals[idx] += float(row[3] or 0)
+        claim_counts[idx] += 1
+    return watermark
+
+
+def etl_bridge_diagnosis_rows(source, encounters, diagnoses, first_id=1, since=None):
+    """Yield bridge_encounter_diagnoses rows while counting diagnoses per
+    encounter and picking up each encounter's primary (sequence 1) diagnosis."""
+    key_by_id, first_key = encounters.key_by_id, encounters.first_key
+    diagnosis_counts, primary_ids = encounters.diagnosis_counts, encounters.primary_diagnosis_ids
+    bridge_id = first_id
+    for row in read_table(source, "encounter_diagnoses", since):
+        encounter_key = key_by_id.get(int(row[1]))
+        diagnosis = diagnoses.get(int(row[2]))
+        if encounter_key is None or diagnosis is None:
+            continue
+        seq = int(row[3])
+        diagnosis_counts[encounter_key - first_key] += 1
+        if seq == 1:
+            primary_ids[encounter_key - first_key] = int(row[2])
+        
+        yield (bridge_id, encounter_key, diagnosis[0], seq)
+        bridge_id += 1
+
+
+def etl_bridge_procedure_rows(source, encounters, procedures, first_id=1, since=None):
+    """Yield bridge_encounter_procedures rows while counting procedures per encounter."""
+    key_by_id, first_key = encounters.key_by_id, encounters.first_key
+    procedure_counts = encounters.procedure_counts
+    bridge_id = first_id
+    for row in read_table(source, "encounter_procedures", since):
+        encounter_key = key_by_id.get(int(row[1]))
+        procedure_key = procedures.get(int(row[2]))
+        if encounter_key is None or procedure_key is None:
+            continue
+        procedure_counts[encounter_key - first_key] += 1
+        procedure_date = None if row[3] is None else str(row[3])[:10]
+        
+        yield (bridge_id, encounter_key, procedure_key, procedure_date)
+        bridge_id += 1
+
+
+def inpatient_stays(encounters):
+    """Yield (patient_id, admit_seconds, discharge_seconds, encounter index)
+    for every scanned inpatient encounter with a discharge time.
+
+    Stays are grouped by the natural patient_id: the surrogate patient_key
+    changes with every dim_patient version.
+    """
+    patient_ids, admits, discharges = (
+        encounters.patient_ids, encounters.admit_seconds, encounters.discharge_seconds
+    )
+    for i, type_idx in enumerate(encounters.type_indexes):
+        if ENCOUNTER_TYPES[type_idx][2] and discharges[i] >= 0:
+            yield patient_ids[i], admits[i], discharges[i], i
+
+
+def compute_readmissions(encounters):
+    """Return {encounter index: days since previous discharge} for 30-day
+    inpatient readmissions.
+
+    Inpatient stays go through the readmission engine (sort by patient and
+    admit time, one sweep), so each stay is compared with the same patient's
+    previous stay regardless of source order.
+    """
+    return find_readmissions(inpatient_stays(encounters))
+
+
+def encounter_months(encounters):
+    """encounter_key -> YYYYMM of admission of the scanned ``encounters``: the
+    month the fact partitions them by, for routing their bridge rows with
+    --partition-by (None without)."""
+    if PARTITION_BY == "none":
+        return None
+    months, month_of_day = array("i"), {}
+    for admit in encounters.admit_seconds:
+        ordinal = admit // SECONDS_PER_DAY
+        month = month_of_day.get(ordinal)
+        if month is None:
+            day = date.fromordinal(ordinal)
+            month = month_of_day[ordinal] = day.year * 100 + day.month
+        months.append(month)
+    first_key = encounters.first_key
+    return lambda encounter_key: months[encounter_key - first_key]
+
+
+def encounter_groups(encounters, providers):
+    """Yield (encounter_key, encounter_id, year, month, specialty_key, encounter_type_key)
+    of every scanned encounter: its grain in the summary aggregates."""
+    calendar = CALENDAR
+    specialty_codes, specialty_keys = providers.column("specialty_key")
+    for i in range(len(encounters)):
+        day = calendar.offset(encounters.admit_seconds[i] // SECONDS_PER_DAY)
+        yield (
+            encounters.first_key + i, encounters.encounter_ids[i], calendar.years[day], calendar.months[day],
+            specialty_keys[specialty_codes[encounters.provider_positions[i]]], encounters.type_indexes[i] + 1,
+        )
+
+
+def etl_fact_rows(encounters, providers, departments, diagnoses, readmissions):
+    """Yield fact_encounters rows from the scanned encounters and aggregates."""
+    calendar = CALENDAR
+    date_keys, years, months, quarters, weekdays = (
+        calendar.date_keys, calendar.years, calendar.months, calendar.quarters, calendar.weekdays
+    )
+    provider_keys = providers.keys
+    specialty_key_codes, specialty_keys = providers.column("specialty_key")
+    specialty_name_codes, specialty_names = providers.column("specialty_name")
+    specialty_code_codes, specialty_codes = providers.column("specialty_code")
+    name_codes, provider_names = providers.column("provider_name")
+    for i in range(len(encounters)):
+        provider = encounters.provider_positions[i]
+        provider_key = provider_keys[provider]
+        specialty_key = specialty_keys[specialty_key_codes[provider]]
+        specialty_name = specialty_names[specialty_name_codes[provider]]
+        specialty_code = specialty_codes[specialty_code_codes[provider]]
+        provider_name = provider_names[name_codes[provider]]
+        department_key, department_name = departments[encounters.department_ids[i]]
+        type_idx = encounters.type_indexes[i]
+        _, enc_type_name, is_inpatient, _ = ENCOUNTER_TYPES[type_idx]
+        
+        admit = encounters.admit_seconds[i]
+        discharge = encounters.discharge_seconds[i]
+        day = calendar.offset(admit // SECONDS_PER_DAY)
+        month = months[day]
+        day_of_week = weekdays[day]
+        
+        if discharge >= 0:
+            discharge_key = date_keys[calendar.offset(discharge // SECONDS_PER_DAY)]
+            discharge_str = calendar.timestamp(discharge)
+            los_hours = (discharge - admit) // 3600
+            los_days = discharge // SECONDS_PER_DAY - admit // SECONDS_PER_DAY
+        else:
+            discharge_key = discharge_str = los_hours = los_days = None
+        
+        primary_id = encounters.primary_diagnosis_ids[i]
+        primary_key, primary_code, primary_desc = diagnoses.get(primary_id, (None, None, None))
+        
+        days_since_last = readmissions.get(i)
+        
+        yield (
+            encounters.first_key + i, encounters.encounter_ids[i],
+            date_keys[day], discharge_key,
+            encounters.patient_keys[i], provider_key, department_key,
+            type_idx + 1, specialty_key, primary_key,
+            calendar.timestamp(admit), discharge_str,
+            years[day], month, MONTH_NAMES[month], quarters[day], day_of_week, day_of_week >= 6,
+            specialty_name, specialty_code,
+            department_name, provider_name,
+            enc_type_name, is_inpatient,
+            primary_code, primary_desc,
+            encounters.diagnosis_counts[i], encounters.procedure_counts[i],
+            sql_amount(encounters.claim_totals[i]), sql_amount(encounters.allowed_totals[i]),
+            encounters.claim_counts[i],
+            los_hours, los_days, days_since_last is not None, days_since_last,
+        )
+
+
+def oltp_task_graph(source, dimension_entries=None):
+    """The full OLTP transform as a TaskGraph (see task_graph.py).
+
+    The dimensions only read their own source tables, so they run
+    concurrently; dim_provider waits for the specialties and departments it
+    denormalizes, the encounter scan for the patient and provider key maps.
+    The bridges resolve the scanned encounters and count each encounter's
+    diagnoses and procedures, billing sums its claims and readmissions pair
+    its stays; those four run side by side and the fact, which carries all
+    of it, comes last. dim_date waits for the fact: the encounter dates
+    widen CALENDAR past the --calendar range where they fall outside it, and
+    dim_date has to include those days.
+
+    With ``dimension_entries`` (a dict) the (natural id, key, hash) entries of
+    the tracked dimensions are collected in it, per table.
+    """
+    def tracked(table_name, rows):
+        if dimension_entries is None:
+            return rows
+        return dimension_delta(table_name, rows, {}, dimension_entries.setdefault(table_name, []), [])
+    
+    def dimension(filename, table_name, etl_rows):
+        def task():
+            lookup = {}
+            write_sql_file(filename, table_name, tracked(table_name, etl_rows(source, lookup)))
+            return lookup
+        return task
+    
+    def dim_patient():
+        patient_keys, patient_versions = KeyMap(), Scd2Processor(VersionMap(), SCD2_START_DATE)
+        write_sql_file("dim_patient.sql", "dim_patient", etl_dim_patient_rows(source, patient_keys, patient_versions))
+        return patient_keys, patient_versions
+    
+    def dim_provider(specialties, departments):
+        providers = DimensionCache(PROVIDER_ATTRIBUTES)
+        write_sql_file(
+            "dim_provider.sql", "dim_provider",
+            tracked("dim_provider", etl_dim_provider_rows(source, specialties, departments, providers)),
+        )
+        return providers
+    
+    def scan(patient_keys, providers, departments):
+        with REPORT.stage("scan encounters") as stage:
+            encounters = scan_encounters(source, patient_keys, providers, departments)
+            stage.count(len(encounters))
+        print(f"  [OK] encounters: {len(encounters):,} rows ({encounters.skipped:,} unresolved, skipped)")
+        return encounters
+    
+    def billing(encounters):
+        with REPORT.stage("scan billing"):
+            return aggregate_billing(source, encounters)
+    
+    def readmissions(encounters):
+        with REPORT.stage("readmissions") as stage:
+            readmissions = compute_readmissions(encounters)
+            stage.count(len(encounters))
+        return readmissions
+    
+    def fact(encounters, providers, departments, diagnoses, readmissions):
+        aggregates, bitmaps = FactAggregates(TABLE_COLUMNS["fact_encounters"]), fact_bitmap_index()
+        write_sql_file(
+            "fact_encounters.sql", "fact_encounters",
+            indexed(aggregates.observe(etl_fact_rows(encounters, providers, departments, diagnoses, readmissions)),
+                    bitmaps),
+            len(encounters),
+        )
+        write_bitmap_index(bitmaps)
+        return aggregates
+    
+    graph = TaskGraph()
+    graph.add(
+        "dim_specialty", dimension("dim_specialty.sql", "dim_specialty", etl_dim_specialty_rows),
+        outputs=("specialties",),
+    )
+    graph.add(
+        "dim_department", dimension("dim_department.sql", "dim_department", etl_dim_department_rows),
+        outputs=("departments",),
+    )
+    graph.add(
+        "dim_encounter_type",
+        lambda: write_sql_file(
+            "dim_encounter_type.sql", "dim_encounter_type", generate_dim_encounter_type_rows(), len(ENCOUNTER_TYPES)
+        ),
+    )
+    graph.add(
+        "dim_diagnosis", dimension("dim_diagnosis.sql", "dim_diagnosis", etl_dim_diagnosis_rows),
+        outputs=("diagnoses",),
+    )
+    graph.add(
+        "dim_procedure", dimension("dim_procedure.sql", "dim_procedure", etl_dim_procedure_rows),
+        outputs=("procedures",),
+    )
+    graph.add("dim_patient", dim_patient, outputs=("patient_keys", "patient_versions"))
+    graph.add("dim_provider", dim_provider, ("specialties", "departments"), ("providers",))
+    graph.add("scan encounters", scan, ("patient_keys", "providers", "departments"), ("encounters",))
+    # Billing and the bridges fill separate per-encounter arrays (claim totals,
+    # diagnosis and procedure counts) that only the fact reads
+    graph.add("scan billing", billing, ("encounters",), ("claims",))
+    graph.add(
+        "bridge_diagnoses",
+        lambda encounters, diagnoses: write_sql_file(
+            "bridge_diagnoses.sql", "bridge_encounter_diagnoses",
+            etl_bridge_diagnosis_rows(source, encounters, diagnoses), encounter_month=encounter_months(encounters),
+        ),
+        ("encounters", "diagnoses"), ("num_diagnosis_bridges",),
+    )
+    graph.add(
+        "bridge_procedures",
+        lambda encounters, procedures: write_sql_file(
+            "bridge_procedures.sql", "bridge_encounter_procedures",
+            etl_bridge_procedure_rows(source, encounters, procedures), encounter_month=encounter_months(encounters),
+        ),
+        ("encounters", "procedures"), ("num_procedure_bridges",),
+    )
+    graph.add("readmissions", readmissions, ("encounters",), ("readmissions",))
+    graph.add(
+        "fact_encounters", fact, ("encounters", "providers", "departments", "diagnoses", "readmissions"),
+        ("aggregates",), after=("scan billing", "bridge_diagnoses", "bridge_procedures"),
+    )
+    graph.add(
+        "dim_date", lambda: write_sql_file("dim_date.sql", "dim_date", CALENDAR.dim_date_rows(), len(CALENDAR)),
+        after=("fact_encounters",),
+    )
+    graph.add("summary aggregates", write_aggregate_files, ("aggregates",))
+    return graph
+
+
+def build_from_oltp(source, state=None, workers=None):
+    """Transform OLTP data (directory of data files or SQLite database) into the star schema.
+
+    The stages run as the task graph of oltp_task_graph on ``workers`` threads
+    (default: CPU count); the schedule and its critical path go into the run
+    report. With ``state`` (an etl_state.EtlState) the watermarks, key maps
+    and inpatient stays that refresh_from_oltp continues from are recorded too.
+    """
+    print(f"Reading OLTP source: {source}")
+    dimension_entries = {} if state is not None else None
+    graph = oltp_task_graph(source, dimension_entries)
+    
+    print(f"\nTransforming ({len(graph.tasks)} tasks; independent ones run concurrently)...")
+    values = graph.run(workers)
+    schedule = REPORT.sections["task_graph"] = graph.schedule()
+    print(f"\nCritical path ({schedule['critical_path_seconds']:.2f}s of {schedule['wall_seconds']:.2f}s): "
+          f"{' -> '.join(schedule['critical_path'])}")
+    
+    if state is not None:
+        encounters, readmissions = values["encounters"], values["readmissions"]
+        for table_name, entries in sorted(dimension_entries.items()):
+            state.save_dimension_keys(table_name, entries)
+        state.save_dimension_keys("dim_patient", values["patient_versions"].versions.changed_entries())
+        state.save_stays(
+            (patient_id, admit, discharge, encounters.first_key + i, readmissions.get(i))
+            for patient_id, admit, discharge, i in inpatient_stays(encounters)
+        )
+        state.save_groups(encounter_groups(encounters, values["providers"]))
+        record_state(
+            state, 0, encounters, values["claims"],
+            values["num_diagnosis_bridges"] + 1, values["num_procedure_bridges"] + 1,
+        )
+
+
+# =============================================================================
+# INCREMENTAL REFRESH (--source oltp --incremental)
+# =============================================================================
+# The first run is a full build that also records an etl_state.EtlState.
+# Each later run reads only the OLTP rows past the watermarks (encounters
+# after the last encounter_id and their bridge rows; billing rows after the
+# last billing_id, whatever their claim_date), rescans the dimension sources
+# against the stored row hashes, and writes a delta batch to
+# increments/NNNNN/: new rows in the usual files, UPDATE scripts for changed
+# dimension rows (type 1, in place) and for earlier facts (late claims,
+# readmission flags of patients with new stays), additive delta rows for the
+# summary aggregates, plus loader scripts that apply them in order.
+# dim_patient is type 2 instead (scd2.py): a changed patient gets a new version row, effective from
+# --as-of, and an UPDATE expiring the old one. Encounters are treated as
+# insert-only with increasing ids, and so are billing rows.
+
+INCREMENTS_DIRNAME = "increments"
+
+
+def dimension_delta(table_name, rows, known, entries, updates):
+    """Yield the dimension rows whose natural id is not in ``known``.
+
+    ``known`` maps natural id -> (surrogate key, row hash); rows whose hash
+    changed become UPDATE statements in ``updates``. (natural id, key, hash)
+    of every new or changed row is appended to ``entries``.
+    """
+    columns = TABLE_COLUMNS[table_name]
+    for row in rows:
+        digest = row_hash(row[1:])
+        previous = known.get(row[1])
+        if previous is not None and previous[1] == digest:
+            continue
+        entries.append((row[1], row[0], digest))
+        if previous is None:
+            yield row
+        else:
+            updates.append(update_statement(table_name, columns[0], row[0], columns[1:], row[1:]))
+
+
+def refresh_readmissions(state, encounters):
+    """Readmissions of the new encounters, recomputed over the stored stays of
+    the patients they touch.
+
+    Returns ({encounter index: days} for the new encounters, UPDATE
+    statements for earlier facts whose flags changed, and their
+    (encounter_key, old days, new days)); the new and changed stays are
+    saved to ``state``.
+    """
+    first_key = encounters.first_key
+    new_stays = [
+        (patient_id, admit, discharge, first_key + i)
+        for patient_id, admit, discharge, i in inpatient_stays(encounters)
+    ]
+    history = state.stays_for({stay[0] for stay in new_stays})
+    days_by_key = find_readmissions([stay[:4] for stay in history] + new_stays)
+    
+    updates, changed, flag_changes = [], [], []
+    for patient_id, admit, discharge, encounter_key, days in history:
+        current = days_by_key.get(encounter_key)
+        if current != days:
+            changed.append((patient_id, admit, discharge, encounter_key, current))
+            flag_changes.append((encounter_key, days, current))
+            updates.append(update_statement(
+                "fact_encounters", "encounter_key", encounter_key,
+                ("is_readmission", "days_since_last_visit"), (current is not None, current),
+            ))
+    changed += [stay + (days_by_key.get(stay[3]),) for stay in new_stays]
+    state.save_stays(changed)
+    new_days = {key - first_key: days for key, days in days_by_key.items() if key >= first_key}
+    return new_days, updates, flag_changes
+
+
+def billing_catch_up(state, late_claims, specialty_names, aggregates):
+    """Apply late claims of earlier encounters as deltas.
+
+    ``late_claims`` maps encounter_id -> [claim, allowed, count] of the
+    claims that arrived after the encounter was loaded (billing rows past
+    the billing_id watermark, so back-dated claims are included). Each loaded
+    encounter gets one incrementing UPDATE of its fact row (by
+    encounter_key), and the same delta is added to ``aggregates`` under the
+    fact's encounter year/month, specialty and encounter type, so the work
+    is proportional to the late claims, not to the fact or the rollups.
+    Returns (UPDATE statements, count of encounters that were never loaded).
+    """
+    groups = state.groups_by_id(late_claims)
+    updates, unloaded = [], 0
+    for encounter_id, (claim, allowed, count) in sorted(late_claims.items()):
+        group = groups.get(encounter_id)
+        if group is None:
+            unloaded += 1
+            continue
+        encounter_key, year, month, specialty_key, type_key = group
+        updates.append(update_statement(
+            "fact_encounters", "encounter_key", encounter_key,
+            ("total_claim_amount", "total_allowed_amount", "claim_count"),
+            (sql_amount(claim), sql_amount(allowed), count), increment=True,
+        ))
+        aggregates.add_claim_change(
+            year, month, specialty_key, specialty_names.get(specialty_key),
+            type_key, ENCOUNTER_TYPES[type_key - 1][1], count, claim, allowed,
+        )
+    return updates, unloaded
+
+
+def record_state(state, batch, encounters, claims, next_diagnosis_bridge_id, next_procedure_bridge_id):
+    """Advance the watermarks and next surrogate keys after a run."""
+    state.set("batch", batch)
+    state.set("last_encounter_id", encounters.last_id)
+    state.set_claim_watermark(claims)
+    state.set("next_encounter_key", encounters.first_key + len(encounters))
+    state.set("next_diagnosis_bridge_id", next_diagnosis_bridge_id)
+    state.set("next_procedure_bridge_id", next_procedure_bridge_id)
+
+
+def refresh_from_oltp(source, state, as_of):
+    """Write the delta batch for the OLTP rows added or changed since the last run.
+
+    ``as_of`` ('YYYY-MM-DD') is the effective date of new dim_patient
+    versions and the expiration date of the versions they replace.
+    """
+    batch = state.get("batch") + 1
+    last_encounter_id = state.get("last_encounter_id")
+    processed = state.claim_watermark()
+    print(f"Reading OLTP source: {source}")
+    if processed.legacy:
+        print(f"Batch {batch}: encounters after id {last_encounter_id:,}, claims from {processed.claim_date}")
+        print(f"  Warning: {state.path} predates billing_id watermarks; claims dated before "
+              f"{processed.claim_date} that were already in billing may be missed")
+    else:
+        print(f"Batch {batch}: encounters after id {last_encounter_id:,}, claims after id {processed.billing_id:,}")
+    
+    print("\nRefreshing dimension tables...")
+    specialties, departments, diagnoses, procedures = {}, {}, {}, {}
+    patient_keys, providers = KeyMap(), DimensionCache(PROVIDER_ATTRIBUTES)
+    for filename, table_name, etl_rows, lookups in (
+        ("dim_specialty.sql", "dim_specialty", etl_dim_specialty_rows, (specialties,)),
+        ("dim_department.sql", "dim_department", etl_dim_department_rows, (departments,)),
+        ("dim_diagnosis.sql", "dim_diagnosis", etl_dim_diagnosis_rows, (diagnoses,)),
+        ("dim_procedure.sql", "dim_procedure", etl_dim_procedure_rows, (procedures,)),
+        ("dim_provider.sql", "dim_provider", etl_dim_provider_rows, (specialties, departments, providers)),
+    ):
+        known = state.dimension_keys(table_name)
+        keys = SurrogateKeys({natural_id: key for natural_id, (key, _) in known.items()})
+        entries, updates = [], []
+        new_rows = list(dimension_delta(table_name, etl_rows(source, *lookups, keys=keys), known, entries, updates))
+        if new_rows:
+            write_sql_file(filename, table_name, new_rows, len(new_rows))
+        if updates:
+            write_update_file(f"{table_name}_updates.sql", table_name, updates)
+        if not entries:
+            print(f"  [OK] {table_name}: unchanged")
+        state.save_dimension_keys(table_name, entries)
+    
+    versions = Scd2Processor(VersionMap(state.iter_dimension_keys("dim_patient")), as_of)
+    new_versions = list(etl_dim_patient_rows(source, patient_keys, versions))
+    if new_versions:
+        write_sql_file("dim_patient.sql", "dim_patient", new_versions, len(new_versions))
+    if versions.expired:
+        write_update_file("dim_patient_updates.sql", "dim_patient", [
+            update_statement("dim_patient", "patient_key", key, ("expiration_date", "is_current"), (as_of, False))
+            for key in versions.expired
+        ])
+    if not new_versions:
+        print("  [OK] dim_patient: unchanged")
+    state.save_dimension_keys("dim_patient", versions.versions.changed_entries())
+    
+    print("\nScanning new encounters and billing...")
+    since = {"encounter_id": last_encounter_id + 1}
+    with REPORT.stage("scan encounters") as stage:
+        encounters = scan_encounters(
+            source, patient_keys, providers, departments, state.get("next_encounter_key"), since
+        )
+        stage.count(len(encounters))
+    encounters.last_id = max(encounters.last_id, last_encounter_id)
+    print(f"  [OK] encounters: {len(encounters):,} new rows ({encounters.skipped:,} unresolved, skipped)")
+    late_claims = {}
+    with REPORT.stage("scan billing"):
+        claims = aggregate_billing(
+            source, encounters, processed.since(since), processed, late_claims
+        )
+    print(f"  [OK] billing: late claims for {len(late_claims):,} earlier encounters")
+    
+    print("\nTransforming bridge tables...")
+    encounter_month = encounter_months(encounters)
+    next_diagnosis_bridge_id = state.get("next_diagnosis_bridge_id")
+    next_diagnosis_bridge_id += write_sql_file(
+        "bridge_diagnoses.sql", "bridge_encounter_diagnoses",
+        etl_bridge_diagnosis_rows(source, encounters, diagnoses, next_diagnosis_bridge_id, since),
+        encounter_month=encounter_month,
+    )
+    next_procedure_bridge_id = state.get("next_procedure_bridge_id")
+    next_procedure_bridge_id += write_sql_file(
+        "bridge_procedures.sql", "bridge_encounter_procedures",
+        etl_bridge_procedure_rows(source, encounters, procedures, next_procedure_bridge_id, since),
+        encounter_month=encounter_month,
+    )
+    
+    print("\nTransforming fact table (with denormalized attributes)...")
+    with REPORT.stage("readmissions") as stage:
+        readmissions, readmission_updates, flag_changes = refresh_readmissions(state, encounters)
+        stage.count(len(encounters))
+    aggregates = FactAggregates(TABLE_COLUMNS["fact_encounters"])
+    write_sql_file(
+        "fact_encounters.sql", "fact_encounters",
+        aggregates.observe(etl_fact_rows(encounters, providers, departments, diagnoses, readmissions)),
+        len(encounters),
+    )
+    specialty_names = {key: name for key, name, _ in specialties.values()}
+    with REPORT.stage("billing catch-up") as stage:
+        fact_updates, unloaded = billing_catch_up(state, late_claims, specialty_names, aggregates)
+        stage.count(len(late_claims))
+    print(f"  [OK] billing catch-up: {len(late_claims) - unloaded:,} earlier facts "
+          f"({unloaded:,} never loaded, skipped)")
+    fact_updates += readmission_updates
+    if fact_updates:
+        write_update_file("fact_encounters_updates.sql", "fact_encounters", fact_updates)
+    
+    print("\nWriting summary aggregate deltas...")
+    groups = state.groups_for(encounter_key for encounter_key, _, _ in flag_changes)
+    for encounter_key, old_days, new_days in flag_changes:
+        year, month, specialty_key, _ = groups[encounter_key]
+        aggregates.add_readmission_change(
+            year, month, specialty_key, specialty_names.get(specialty_key), old_days, new_days
+        )
+    write_aggregate_files(aggregates)
+    state.save_groups(encounter_groups(encounters, providers))
+    
+    record_state(state, batch, encounters, claims, next_diagnosis_bridge_id, next_procedure_bridge_id)
+
+
+# =============================================================================
+# SHARDED GENERATION (--shards N, random source)
+# =============================================================================
+# dim_patient and the encounters are split into the same number of ID-range
+# shards. Encounter shard k only references patients from patient shard k, so
+# readmission detection stays shard-local; every (table, shard) draws from its
+# own derived seed. Workers write part files that are merged (or kept, with a
+# manifest) in shard order.
+
+PARTS_DIRNAME = "parts"
+
+TABLE_FILENAMES = {
+    "dim_patient": "dim_patient.sql",
+    "fact_encounters": "fact_encounters.sql",
+    "bridge_encounter_diagnoses": "bridge_diagnoses.sql",
+    "bridge_encounter_procedures": "bridge_procedures.sql",
+}
+
+
+def draw_bridge_counts(seed, shard, num_encounters, backend="python"):
+    """Per-encounter bridge diagnosis and procedure counts of one encounter shard."""
+    if backend == "numpy":
+        diag_counts = vectorized.weighted_values(
+            vectorized.numpy_rng(seed, "bridge_encounter_diagnoses.counts", shard),
+            *DIAGNOSES_PER_ENCOUNTER, num_encounters,
+        )
+        proc_counts = vectorized.weighted_values(
+            vectorized.numpy_rng(seed, "bridge_encounter_procedures.counts", shard),
+            *PROCEDURES_PER_ENCOUNTER, num_encounters,
+        )
+        return diag_counts, proc_counts
+    diag_counts = shard_random(seed, "bridge_encounter_diagnoses.counts", shard).choices(
+        DIAGNOSES_PER_ENCOUNTER[0], weights=DIAGNOSES_PER_ENCOUNTER[1], k=num_encounters
+    )
+    proc_counts = shard_random(seed, "bridge_encounter_procedures.counts", shard).choices(
+        PROCEDURES_PER_ENCOUNTER[0], weights=PROCEDURES_PER_ENCOUNTER[1], k=num_encounters
+    )
+    return diag_counts, proc_counts
+
+
+def _count_bridges_task(args):
+    seed, shard, num_encounters, backend = args
+    diag_counts, proc_counts = draw_bridge_counts(seed, shard, num_encounters, backend)
+    return int(sum(diag_counts)), int(sum(proc_counts))
+
+
+def _shard_part_path(settings, shard, table_name, month=None):
+    output_dir, fmt, _, _, compression, _, _, _ = settings
+    filename = TABLE_FILENAMES[table_name]
+    if month is not None:
+        filename = partition_filename(filename, month)
+    return part_path(output_dir / PARTS_DIRNAME, filename, shard, fmt, compression)
+
+
+def _open_shard_part(settings, shard, table_name, encounter_month=None):
+    """Writer of one shard's part of a table, or with --partition-by of its
+    part of every month (see partition_router)."""
+    _, fmt, batch_size, complete, compression, level, partition_by, _ = settings
+    
+    def open_writer(month=None):
+        return open_part(
+            _shard_part_path(settings, shard, table_name, month), table_name.upper(), table_name,
+            TABLE_COLUMNS[table_name], fmt, batch_size, complete, compression, level,
+        )
+    
+    if partition_by == "none" or table_name not in PARTITIONED_TABLES:
+        return open_writer()
+    return partition_router(table_name, open_writer, encounter_month)
+
+
+def _shard_parts(settings, shard, table_name, writer):
+    """[(part path, rows, month or None)] written by an _open_shard_part writer."""
+    if type(writer) is PartitionedWriter:
+        return [
+            (_shard_part_path(settings, shard, table_name, month), rows, month)
+            for month, rows in writer.partitions.items()
+        ]
+    return [(_shard_part_path(settings, shard, table_name), writer.written, None)]
+
+
+def _write_shard_part(settings, shard, table_name, rows, report):
+    with report.stage(table_name) as stage:
+        with _open_shard_part(settings, shard, table_name) as writer:
+            writer.write(rows)
+        parts = _shard_parts(settings, shard, table_name, writer)
+        stage.count(writer.written, file_bytes(*(path for path, _, _ in parts)))
+    return parts
+
+
+def _patient_shard_task(args):
+    seed, shard, patient_ids, backend, settings = args
+    if backend == "numpy":
+        rows = generate_dim_patient_rows_np(patient_ids, vectorized.numpy_rng(seed, "dim_patient", shard))
+    else:
+        rows = generate_dim_patient_rows(patient_ids, shard_random(seed, "dim_patient", shard))
+    report = RunReport()
+    return {"dim_patient": _write_shard_part(settings, shard, "dim_patient", rows, report), "stages": report.stages}
+
+
+def _encounter_shard_task(args):
+    seed, shard, encounter_ids, patient_ids, providers, diag_first_id, proc_first_id, skew, backend, settings = args
+    counts = draw_bridge_counts(seed, shard, len(encounter_ids), backend)
+    diagnoses = all_diagnoses()
+    num_procedures = len(all_procedures())
+    if backend == "numpy":
+        make_rng, fact_rows = vectorized.numpy_rng, generate_fact_rows_np
+    else:
+        make_rng, fact_rows = shard_random, generate_fact_rows
+    
+    output_dir, partition_by, bitmap_index = settings[0], settings[6], settings[7]
+    report = RunReport()
+    months = array("i") if partition_by != "none" else None
+    with report.stage("readmissions") as stage:
+        readmissions = fact_readmissions(fact_rows(
+            encounter_ids, patient_ids, providers, diagnoses, num_procedures,
+            make_rng(seed, "fact_encounters", shard), skew=skew, counts=counts,
+        ), months)
+        stage.count(len(encounter_ids))
+    
+    # One pass writes the fact part and both bridge parts
+    parts = {}
+    aggregates = FactAggregates(TABLE_COLUMNS["fact_encounters"])
+    bitmaps = BitmapIndex(TABLE_COLUMNS["fact_encounters"]) if bitmap_index else None
+    encounter_month = None if months is None else (lambda key: months[key - encounter_ids.start])
+    with report.stage("fact_encounters + bridges") as stage:
+        bridges = [
+            _open_shard_part(settings, shard, table_name, encounter_month) for _, table_name in BRIDGE_TABLES
+        ]
+        try:
+            parts["fact_encounters"] = _write_shard_part(
+                settings, shard, "fact_encounters",
+                indexed(aggregates.observe(fact_rows(
+                    encounter_ids, patient_ids, providers, diagnoses, num_procedures,
+                    make_rng(seed, "fact_encounters", shard), readmissions, skew, bridges, counts,
+                    (diag_first_id, proc_first_id),
+                )), bitmaps),
+                report,
+            )
+        finally:
+            for writer in bridges:
+                writer.close()
+        for (_, table_name), writer in zip(BRIDGE_TABLES, bridges):
+            parts[table_name] = _shard_parts(settings, shard, table_name, writer)
+        stage.count(
+            sum(writer.written for writer in bridges),
+            file_bytes(*(path for _, table_name in BRIDGE_TABLES for path, _, _ in parts[table_name])),
+        )
+    parts["aggregates"] = aggregates
+    if bitmaps is not None:
+        parts["bitmaps"] = bitmaps.save(output_dir / PARTS_DIRNAME / f"fact_encounters.part-{shard:05d}.bitmaps")
+    parts["stages"] = report.stages
+    return parts
+
+
+def _assemble_shards(table_name, results, first_ids, keep_parts):
+    """Merge (or keep) one table's parts, register them and record them in MANIFEST.
+
+    Partitioned parts are merged per month, across shards in shard order.
+    """
+    columns = TABLE_COLUMNS[table_name]
+    filename = output_filename(TABLE_FILENAMES[table_name], OUTPUT_FORMAT, COMPRESSION)
+    months = {}
+    for result in results:
+        for path, rows, month in result[table_name]:
+            months.setdefault(month, []).append((path, rows))
+    MANIFEST[table_name] = []
+    if None in months:
+        files = assemble_table(
+            OLAP_DIR, filename, table_name.upper(), table_name, columns, OUTPUT_FORMAT, months[None], keep_parts,
+            COMPRESSION, COMPRESSION_LEVEL,
+        )
+        for (name, rows), first_id in zip(files, first_ids if keep_parts else first_ids[:1]):
+            MANIFEST[table_name].append({"file": name, "rows": rows, "first_id": first_id,
+                                         "last_id": first_id + rows - 1})
+    elif months and not keep_parts:
+        (OLAP_DIR / PARTITIONS_DIRNAME).mkdir(exist_ok=True)
+    for month in sorted(month for month in months if month is not None):
+        for name, rows in assemble_table(
+            OLAP_DIR, f"{PARTITIONS_DIRNAME}/{partition_filename(filename, month)}",
+            f"{table_name.upper()} {partition_name(month)}", table_name, columns, OUTPUT_FORMAT, months[month],
+            keep_parts, COMPRESSION, COMPRESSION_LEVEL,
+        ):
+            MANIFEST[table_name].append({"file": name, "rows": rows, "partition": partition_name(month)})
+    files = [(entry["file"], entry["rows"]) for entry in MANIFEST[table_name]]
+    REPORT.count(sum(rows for _, rows in files), file_bytes(*(OLAP_DIR / name for name, _ in files)))
+    for name, _ in files:
+        LOADED_TABLES.append((table_name, name, columns))
+    total = sum(rows for _, rows in files)
+    shards = f" ({len(results)} shards)" if len(results) > 1 else ""
+    partitions = f" in {len(months)} partitions" if None not in months else ""
+    print(f"  [OK] {filename}: {total:,} rows{shards}{partitions}")
+    return total
+
+
+def _run_shards(name, task, args, offsets, workers):
+    """run_parallel over the shard tasks of ``name``, skipping the shards
+    CHECKPOINT holds finished.
+
+    Each finished shard is checkpointed with its part files, ``offsets`` (its
+    first ids), partial aggregates and bitmap index part; a skipped shard's
+    result is rebuilt from that entry (without worker stages).
+    """
+    if CHECKPOINT is None:
+        return run_parallel(task, args, workers)
+    results, pending = [None] * len(args), []
+    for shard in range(len(args)):
+        entry = CHECKPOINT.chunk(name, shard)
+        if entry is None or entry["offsets"] != offsets[shard]:
+            pending.append(shard)
+            continue
+        results[shard] = {
+            table_name: [(OLAP_DIR / path, rows, month) for path, rows, month in files]
+            for table_name, files in entry["parts"].items()
+        }
+        results[shard]["stages"] = []
+        if "bitmaps" in entry:
+            results[shard]["bitmaps"] = OLAP_DIR / entry["bitmaps"]
+        if "aggregates" in entry:
+            results[shard]["aggregates"] = FactAggregates(TABLE_COLUMNS["fact_encounters"]).load(entry["aggregates"])
+    if len(pending) < len(args):
+        print(f"  [--] {name}: {len(args) - len(pending)} of {len(args)} shards finished by an earlier run "
+              f"(checkpoint)")
+    
+    def finished(position, result):
+        shard = pending[position]
+        results[shard] = result
+        parts = {table_name: part for table_name, part in result.items() if table_name in TABLE_FILENAMES}
+        values = {
+            "offsets": offsets[shard],
+            "parts": {
+                table_name: [(path.relative_to(OLAP_DIR).as_posix(), rows, month) for path, rows, month in files]
+                for table_name, files in parts.items()
+            },
+        }
+        paths = [path.relative_to(OLAP_DIR) for files in parts.values() for path, _, _ in files]
+        if "aggregates" in result:
+            values["aggregates"] = result["aggregates"].dump()
+        if "bitmaps" in result:
+            values["bitmaps"] = result["bitmaps"].relative_to(OLAP_DIR).as_posix()
+            paths.append(result["bitmaps"].relative_to(OLAP_DIR))
+        CHECKPOINT.complete_chunk(name, shard, paths, **values)
+    
+    run_parallel(task, [args[shard] for shard in pending], workers, finished)
+    return results
+
+
+def build_random_sharded(seed, num_shards, workers, keep_parts, backend="python", skew=UNIFORM):
+    """Generate dim_patient, the fact and the bridges in parallel shards.
+
+    The numpy backend always runs through here (a single shard runs in-process).
+    With a CHECKPOINT every shard is a resumable chunk of its table.
+    """
+    patient_ranges = shard_ranges(NUM_PATIENTS, num_shards)
+    encounter_ranges = shard_ranges(NUM_ENCOUNTERS, num_shards)
+    if len(patient_ranges) != len(encounter_ranges):
+        raise ValueError("--shards must not exceed the number of patients or encounters")
+    (OLAP_DIR / PARTS_DIRNAME).mkdir(parents=True, exist_ok=True)
+    settings = (
+        OLAP_DIR, OUTPUT_FORMAT, BATCH_SIZE, keep_parts, COMPRESSION, COMPRESSION_LEVEL, PARTITION_BY, BITMAP_INDEX,
+    )
+    
+    def patients():
+        with REPORT.stage(f"dim_patient ({len(patient_ranges)} shards)"):
+            results = _run_shards(
+                "dim_patient", _patient_shard_task,
+                [(seed, shard, ids, backend, settings) for shard, ids in enumerate(patient_ranges)],
+                [{"dim_patient": ids.start} for ids in patient_ranges], workers,
+            )
+            _assemble_shards("dim_patient", results, [r.start for r in patient_ranges], keep_parts)
+        for shard, result in enumerate(results):
+            REPORT.add_shard_stages(shard, result["stages"])
+    
+    print(f"\nGenerating patient dimension ({len(patient_ranges)} shards, seed {seed}, {backend} backend)...")
+    run_stage("dim_patient", patients)
+    
+    def dim_provider():
+        providers = []
+        write_sql_file(
+            "dim_provider.sql", "dim_provider",
+            generate_dim_provider_rows(NUM_PROVIDERS, providers, shard_random(seed, "dim_provider", 0)),
+            NUM_PROVIDERS,
+        )
+        return providers
+    
+    print("Generating provider dimension...")
+    providers = [tuple(provider) for provider in run_stage("dim_provider", dim_provider)]
+    
+    def encounters():
+        # Pre-count bridge rows per shard so each shard knows its first bridge id
+        bridge_totals = run_parallel(
+            _count_bridges_task,
+            [(seed, shard, len(ids), backend) for shard, ids in enumerate(encounter_ranges)],
+            workers,
+        )
+        diag_first_ids, proc_first_ids = [1], [1]
+        for diag_total, proc_total in bridge_totals[:-1]:
+            diag_first_ids.append(diag_first_ids[-1] + diag_total)
+            proc_first_ids.append(proc_first_ids[-1] + proc_total)
+        
+        with REPORT.stage(f"fact_encounters + bridges ({len(encounter_ranges)} shards)"):
+            results = _run_shards(
+                "fact_encounters", _encounter_shard_task,
+                [
+                    (seed, shard, encounter_ids, patient_ids, providers, diag_first_ids[shard],
+                     proc_first_ids[shard], skew, backend, settings)
+                    for shard, (encounter_ids, patient_ids) in enumerate(zip(encounter_ranges, patient_ranges))
+                ],
+                [
+                    {"fact_encounters": ids.start, "bridge_encounter_diagnoses": diag_first_id,
+                     "bridge_encounter_procedures": proc_first_id}
+                    for ids, diag_first_id, proc_first_id in zip(encounter_ranges, diag_first_ids, proc_first_ids)
+                ],
+                workers,
+            )
+            _assemble_shards("fact_encounters", results, [r.start for r in encounter_ranges], keep_parts)
+            _assemble_shards("bridge_encounter_diagnoses", results, diag_first_ids, keep_parts)
+            _assemble_shards("bridge_encounter_procedures", results, proc_first_ids, keep_parts)
+        for shard, result in enumerate(results):
+            REPORT.add_shard_stages(shard, result["stages"])
+        
+        print("\nWriting summary aggregates...")
+        aggregates = FactAggregates(TABLE_COLUMNS["fact_encounters"])
+        for result in results:
+            aggregates.merge(result["aggregates"])
+        write_aggregate_files(aggregates)
+        
+        # Shards index disjoint encounter_key ranges, so their bitmaps OR together
+        bitmaps = fact_bitmap_index()
+        if bitmaps is not None:
+            for result in results:
+                bitmaps.merge(BitmapIndex.load(result["bitmaps"]))
+            write_bitmap_index(bitmaps)
+            for result in results:
+                result["bitmaps"].unlink()
+    
+    print("\nGenerating fact and bridge tables...")
+    run_stage("fact_encounters", encounters)
+    
+    if not keep_parts:
+        (OLAP_DIR / PARTS_DIRNAME).rmdir()
+    write_manifest(OLAP_DIR, seed, len(encounter_ranges), OUTPUT_FORMAT, MANIFEST, backend, PARTITION_BY)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate OLAP star schema data.")
+    parser.add_argument("--format", choices=FORMATS, default=OUTPUT_FORMAT,
+                        help="output format (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows per statement for multi-insert output (default: %(default)s)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="random source: scale factor for patients, providers and encounters (bridges follow); "
+                             "reference tables do not scale (default: %(default)s)")
+    parser.add_argument("--patient-skew", type=float, default=0.0,
+                        help="random source: Zipf exponent of encounters per patient, e.g. 1.0 for frequent flyers "
+                             "(default: 0, uniform)")
+    parser.add_argument("--provider-skew", type=float, default=0.0,
+                        help="random source: Zipf exponent of encounters per provider (default: 0, uniform)")
+    parser.add_argument("--seasonality", type=float, default=0.0,
+                        help="random source: amplitude (0-1) of the yearly encounter-date cycle peaking in January "
+                             "(default: 0, flat)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=COMPRESSION,
+                        help="stream data files through gzip or zstd (default: %(default)s)")
+    parser.add_argument("--compression-level", type=int, default=COMPRESSION_LEVEL,
+                        help="gzip (1-9) or zstd (1-22) compression level (default: 6 for gzip, 3 for zstd)")
+    parser.add_argument("--output-dir", type=Path, default=OLAP_DIR,
+                        help="directory to write data files to (default: data/olap)")
+    parser.add_argument("--source", choices=("random", "oltp"), default="random",
+                        help="generate random data, or transform the OLTP data (default: %(default)s)")
+    parser.add_argument("--oltp-path", type=Path, default=OLTP_DIR,
+                        help="OLTP data directory or SQLite database for --source oltp (default: data/oltp)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="with --source oltp: full build on the first run, then write only the changes "
+                             "since the last run to increments/NNNNN/ (state kept in --state-file)")
+    parser.add_argument("--state-file", type=Path, default=None,
+                        help=f"incremental ETL state database (default: <output-dir>/{STATE_FILENAME})")
+    parser.add_argument("--as-of", default=None,
+                        help="effective date (YYYY-MM-DD) of dim_patient versions created by an incremental run "
+                             "(default: today, or the date of SOURCE_DATE_EPOCH)")
+    parser.add_argument("--seed", type=int, default=SEED,
+                        help="random seed (default: %(default)s)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split patients/encounters into N ID-range shards generated in parallel "
+                             "(random source only; default: 1, a single serial stream)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --shards, or threads running the --source oltp task graph "
+                             "(default: CPU count)")
+    parser.add_argument("--keep-parts", action="store_true",
+                        help="keep per-shard part files (listed in manifest.json) instead of merging them")
+    parser.add_argument("--partition-by", choices=PARTITIONINGS, default=PARTITION_BY,
+                        help="month: write the fact and bridges as one file per encounter month under partitions/ "
+                             "(listed in manifest.json) plus the matching PARTITION BY RANGE DDL "
+                             "(default: %(default)s)")
+    parser.add_argument("--bitmap-index", action="store_true",
+                        help=f"index the fact's low-cardinality columns as compressed bitmaps in {BITMAPS_FILENAME} "
+                             "(query with scripts/bitmap_index.py)")
+    parser.add_argument("--resume", action="store_true",
+                        help="random source: keep a checkpoint (checkpoint.json in the output directory) of the "
+                             "finished tables and shards; rerunning the same command after an interruption "
+                             "skips them")
+    parser.add_argument("--backend", choices=("python", "numpy"), default="python",
+                        help="row generation backend for dim_patient, the fact and the bridges (random source); "
+                             "numpy draws whole columns at once (default: %(default)s)")
+    parser.add_argument("--report", type=Path, default=None,
+                        help="write a JSON run report (wall/CPU time, rows/s, bytes and peak RSS per stage)")
+    parser.add_argument("--progress", action="store_true",
+                        help="show a live progress line (rows, rows/s) on stderr while each stage runs")
+    parser.add_argument("--calendar-start", type=date.fromisoformat, default=DIM_DATE_START.date(),
+                        help="first day (YYYY-MM-DD) of dim_date (default: %(default)s)")
+    parser.add_argument("--calendar-end", type=date.fromisoformat, default=DIM_DATE_END.date(),
+                        help="last day (YYYY-MM-DD) of dim_date (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.calendar_end < args.calendar_start:
+        parser.error("--calendar-end is before --calendar-start")
+    if args.source == "random" and (
+        args.calendar_start > ENCOUNTER_START.date() or args.calendar_end < LAST_ENCOUNTER_DAY.date()
+    ):
+        parser.error(f"the random source needs a calendar covering {ENCOUNTER_START.date()} .. "
+                     f"{LAST_ENCOUNTER_DAY.date()} (encounter, discharge and procedure dates)")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.patient_skew < 0 or args.provider_skew < 0:
+        parser.error("--patient-skew and --provider-skew must not be negative")
+    if not 0 <= args.seasonality < 1:
+        parser.error("--seasonality must be at least 0 and below 1")
+    error = check_compression(args.compression, args.compression_level)
+    if error:
+        parser.error(error)
+    if args.backend == "numpy" and vectorized is None:
+        parser.error("--backend numpy requires NumPy (pip install numpy)")
+    if args.incremental and args.source != "oltp":
+        parser.error("--incremental requires --source oltp")
+    if args.incremental and args.bitmap_index:
+        parser.error("--bitmap-index indexes a whole fact table; an --incremental batch also updates earlier facts")
+    if args.resume and args.source != "random":
+        parser.error("--resume requires the random source (an interrupted --source oltp run rebuilds its "
+                     "in-memory maps anyway; --incremental runs resume from their state file)")
+    return args
+
+
+def build_random(seed=SEED, num_shards=1, workers=None, keep_parts=False, backend="python", skew=UNIFORM):
+    """Generate a random star schema dataset (the original generator).
+
+    With a CHECKPOINT every table is a resumable stage; the serial fact and its
+    bridges are one stream, so an interrupted fact stage starts over (sharded
+    builds resume per shard).
+    """
+    diagnoses = all_diagnoses()
+    procedures = all_procedures()
     
     # -------------------------------------------------------------------------
-    # 10. BRIDGE_ENCOUNTER_DIAGNOSES
+    # 1-6. Static dimensions
     # -------------------------------------------------------------------------
-    print("\nGenerating bridge tables...")
-    bridge_diag_rows = []
-    bridge_id = 1
-    
-    for enc in encounters:
-        # 1-5 diagnoses per encounter
-        num_diags = random.choices([1, 2, 3, 4, 5], weights=[15, 40, 30, 10, 5])[0]
-        used_diags = set()
-        
-        for seq in range(1, num_diags + 1):
-            diag_key = random.randint(1, num_diagnoses)
-            while diag_key in used_diags:
-                diag_key = random.randint(1, num_diagnoses)
-            used_diags.add(diag_key)
-            
-            bridge_diag_rows.append(
-                f"INSERT INTO bridge_encounter_diagnoses VALUES ({bridge_id}, {enc['key']}, {diag_key}, {seq});"
-            )
-            bridge_id += 1
+    print("Generating dimension tables...")
+    for filename, table_name, rows, total_rows in (
+        ("dim_date.sql", "dim_date", CALENDAR.dim_date_rows(), len(CALENDAR)),
+        ("dim_specialty.sql", "dim_specialty", generate_dim_specialty_rows(), len(SPECIALTIES)),
+        ("dim_department.sql", "dim_department", generate_dim_department_rows(), len(DEPARTMENTS)),
+        ("dim_encounter_type.sql", "dim_encounter_type", generate_dim_encounter_type_rows(), len(ENCOUNTER_TYPES)),
+        ("dim_diagnosis.sql", "dim_diagnosis", generate_dim_diagnosis_rows(diagnoses), len(diagnoses)),
+        ("dim_procedure.sql", "dim_procedure", generate_dim_procedure_rows(procedures), len(procedures)),
+    ):
+        run_stage(table_name, lambda: write_sql_file(filename, table_name, rows, total_rows))
+    
+    if num_shards > 1 or backend == "numpy":
+        build_random_sharded(seed, max(num_shards, 1), workers, keep_parts, backend, skew)
+        return
+    
+    # -------------------------------------------------------------------------
+    # 7. DIM_PATIENT (streamed; surrogate key == patient_id, nothing retained)
+    # -------------------------------------------------------------------------
+    print("\nGenerating patient dimension...")
+    run_stage("dim_patient", lambda: write_sql_file(
+        "dim_patient.sql", "dim_patient", generate_dim_patient_rows(range(1, NUM_PATIENTS + 1)), NUM_PATIENTS
+    ))
     
-    write_sql_file("bridge_diagnoses.sql", "bridge_encounter_diagnoses", bridge_diag_rows, bridge_id - 1)
+    # -------------------------------------------------------------------------
+    # 8. DIM_PROVIDER (denormalized specialty/department kept for the fact)
+    # -------------------------------------------------------------------------
+    def dim_provider():
+        providers = []
+        write_sql_file(
+            "dim_provider.sql", "dim_provider", generate_dim_provider_rows(NUM_PROVIDERS, providers), NUM_PROVIDERS
+        )
+        return providers
+    
+    print("Generating provider dimension...")
+    providers = [tuple(provider) for provider in run_stage("dim_provider", dim_provider)]
     
     # -------------------------------------------------------------------------
-    # 11. BRIDGE_ENCOUNTER_PROCEDURES
+    # 9-11. FACT_ENCOUNTERS + BRIDGE TABLES (one pass; the fact stream writes the bridges)
+    # 12-13. SUMMARY AGGREGATES (accumulated while the fact was written)
     # -------------------------------------------------------------------------
-    bridge_proc_rows = []
-    bridge_id = 1
-    
-    for enc in encounters:
-        # 0-4 procedures per encounter
-        num_procs = random.choices([0, 1, 2, 3, 4], weights=[20, 40, 25, 10, 5])[0]
-        used_procs = set()
-        
-        for _ in range(num_procs):
-            proc_key = random.randint(1, num_procedures)
-            while proc_key in used_procs:
-                proc_key = random.randint(1, num_procedures)
-            used_procs.add(proc_key)
-            
-            proc_date = enc["date"] + timedelta(days=random.randint(0, 3))
-            
-            bridge_proc_rows.append(
-                f"INSERT INTO bridge_encounter_procedures VALUES ({bridge_id}, {enc['key']}, {proc_key}, '{proc_date.strftime('%Y-%m-%d')}');"
+    def encounters():
+        encounter_ids, patient_ids = range(1, NUM_ENCOUNTERS + 1), range(1, NUM_PATIENTS + 1)
+        state = random.getstate()
+        months = array("i") if PARTITION_BY != "none" else None
+        with REPORT.stage("readmissions") as stage:
+            readmissions = fact_readmissions(
+                generate_fact_rows(encounter_ids, patient_ids, providers, diagnoses, len(procedures), skew=skew),
+                months,
+            )
+            stage.count(NUM_ENCOUNTERS)
+        random.setstate(state)
+        aggregates, bitmaps = FactAggregates(TABLE_COLUMNS["fact_encounters"]), fact_bitmap_index()
+        encounter_month = None if months is None else (lambda encounter_key: months[encounter_key - 1])
+        with REPORT.stage("fact_encounters + bridges"), bridge_writers(encounter_month) as bridges:
+            written = write_sql_file(
+                "fact_encounters.sql", "fact_encounters",
+                indexed(aggregates.observe(generate_fact_rows(
+                    encounter_ids, patient_ids, providers, diagnoses, len(procedures), readmissions=readmissions,
+                    skew=skew, bridges=bridges,
+                )), bitmaps),
+                NUM_ENCOUNTERS,
             )
-            bridge_id += 1
+            REPORT.count(written, file_bytes(*table_paths("fact_encounters")))
+        
+        print("\nWriting summary aggregates...")
+        write_aggregate_files(aggregates)
+        write_bitmap_index(bitmaps)
     
-    write_sql_file("bridge_procedures.sql", "bridge_encounter_procedures", bridge_proc_rows, bridge_id - 1)
+    print("\nGenerating fact and bridge tables (with denormalized attributes)...")
+    run_stage("fact_encounters", encounters)
+
+
+def main(argv=None):
+    global OLAP_DIR, OUTPUT_FORMAT, BATCH_SIZE, COMPRESSION, COMPRESSION_LEVEL, CALENDAR, CHECKPOINT
+    global NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS, PARTITION_BY, BITMAP_INDEX
+    args = parse_args(argv)
+    OLAP_DIR, OUTPUT_FORMAT, BATCH_SIZE = args.output_dir, args.format, args.batch_size
+    COMPRESSION, COMPRESSION_LEVEL = args.compression, args.compression_level
+    PARTITION_BY, BITMAP_INDEX = args.partition_by, args.bitmap_index
+    CALENDAR = Calendar(args.calendar_start, args.calendar_end)
+    if args.seed != SEED:
+        random.seed(args.seed)
+    if args.scale != 1:
+        NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS = (
+            scaled(count, args.scale) for count in (NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS)
+        )
+    skew = Skew(args.patient_skew, args.provider_skew, args.seasonality)
+    REPORT.progress = args.progress
+    
+    print("\n" + "=" * 70)
+    print("OLAP Star Schema Data Generator")
+    print("=" * 70 + "\n")
+    
+    # Ensure output directory exists
+    OLAP_DIR.mkdir(parents=True, exist_ok=True)
+    
+    if args.incremental:
+        with EtlState(args.state_file or OLAP_DIR / STATE_FILENAME) as state:
+            if state.initialized:
+                OLAP_DIR = OLAP_DIR / INCREMENTS_DIRNAME / f"{state.get('batch') + 1:05d}"
+                OLAP_DIR.mkdir(parents=True, exist_ok=True)
+                refresh_from_oltp(args.oltp_path, state, args.as_of or generated_at()[:10])
+            else:
+                build_from_oltp(args.oltp_path, state, args.workers)
+    elif args.source == "oltp":
+        build_from_oltp(args.oltp_path, workers=args.workers)
+    else:
+        if args.resume:
+            try:
+                CHECKPOINT = Checkpoint(OLAP_DIR, {
+                    "seed": args.seed, "patients": NUM_PATIENTS, "providers": NUM_PROVIDERS,
+                    "encounters": NUM_ENCOUNTERS, "shards": args.shards, "backend": args.backend,
+                    "skew": [skew.patients, skew.providers, skew.seasonality], "format": OUTPUT_FORMAT,
+                    "batch_size": BATCH_SIZE, "compression": COMPRESSION, "compression_level": COMPRESSION_LEVEL,
+                    "keep_parts": args.keep_parts, "calendar": [str(args.calendar_start), str(args.calendar_end)],
+                    "partition_by": PARTITION_BY, "bitmap_index": BITMAP_INDEX,
+                })
+            except ValueError as error:
+                raise SystemExit(f"error: {error}")
+            if CHECKPOINT.resumed:
+                print(f"Resuming from {CHECKPOINT.path}\n")
+        print(f"Scale {args.scale:g} ({NUM_PATIENTS:,} patients, {NUM_PROVIDERS:,} providers, "
+              f"{NUM_ENCOUNTERS:,} encounters); key distribution: {skew}\n")
+        build_random(args.seed, args.shards, args.workers, args.keep_parts, args.backend, skew)
+    
+    if MANIFEST and not (args.source == "random" and (args.shards > 1 or args.backend == "numpy")):
+        # Sharded builds write their own manifest (with the shard count); the
+        # task graph registers tables as they finish, so list them in load order
+        write_manifest(
+            OLAP_DIR, args.seed if args.source == "random" else None, 1, OUTPUT_FORMAT,
+            {table_name: MANIFEST[table_name] for table_name in TABLE_COLUMNS if table_name in MANIFEST},
+            args.backend if args.source == "random" else None, PARTITION_BY,
+        )
     
     # -------------------------------------------------------------------------
     # SUMMARY
@@ -671,7 +2417,27 @@ def main():
     print("\n" + "=" * 70)
     print("OLAP DATA GENERATION COMPLETE")
     print("=" * 70)
+    load_order = list(TABLE_COLUMNS)
+    tables = sorted(LOADED_TABLES, key=lambda table: load_order.index(table[0]))
+    for path in write_loader_scripts(OLAP_DIR, tables, OUTPUT_FORMAT):
+        print(f"  Loader script: {path.name}")
+    if PARTITION_BY != "none":
+        # Covers the whole calendar, which the OLTP source widens to every encounter date
+        ddl = OLAP_DIR / "star_schema_partitioning.sql"
+        ddl.write_text(
+            partition_ddl(date_key_month(CALENDAR.date_keys[0]), date_key_month(CALENDAR.date_keys[-1])),
+            encoding="utf-8",
+        )
+        print(f"  Partitioning DDL: {ddl.name} (run after star_schema.sql)")
     print(f"\nFiles written to: {OLAP_DIR.absolute()}")
+    if args.report or args.progress:
+        print("\nStage timings (slowest first):")
+        for line in REPORT.summary_lines():
+            print(line)
+    if args.report:
+        print(f"\nRun report written to: {REPORT.write(args.report, argv)}")
+    if CHECKPOINT is not None:
+        CHECKPOINT.remove()
     print()
 
 
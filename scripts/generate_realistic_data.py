@@ -9,15 +9,71 @@ Data Volume Strategy:
 - Transactional Tables: Large volumes (10,000+)
 """
 
+import argparse
 import random
+from array import array
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from calendar_table import SECONDS_PER_DAY
+from compression import COMPRESSIONS, check_compression
+from distributions import UNIFORM, Skew, scaled
+from instrumentation import RunReport, file_bytes
+from output_formats import (
+    DEFAULT_BATCH_SIZE, FORMATS, ColumnBlock, output_filename, write_loader_scripts, write_table,
+)
+from sharding import (
+    assemble_table, part_path, run_parallel, shard_random, shard_ranges, write_manifest, write_part,
+)
+
+try:
+    import numpy as np
+    import vectorized
+except ImportError:  # NumPy is optional; only --backend numpy needs it
+    np = vectorized = None
+
 # Seed for reproducibility
-random.seed(42)
+SEED = 42
+random.seed(SEED)
 
-# Output directory
+# Output directory and format (overridable from the command line)
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "oltp"
+OUTPUT_FORMAT = "insert"
+BATCH_SIZE = DEFAULT_BATCH_SIZE
+COMPRESSION = "none"
+COMPRESSION_LEVEL = None
+
+# Data volume (multiplied by --scale)
+NUM_PATIENTS = 10000
+NUM_PROVIDERS = 500
+NUM_ENCOUNTERS = 10000
+
+# Encounter dates span these days (inclusive)
+ENCOUNTER_START = datetime(2020, 1, 1)
+ENCOUNTER_END = datetime(2025, 12, 31)
+
+# Column order of every generated row (matches oltp_schema/oltp_schema.sql)
+TABLE_COLUMNS = {
+    "specialties": ("specialty_id", "specialty_name", "specialty_code"),
+    "departments": ("department_id", "department_name", "floor", "capacity"),
+    "diagnoses": ("diagnosis_id", "icd10_code", "icd10_description"),
+    "procedures": ("procedure_id", "cpt_code", "cpt_description"),
+    "patients": ("patient_id", "first_name", "last_name", "date_of_birth", "gender", "mrn"),
+    "providers": ("provider_id", "first_name", "last_name", "credential", "specialty_id", "department_id"),
+    "encounters": (
+        "encounter_id", "patient_id", "provider_id", "encounter_type",
+        "encounter_date", "discharge_date", "department_id",
+    ),
+    "encounter_diagnoses": ("encounter_diagnosis_id", "encounter_id", "diagnosis_id", "diagnosis_sequence"),
+    "encounter_procedures": ("encounter_procedure_id", "encounter_id", "procedure_id", "procedure_date"),
+    "billing": ("billing_id", "encounter_id", "claim_amount", "allowed_amount", "claim_date", "claim_status"),
+}
+
+# (table_name, filename, columns) of every file written, in load order
+LOADED_TABLES = []
+
+# Per-stage timings of this run (--report / --progress; see instrumentation.py)
+REPORT = RunReport()
 
 # =============================================================================
 # STATIC REFERENCE DATA
@@ -113,6 +169,10 @@ LAST_NAMES = [
 # Provider credentials
 CREDENTIALS = ["MD", "DO", "MD", "MD", "DO", "MD", "PhD", "MD", "MD", "DO"]
 
+# Diagnoses (1-5) and procedures (0-4) per encounter: (counts, weights)
+DIAGNOSES_PER_ENCOUNTER = ([1, 2, 3, 4, 5], [15, 40, 30, 10, 5])
+PROCEDURES_PER_ENCOUNTER = ([0, 1, 2, 3, 4], [20, 40, 25, 10, 5])
+
 # Encounter types with realistic distribution weights
 ENCOUNTER_TYPES = [
     ("Outpatient", 60),
@@ -120,6 +180,13 @@ ENCOUNTER_TYPES = [
     ("Emergency", 15),
 ]
 
+# Claim amount range (low, high) per encounter type
+CLAIM_AMOUNT_RANGES = {
+    "Outpatient": (100, 2000),
+    "Emergency": (500, 10000),
+    "Inpatient": (5000, 100000),
+}
+
 # Claim statuses with realistic distribution
 CLAIM_STATUSES = [
     ("Paid", 70),
@@ -308,10 +375,10 @@ CPT_CATEGORIES = {
 }
 
 
-def weighted_choice(choices):
+def weighted_choice(choices, rng=random):
     """Select item based on weighted distribution."""
     total = sum(weight for _, weight in choices)
-    r = random.uniform(0, total)
+    r = rng.uniform(0, total)
     cumulative = 0
     for item, weight in choices:
         cumulative += weight
@@ -320,22 +387,13 @@ def weighted_choice(choices):
     return choices[-1][0]
 
 
-def generate_date(start_year=2020, end_year=2025):
-    """Generate a random date between start_year and end_year."""
-    start = datetime(start_year, 1, 1)
-    end = datetime(end_year, 12, 31)
-    delta = end - start
-    random_days = random.randint(0, delta.days)
-    return start + timedelta(days=random_days)
-
-
-def generate_dob(min_age=1, max_age=95):
+def generate_dob(min_age=1, max_age=95, rng=random):
     """Generate a date of birth for a patient with age between min_age and max_age."""
     today = datetime(2025, 1, 1)
     min_date = today - timedelta(days=max_age * 365)
     max_date = today - timedelta(days=min_age * 365)
     delta = max_date - min_date
-    random_days = random.randint(0, delta.days)
+    random_days = rng.randint(0, delta.days)
     return min_date + timedelta(days=random_days)
 
 
@@ -344,234 +402,700 @@ def generate_mrn(index):
     return f"MRN{index:08d}"
 
 
-def write_sql_file(filename, table_name, header, rows, total_rows):
-    """Write SQL INSERT statements to a file."""
-    filepath = OUTPUT_DIR / filename
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(f"-- ============================================================================\n")
-        f.write(f"-- {table_name.upper()} TABLE - INSERT statements\n")
-        f.write(f"-- ============================================================================\n")
-        f.write(f"-- Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"-- Total rows: {total_rows:,}\n")
-        f.write(f"-- ============================================================================\n\n")
-        
-        for row in rows:
-            f.write(row + "\n")
-    
-    print(f"  [OK] {filename}: {total_rows:,} rows")
-
+def write_sql_file(filename, table_name, header, rows, total_rows=None):
+    """Stream a table's rows to a file in the selected OUTPUT_FORMAT.
 
-def escape_sql(value):
-    """Escape single quotes in SQL strings."""
-    if value is None:
-        return "NULL"
-    return str(value).replace("'", "''")
+    ``rows`` is any iterable of value tuples (typically a lazy generator); it
+    is drained straight to disk, so a table is never held in memory. When
+    ``total_rows`` is not known up front, the row count is written as a
+    trailing comment. The file is streamed through the selected COMPRESSION.
+    Returns the number of rows written.
+    """
+    filename = output_filename(filename, OUTPUT_FORMAT, COMPRESSION)
+    columns = TABLE_COLUMNS[table_name]
+    with REPORT.stage(table_name) as stage:
+        written = write_table(
+            OUTPUT_DIR / filename, f"{table_name.upper()} TABLE", table_name, columns, REPORT.track(rows),
+            OUTPUT_FORMAT, BATCH_SIZE, total_rows, COMPRESSION, COMPRESSION_LEVEL,
+        )
+        stage.count(written, file_bytes(OUTPUT_DIR / filename))
+    LOADED_TABLES.append((table_name, filename, columns))
+    
+    print(f"  [OK] {filename}: {written:,} rows")
+    return written
 
 
 # =============================================================================
-# MAIN DATA GENERATION
+# ROW STREAMS
 # =============================================================================
+# Each table is produced by a generator that yields one value tuple per row.
+# Tables that later tables depend on record only the compact state those
+# tables need (see EncounterState) instead of keeping row dicts around.
+# Random draws go through ``rng``: the global stream for a serial run, or a
+# shard's own random.Random for a sharded run.
 
-def main():
-    print("\n" + "=" * 70)
-    print("Healthcare OLTP Realistic Data Generator")
-    print("=" * 70 + "\n")
+class EncounterState:
+    """Compact per-encounter state consumed by the child tables.
+
+    Holds the encounter date (as a proleptic ordinal) and the encounter type
+    (as an index into ENCOUNTER_TYPES) in typed arrays: 5 bytes per encounter
+    instead of a dict per row. Encounter ids are implicit (first_id + position).
+    """
     
-    # Ensure output directory exists
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    __slots__ = ("first_id", "date_ordinals", "type_indexes")
     
-    # -------------------------------------------------------------------------
-    # 1. SPECIALTIES (25 rows - lookup table)
-    # -------------------------------------------------------------------------
-    print("Generating reference/lookup tables...")
-    specialty_rows = []
-    for i, (name, code) in enumerate(SPECIALTIES, 1):
-        specialty_rows.append(f"INSERT INTO specialties VALUES ({i}, '{escape_sql(name)}', '{code}');")
-    write_sql_file("specialties.sql", "specialties", None, specialty_rows, len(SPECIALTIES))
-    num_specialties = len(SPECIALTIES)
+    def __init__(self, first_id=1):
+        self.first_id = first_id
+        self.date_ordinals = array("i")
+        self.type_indexes = bytearray()
     
-    # -------------------------------------------------------------------------
-    # 2. DEPARTMENTS (20 rows - lookup table)
-    # -------------------------------------------------------------------------
-    dept_rows = []
-    for i, (name, floor, capacity) in enumerate(DEPARTMENTS, 1):
-        dept_rows.append(f"INSERT INTO departments VALUES ({i}, '{escape_sql(name)}', {floor}, {capacity});")
-    write_sql_file("departments.sql", "departments", None, dept_rows, len(DEPARTMENTS))
-    num_departments = len(DEPARTMENTS)
+    def __len__(self):
+        return len(self.date_ordinals)
     
-    # -------------------------------------------------------------------------
-    # 3. DIAGNOSES (build from ICD10 categories - ~100 unique codes)
-    # -------------------------------------------------------------------------
-    print("\nGenerating clinical reference tables...")
-    diagnosis_rows = []
-    diagnosis_id = 1
-    all_diagnoses = []
+    def append(self, encounter_date, encounter_type):
+        self.date_ordinals.append(encounter_date.toordinal())
+        self.type_indexes.append(ENCOUNTER_TYPE_INDEX[encounter_type])
+    
+    def items(self):
+        """Yield (encounter_id, encounter_date, encounter_type) per encounter."""
+        for i, (ordinal, type_idx) in enumerate(zip(self.date_ordinals, self.type_indexes), self.first_id):
+            yield i, datetime.fromordinal(ordinal), ENCOUNTER_TYPES[type_idx][0]
+
+
+ENCOUNTER_TYPE_INDEX = {name: i for i, (name, _) in enumerate(ENCOUNTER_TYPES)}
+
+
+def all_diagnoses():
+    """Return (diagnosis_id, code, description) for every ICD-10 code."""
+    rows = []
     for category, codes in ICD10_CATEGORIES.items():
         for code, description in codes:
-            all_diagnoses.append((diagnosis_id, code, description))
-            diagnosis_rows.append(f"INSERT INTO diagnoses VALUES ({diagnosis_id}, '{code}', '{escape_sql(description)}');")
-            diagnosis_id += 1
-    write_sql_file("diagnoses.sql", "diagnoses", None, diagnosis_rows, len(all_diagnoses))
-    num_diagnoses = len(all_diagnoses)
-    
-    # -------------------------------------------------------------------------
-    # 4. PROCEDURES (build from CPT categories - ~60 unique codes)
-    # -------------------------------------------------------------------------
-    procedure_rows = []
-    procedure_id = 1
-    all_procedures = []
+            rows.append((len(rows) + 1, code, description))
+    return rows
+
+
+def all_procedures():
+    """Return (procedure_id, code, description) for every CPT code."""
+    rows = []
     for category, codes in CPT_CATEGORIES.items():
         for code, description in codes:
-            all_procedures.append((procedure_id, code, description))
-            procedure_rows.append(f"INSERT INTO procedures VALUES ({procedure_id}, '{code}', '{escape_sql(description)}');")
-            procedure_id += 1
-    write_sql_file("procedures.sql", "procedures", None, procedure_rows, len(all_procedures))
-    num_procedures = len(all_procedures)
-    
-    # -------------------------------------------------------------------------
-    # 5. PATIENTS (10,000 rows - main entity)
-    # -------------------------------------------------------------------------
-    print("\nGenerating main entity tables...")
-    NUM_PATIENTS = 10000
-    patient_rows = []
-    for i in range(1, NUM_PATIENTS + 1):
-        first_name = random.choice(FIRST_NAMES)
-        last_name = random.choice(LAST_NAMES)
-        dob = generate_dob().strftime("%Y-%m-%d")
-        gender = random.choice(["M", "F"])
+            rows.append((len(rows) + 1, code, description))
+    return rows
+
+
+def generate_specialty_rows():
+    for i, (name, code) in enumerate(SPECIALTIES, 1):
+        yield (i, name, code)
+
+
+def generate_department_rows():
+    for i, (name, floor, capacity) in enumerate(DEPARTMENTS, 1):
+        yield (i, name, floor, capacity)
+
+
+def generate_diagnosis_rows(diagnoses):
+    yield from diagnoses
+
+
+def generate_procedure_rows(procedures):
+    yield from procedures
+
+
+def generate_patient_rows(patient_ids, rng=random):
+    for i in patient_ids:
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        dob = generate_dob(rng=rng).strftime("%Y-%m-%d")
+        gender = rng.choice(["M", "F"])
         mrn = generate_mrn(i)
-        patient_rows.append(f"INSERT INTO patients VALUES ({i}, '{first_name}', '{last_name}', '{dob}', '{gender}', '{mrn}');")
-    write_sql_file("patients.sql", "patients", None, patient_rows, NUM_PATIENTS)
-    
-    # -------------------------------------------------------------------------
-    # 6. PROVIDERS (500 rows - reference specialties and departments)
-    # -------------------------------------------------------------------------
-    NUM_PROVIDERS = 500
-    provider_rows = []
-    for i in range(1, NUM_PROVIDERS + 1):
-        first_name = random.choice(FIRST_NAMES)
-        last_name = random.choice(LAST_NAMES)
-        credential = random.choice(CREDENTIALS)
-        specialty_id = random.randint(1, num_specialties)
-        department_id = random.randint(1, num_departments)
-        provider_rows.append(
-            f"INSERT INTO providers VALUES ({i}, '{first_name}', '{last_name}', "
-            f"'{credential}', {specialty_id}, {department_id});"
-        )
-    write_sql_file("providers.sql", "providers", None, provider_rows, NUM_PROVIDERS)
-    
-    # -------------------------------------------------------------------------
-    # 7. ENCOUNTERS (10,000 rows - main transactional table)
-    # -------------------------------------------------------------------------
-    print("\nGenerating transactional tables...")
-    NUM_ENCOUNTERS = 10000
-    encounter_rows = []
-    encounters = []  # Store for later use
-    for i in range(1, NUM_ENCOUNTERS + 1):
-        patient_id = random.randint(1, NUM_PATIENTS)
-        provider_id = random.randint(1, NUM_PROVIDERS)
-        encounter_type = weighted_choice(ENCOUNTER_TYPES)
-        encounter_date = generate_date()
+        yield (i, first_name, last_name, dob, gender, mrn)
+
+
+def generate_provider_rows(num_providers, num_specialties, num_departments, rng=random):
+    for i in range(1, num_providers + 1):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        credential = rng.choice(CREDENTIALS)
+        specialty_id = rng.randint(1, num_specialties)
+        department_id = rng.randint(1, num_departments)
+        yield (i, first_name, last_name, credential, specialty_id, department_id)
+
+
+def generate_encounter_rows(encounter_ids, patient_ids, num_providers, num_departments, state, rng=random,
+                            skew=UNIFORM):
+    """Yield encounter rows, recording each encounter's date/type in ``state``.
+
+    Patients are drawn from the ``patient_ids`` range (all patients for a
+    serial run, the co-partitioned patient range for a shard); patients,
+    providers and dates follow ``skew`` (see distributions.py).
+    """
+    draw_patient = skew.patient_sampler(len(patient_ids)).index
+    draw_provider = skew.provider_sampler(num_providers).index
+    draw_day = skew.day_sampler(ENCOUNTER_START.toordinal(), (ENCOUNTER_END - ENCOUNTER_START).days + 1).index
+    for i in encounter_ids:
+        patient_id = patient_ids.start + draw_patient(rng)
+        provider_id = 1 + draw_provider(rng)
+        encounter_type = weighted_choice(ENCOUNTER_TYPES, rng)
+        encounter_date = ENCOUNTER_START + timedelta(days=draw_day(rng))
         
         # Discharge date (same day for outpatient, 1-14 days later for inpatient)
         if encounter_type == "Outpatient":
             discharge_date = encounter_date
         elif encounter_type == "Emergency":
-            discharge_date = encounter_date + timedelta(hours=random.randint(1, 24))
+            discharge_date = encounter_date + timedelta(hours=rng.randint(1, 24))
         else:  # Inpatient
-            discharge_date = encounter_date + timedelta(days=random.randint(1, 14))
+            discharge_date = encounter_date + timedelta(days=rng.randint(1, 14))
         
-        department_id = random.randint(1, num_departments)
+        department_id = rng.randint(1, num_departments)
         
-        encounters.append({
-            "id": i,
-            "date": encounter_date,
-            "type": encounter_type
-        })
+        state.append(encounter_date, encounter_type)
         
         enc_datetime = encounter_date.strftime("%Y-%m-%d %H:%M:%S")
         dis_datetime = discharge_date.strftime("%Y-%m-%d %H:%M:%S")
         
-        encounter_rows.append(
-            f"INSERT INTO encounters VALUES ({i}, {patient_id}, {provider_id}, "
-            f"'{encounter_type}', '{enc_datetime}', '{dis_datetime}', {department_id});"
-        )
-    write_sql_file("encounters.sql", "encounters", None, encounter_rows, NUM_ENCOUNTERS)
-    
-    # -------------------------------------------------------------------------
-    # 8. ENCOUNTER_DIAGNOSES (2-3 diagnoses per encounter avg = ~25,000 rows)
-    # -------------------------------------------------------------------------
-    enc_diag_rows = []
-    enc_diag_id = 1
-    for enc in encounters:
+        yield (i, patient_id, provider_id, encounter_type, enc_datetime, dis_datetime, department_id)
+
+
+def generate_encounter_diagnosis_rows(encounter_ids, num_diagnoses, rng=random, counts=None, first_id=1):
+    """Yield encounter_diagnoses rows.
+
+    ``counts`` optionally supplies the number of diagnoses per encounter
+    (sharded runs pre-draw them to know each shard's id offset); otherwise
+    they are drawn inline from ``rng``.
+    """
+    enc_diag_id = first_id
+    for n, encounter_id in enumerate(encounter_ids):
         # 1-5 diagnoses per encounter
-        num_diags = random.choices([1, 2, 3, 4, 5], weights=[15, 40, 30, 10, 5])[0]
+        if counts is None:
+            num_diags = rng.choices(DIAGNOSES_PER_ENCOUNTER[0], weights=DIAGNOSES_PER_ENCOUNTER[1])[0]
+        else:
+            num_diags = counts[n]
         used_diagnosis_ids = set()
         
         for seq in range(1, num_diags + 1):
             # Select a diagnosis that hasn't been used for this encounter
-            diagnosis_id = random.randint(1, num_diagnoses)
+            diagnosis_id = rng.randint(1, num_diagnoses)
             while diagnosis_id in used_diagnosis_ids:
-                diagnosis_id = random.randint(1, num_diagnoses)
+                diagnosis_id = rng.randint(1, num_diagnoses)
             used_diagnosis_ids.add(diagnosis_id)
             
-            enc_diag_rows.append(
-                f"INSERT INTO encounter_diagnoses VALUES ({enc_diag_id}, {enc['id']}, {diagnosis_id}, {seq});"
-            )
+            yield (enc_diag_id, encounter_id, diagnosis_id, seq)
             enc_diag_id += 1
-    write_sql_file("encounter_diagnoses.sql", "encounter_diagnoses", None, enc_diag_rows, enc_diag_id - 1)
-    
-    # -------------------------------------------------------------------------
-    # 9. ENCOUNTER_PROCEDURES (1-2 procedures per encounter avg = ~15,000 rows)
-    # -------------------------------------------------------------------------
-    enc_proc_rows = []
-    enc_proc_id = 1
-    for enc in encounters:
+
+
+def generate_encounter_procedure_rows(state, num_procedures, rng=random, counts=None, first_id=1):
+    """Yield encounter_procedures rows (``counts`` as for diagnoses)."""
+    enc_proc_id = first_id
+    for n, (encounter_id, encounter_date, _) in enumerate(state.items()):
         # 0-4 procedures per encounter (some encounters have no procedures)
-        num_procs = random.choices([0, 1, 2, 3, 4], weights=[20, 40, 25, 10, 5])[0]
+        if counts is None:
+            num_procs = rng.choices(PROCEDURES_PER_ENCOUNTER[0], weights=PROCEDURES_PER_ENCOUNTER[1])[0]
+        else:
+            num_procs = counts[n]
         used_procedure_ids = set()
         
         for _ in range(num_procs):
-            procedure_id = random.randint(1, num_procedures)
+            procedure_id = rng.randint(1, num_procedures)
             while procedure_id in used_procedure_ids:
-                procedure_id = random.randint(1, num_procedures)
+                procedure_id = rng.randint(1, num_procedures)
             used_procedure_ids.add(procedure_id)
             
-            proc_date = enc["date"] + timedelta(days=random.randint(0, 3))
+            proc_date = encounter_date + timedelta(days=rng.randint(0, 3))
             
-            enc_proc_rows.append(
-                f"INSERT INTO encounter_procedures VALUES ({enc_proc_id}, {enc['id']}, "
-                f"{procedure_id}, '{proc_date.strftime('%Y-%m-%d')}');"
-            )
+            yield (enc_proc_id, encounter_id, procedure_id, proc_date.strftime("%Y-%m-%d"))
             enc_proc_id += 1
-    write_sql_file("encounter_procedures.sql", "encounter_procedures", None, enc_proc_rows, enc_proc_id - 1)
-    
-    # -------------------------------------------------------------------------
-    # 10. BILLING (10,000 rows - one per encounter)
-    # -------------------------------------------------------------------------
-    print("\nGenerating billing records...")
-    billing_rows = []
-    for i, enc in enumerate(encounters, 1):
+
+
+def generate_billing_rows(state, rng=random):
+    for encounter_id, encounter_date, encounter_type in state.items():
         # Generate realistic claim amounts based on encounter type
-        if enc["type"] == "Outpatient":
-            claim_amount = round(random.uniform(100, 2000), 2)
-        elif enc["type"] == "Emergency":
-            claim_amount = round(random.uniform(500, 10000), 2)
-        else:  # Inpatient
-            claim_amount = round(random.uniform(5000, 100000), 2)
+        low, high = CLAIM_AMOUNT_RANGES[encounter_type]
+        claim_amount = round(rng.uniform(low, high), 2)
         
         # Allowed amount is typically 60-90% of claim
-        allowed_ratio = random.uniform(0.6, 0.9)
+        allowed_ratio = rng.uniform(0.6, 0.9)
         allowed_amount = round(claim_amount * allowed_ratio, 2)
         
-        claim_date = enc["date"] + timedelta(days=random.randint(1, 30))
-        claim_status = weighted_choice(CLAIM_STATUSES)
+        claim_date = encounter_date + timedelta(days=rng.randint(1, 30))
+        claim_status = weighted_choice(CLAIM_STATUSES, rng)
         
-        billing_rows.append(
-            f"INSERT INTO billing VALUES ({i}, {enc['id']}, {claim_amount}, "
-            f"{allowed_amount}, '{claim_date.strftime('%Y-%m-%d')}', '{claim_status}');"
+        # One claim per encounter, so billing_id == encounter_id
+        yield (
+            encounter_id, encounter_id, claim_amount, allowed_amount,
+            claim_date.strftime("%Y-%m-%d"), claim_status,
         )
-    write_sql_file("billing.sql", "billing", None, billing_rows, NUM_ENCOUNTERS)
+
+
+# =============================================================================
+# VECTORIZED ROW STREAMS (--backend numpy)
+# =============================================================================
+# Same tables, columns and distributions as the streams above, but each chunk
+# of encounters draws whole columns with NumPy (see vectorized.py) and is
+# yielded as one ColumnBlock for the writers to render in bulk. The random
+# stream differs from the pure-Python backend, so the rows do too.
+
+
+def generate_patient_rows_np(patient_ids, rng):
+    """Vectorized generate_patient_rows; ``rng`` is a numpy Generator."""
+    first_names = np.array(FIRST_NAMES, dtype=object)
+    last_names = np.array(LAST_NAMES, dtype=object)
+    genders = np.array(["M", "F"], dtype=object)
+    today = datetime(2025, 1, 1)
+    oldest = (today - timedelta(days=95 * 365)).toordinal()
+    num_days = (today - timedelta(days=365)).toordinal() - oldest + 1
+    
+    for ids in vectorized.chunked(patient_ids):
+        n = len(ids)
+        yield ColumnBlock([
+            ids,
+            first_names[rng.integers(0, len(FIRST_NAMES), n)].tolist(),
+            last_names[rng.integers(0, len(LAST_NAMES), n)].tolist(),
+            vectorized.format_dates(oldest + rng.integers(0, num_days, n)),
+            genders[rng.integers(0, 2, n)].tolist(),
+            [generate_mrn(i) for i in ids],
+        ])
+
+
+def generate_encounter_rows_np(encounter_ids, patient_ids, num_providers, num_departments, state, rng,
+                               skew=UNIFORM):
+    """Vectorized generate_encounter_rows; ``rng`` is a numpy Generator."""
+    type_names = np.array([name for name, _ in ENCOUNTER_TYPES], dtype=object)
+    type_weights = [weight for _, weight in ENCOUNTER_TYPES]
+    first_ordinal = ENCOUNTER_START.toordinal()
+    patient_sampler = skew.patient_sampler(len(patient_ids))
+    provider_sampler = skew.provider_sampler(num_providers)
+    day_sampler = skew.day_sampler(first_ordinal, (ENCOUNTER_END - ENCOUNTER_START).days + 1)
+    
+    for ids in vectorized.chunked(encounter_ids):
+        n = len(ids)
+        patients = patient_ids.start + vectorized.sample(rng, patient_sampler, n)
+        providers = 1 + vectorized.sample(rng, provider_sampler, n)
+        types = vectorized.weighted_indexes(rng, type_weights, n)
+        ordinals = first_ordinal + vectorized.sample(rng, day_sampler, n)
+        
+        # Length of stay in seconds: 0 outpatient, 1-24 hours ER, 1-14 days inpatient
+        stay = np.zeros(n, dtype=np.int64)
+        emergency = types == ENCOUNTER_TYPE_INDEX["Emergency"]
+        inpatient = types == ENCOUNTER_TYPE_INDEX["Inpatient"]
+        stay[emergency] = rng.integers(1, 25, int(emergency.sum())) * 3600
+        stay[inpatient] = rng.integers(1, 15, int(inpatient.sum())) * SECONDS_PER_DAY
+        
+        departments = rng.integers(1, num_departments + 1, n)
+        
+        state.date_ordinals.frombytes(ordinals.astype(np.int32).tobytes())
+        state.type_indexes.extend(types.astype(np.uint8).tobytes())
+        
+        admitted = ordinals * SECONDS_PER_DAY
+        yield ColumnBlock([
+            ids, patients.tolist(), providers.tolist(), type_names[types].tolist(),
+            vectorized.format_timestamps(admitted), vectorized.format_timestamps(admitted + stay),
+            departments.tolist(),
+        ])
+
+
+def _state_columns(state, ids):
+    """Date ordinals and type indexes of encounters ``ids`` (views into ``state``)."""
+    lo = ids.start - state.first_id
+    ordinals = np.frombuffer(state.date_ordinals, dtype=np.int32)[lo:lo + len(ids)]
+    types = np.frombuffer(state.type_indexes, dtype=np.uint8)[lo:lo + len(ids)]
+    return ordinals.astype(np.int64), types
+
+
+def generate_encounter_diagnosis_rows_np(encounter_ids, num_diagnoses, rng, counts, first_id=1):
+    """Vectorized generate_encounter_diagnosis_rows; ``counts`` is required."""
+    counts = np.asarray(counts)
+    next_id = first_id
+    for ids in vectorized.chunked(encounter_ids):
+        lo = ids.start - encounter_ids.start
+        chunk_counts = counts[lo:lo + len(ids)]
+        draws = vectorized.distinct_draws(rng, chunk_counts, num_diagnoses)
+        encounters, diagnoses, sequences = vectorized.explode(np.arange(ids.start, ids.stop), chunk_counts, draws)
+        yield ColumnBlock([
+            range(next_id, next_id + len(encounters)), encounters.tolist(), diagnoses.tolist(), sequences.tolist()
+        ])
+        next_id += len(encounters)
+
+
+def generate_encounter_procedure_rows_np(state, num_procedures, rng, counts, first_id=1):
+    """Vectorized generate_encounter_procedure_rows; ``counts`` is required."""
+    counts = np.asarray(counts)
+    next_id = first_id
+    for ids in vectorized.chunked(range(state.first_id, state.first_id + len(state))):
+        lo = ids.start - state.first_id
+        chunk_counts = counts[lo:lo + len(ids)]
+        ordinals, _ = _state_columns(state, ids)
+        draws = vectorized.distinct_draws(rng, chunk_counts, num_procedures)
+        encounters, procedures, _ = vectorized.explode(np.arange(ids.start, ids.stop), chunk_counts, draws)
+        proc_dates = np.repeat(ordinals, chunk_counts) + rng.integers(0, 4, len(encounters))
+        yield ColumnBlock([
+            range(next_id, next_id + len(encounters)), encounters.tolist(), procedures.tolist(),
+            vectorized.format_dates(proc_dates),
+        ])
+        next_id += len(encounters)
+
+
+def generate_billing_rows_np(state, rng):
+    """Vectorized generate_billing_rows; ``rng`` is a numpy Generator."""
+    claim_low = np.array([CLAIM_AMOUNT_RANGES[name][0] for name, _ in ENCOUNTER_TYPES], dtype=np.float64)
+    claim_high = np.array([CLAIM_AMOUNT_RANGES[name][1] for name, _ in ENCOUNTER_TYPES], dtype=np.float64)
+    statuses = np.array([status for status, _ in CLAIM_STATUSES], dtype=object)
+    status_weights = [weight for _, weight in CLAIM_STATUSES]
+    
+    for ids in vectorized.chunked(range(state.first_id, state.first_id + len(state))):
+        n = len(ids)
+        ordinals, types = _state_columns(state, ids)
+        claim_amounts = vectorized.uniform_amounts(rng, claim_low[types], claim_high[types])
+        allowed_amounts = np.round(claim_amounts * rng.uniform(0.6, 0.9, n), 2)
+        claim_dates = ordinals + rng.integers(1, 31, n)
+        claim_statuses = statuses[vectorized.weighted_indexes(rng, status_weights, n)]
+        encounter_ids = list(ids)
+        yield ColumnBlock([
+            encounter_ids, encounter_ids, claim_amounts.tolist(), allowed_amounts.tolist(),
+            vectorized.format_dates(claim_dates), claim_statuses.tolist(),
+        ])
+
+
+# =============================================================================
+# SHARDED GENERATION (--shards N)
+# =============================================================================
+# Patients and encounters are split into the same number of ID-range shards.
+# Encounter shard k only references patients from patient shard k, so each
+# shard is self-contained; every (table, shard) draws from its own derived
+# seed. Workers write part files that are merged (or kept, with a manifest)
+# in shard order.
+
+PARTS_DIRNAME = "parts"
+
+
+def draw_child_counts(seed, shard, num_encounters, backend="python"):
+    """Per-encounter diagnosis and procedure counts of one encounter shard."""
+    if backend == "numpy":
+        diag_counts = vectorized.weighted_values(
+            vectorized.numpy_rng(seed, "encounter_diagnoses.counts", shard), *DIAGNOSES_PER_ENCOUNTER, num_encounters
+        )
+        proc_counts = vectorized.weighted_values(
+            vectorized.numpy_rng(seed, "encounter_procedures.counts", shard), *PROCEDURES_PER_ENCOUNTER, num_encounters
+        )
+        return diag_counts, proc_counts
+    diag_counts = shard_random(seed, "encounter_diagnoses.counts", shard).choices(
+        DIAGNOSES_PER_ENCOUNTER[0], weights=DIAGNOSES_PER_ENCOUNTER[1], k=num_encounters
+    )
+    proc_counts = shard_random(seed, "encounter_procedures.counts", shard).choices(
+        PROCEDURES_PER_ENCOUNTER[0], weights=PROCEDURES_PER_ENCOUNTER[1], k=num_encounters
+    )
+    return diag_counts, proc_counts
+
+
+def _count_children_task(args):
+    seed, shard, num_encounters, backend = args
+    diag_counts, proc_counts = draw_child_counts(seed, shard, num_encounters, backend)
+    return int(sum(diag_counts)), int(sum(proc_counts))
+
+
+def _write_shard_part(settings, shard, filename, table_name, rows, report):
+    output_dir, fmt, batch_size, complete, compression, level = settings
+    path = part_path(output_dir / PARTS_DIRNAME, filename, shard, fmt, compression)
+    with report.stage(table_name) as stage:
+        written = write_part(
+            path, f"{table_name.upper()} TABLE", table_name, TABLE_COLUMNS[table_name],
+            rows, fmt, batch_size, complete, compression, level,
+        )
+        stage.count(written, file_bytes(path))
+    return path, written
+
+
+def _patient_shard_task(args):
+    seed, shard, patient_ids, backend, settings = args
+    if backend == "numpy":
+        rows = generate_patient_rows_np(patient_ids, vectorized.numpy_rng(seed, "patients", shard))
+    else:
+        rows = generate_patient_rows(patient_ids, shard_random(seed, "patients", shard))
+    report = RunReport()
+    return {"patients": _write_shard_part(settings, shard, "patients.sql", "patients", rows, report),
+            "stages": report.stages}
+
+
+def _encounter_shard_task(args):
+    seed, shard, encounter_ids, patient_ids, num_providers, diag_first_id, proc_first_id, skew, backend, settings = args
+    diag_counts, proc_counts = draw_child_counts(seed, shard, len(encounter_ids), backend)
+    num_diagnoses = len(all_diagnoses())
+    num_procedures = len(all_procedures())
+    state = EncounterState(encounter_ids.start)
+    if backend == "numpy":
+        make_rng = vectorized.numpy_rng
+        streams = (generate_encounter_rows_np, generate_encounter_diagnosis_rows_np,
+                   generate_encounter_procedure_rows_np, generate_billing_rows_np)
+    else:
+        make_rng = shard_random
+        streams = (generate_encounter_rows, generate_encounter_diagnosis_rows,
+                   generate_encounter_procedure_rows, generate_billing_rows)
+    encounter_rows, diagnosis_rows, procedure_rows, billing_rows = streams
+    
+    report = RunReport()
+    parts = {}
+    parts["encounters"] = _write_shard_part(
+        settings, shard, "encounters.sql", "encounters",
+        encounter_rows(encounter_ids, patient_ids, num_providers, len(DEPARTMENTS), state,
+                       make_rng(seed, "encounters", shard), skew),
+        report,
+    )
+    parts["encounter_diagnoses"] = _write_shard_part(
+        settings, shard, "encounter_diagnoses.sql", "encounter_diagnoses",
+        diagnosis_rows(encounter_ids, num_diagnoses, make_rng(seed, "encounter_diagnoses", shard),
+                       diag_counts, diag_first_id),
+        report,
+    )
+    parts["encounter_procedures"] = _write_shard_part(
+        settings, shard, "encounter_procedures.sql", "encounter_procedures",
+        procedure_rows(state, num_procedures, make_rng(seed, "encounter_procedures", shard),
+                       proc_counts, proc_first_id),
+        report,
+    )
+    parts["billing"] = _write_shard_part(
+        settings, shard, "billing.sql", "billing",
+        billing_rows(state, make_rng(seed, "billing", shard)),
+        report,
+    )
+    parts["stages"] = report.stages
+    return parts
+
+
+def _assemble_shards(filename, table_name, results, first_ids, keep_parts, manifest):
+    """Merge (or keep) one table's parts, register them and record them in ``manifest``."""
+    parts = [result[table_name] for result in results]
+    columns = TABLE_COLUMNS[table_name]
+    filename = output_filename(filename, OUTPUT_FORMAT, COMPRESSION)
+    files = assemble_table(
+        OUTPUT_DIR, filename, f"{table_name.upper()} TABLE",
+        table_name, columns, OUTPUT_FORMAT, parts, keep_parts, COMPRESSION, COMPRESSION_LEVEL,
+    )
+    REPORT.count(sum(rows for _, rows in files), file_bytes(*(OUTPUT_DIR / name for name, _ in files)))
+    manifest[table_name] = []
+    for (name, rows), first_id in zip(files, first_ids if keep_parts else first_ids[:1]):
+        LOADED_TABLES.append((table_name, name, columns))
+        manifest[table_name].append({"file": name, "rows": rows, "first_id": first_id,
+                                     "last_id": first_id + rows - 1})
+    total = sum(rows for _, rows in files)
+    shards = f" ({len(parts)} shards)" if len(parts) > 1 else ""
+    print(f"  [OK] {filename}: {total:,} rows{shards}")
+    return total
+
+
+def build_sharded(seed, num_shards, workers, keep_parts, backend="python", skew=UNIFORM):
+    """Generate patients and encounters (with their child tables) in parallel shards.
+
+    The numpy backend always runs through here (a single shard runs in-process).
+    """
+    patient_ranges = shard_ranges(NUM_PATIENTS, num_shards)
+    encounter_ranges = shard_ranges(NUM_ENCOUNTERS, num_shards)
+    if len(patient_ranges) != len(encounter_ranges):
+        raise ValueError("--shards must not exceed the number of patients or encounters")
+    (OUTPUT_DIR / PARTS_DIRNAME).mkdir(parents=True, exist_ok=True)
+    settings = (OUTPUT_DIR, OUTPUT_FORMAT, BATCH_SIZE, keep_parts, COMPRESSION, COMPRESSION_LEVEL)
+    manifest = {}
+    
+    print(f"\nGenerating main entity tables ({len(patient_ranges)} shards, seed {seed}, {backend} backend)...")
+    with REPORT.stage(f"patients ({len(patient_ranges)} shards)"):
+        results = run_parallel(
+            _patient_shard_task,
+            [(seed, shard, ids, backend, settings) for shard, ids in enumerate(patient_ranges)],
+            workers,
+        )
+        _assemble_shards(
+            "patients.sql", "patients", results, [r.start for r in patient_ranges], keep_parts, manifest
+        )
+    for shard, result in enumerate(results):
+        REPORT.add_shard_stages(shard, result["stages"])
+    write_sql_file(
+        "providers.sql", "providers", None,
+        generate_provider_rows(NUM_PROVIDERS, len(SPECIALTIES), len(DEPARTMENTS), shard_random(seed, "providers", 0)),
+        NUM_PROVIDERS,
+    )
+    
+    # Pre-count junction rows per shard so each shard knows its first id
+    print("\nGenerating transactional tables...")
+    child_totals = run_parallel(
+        _count_children_task,
+        [(seed, shard, len(ids), backend) for shard, ids in enumerate(encounter_ranges)],
+        workers,
+    )
+    diag_first_ids, proc_first_ids = [1], [1]
+    for diag_total, proc_total in child_totals[:-1]:
+        diag_first_ids.append(diag_first_ids[-1] + diag_total)
+        proc_first_ids.append(proc_first_ids[-1] + proc_total)
+    
+    with REPORT.stage(f"encounters + child tables ({len(encounter_ranges)} shards)"):
+        results = run_parallel(
+            _encounter_shard_task,
+            [
+                (seed, shard, encounter_ids, patient_ids, NUM_PROVIDERS, diag_first_ids[shard],
+                 proc_first_ids[shard], skew, backend, settings)
+                for shard, (encounter_ids, patient_ids) in enumerate(zip(encounter_ranges, patient_ranges))
+            ],
+            workers,
+        )
+        encounter_first_ids = [r.start for r in encounter_ranges]
+        _assemble_shards("encounters.sql", "encounters", results, encounter_first_ids, keep_parts, manifest)
+        num_enc_diags = _assemble_shards(
+            "encounter_diagnoses.sql", "encounter_diagnoses", results, diag_first_ids, keep_parts, manifest
+        )
+        num_enc_procs = _assemble_shards(
+            "encounter_procedures.sql", "encounter_procedures", results, proc_first_ids, keep_parts, manifest
+        )
+        _assemble_shards("billing.sql", "billing", results, encounter_first_ids, keep_parts, manifest)
+    for shard, result in enumerate(results):
+        REPORT.add_shard_stages(shard, result["stages"])
+    
+    if not keep_parts:
+        (OUTPUT_DIR / PARTS_DIRNAME).rmdir()
+    write_manifest(OUTPUT_DIR, seed, len(encounter_ranges), OUTPUT_FORMAT, manifest, backend)
+    return num_enc_diags, num_enc_procs
+
+
+def build_serial(skew=UNIFORM):
+    """Generate patients and encounters (with their child tables) from the global stream."""
+    print("\nGenerating main entity tables...")
+    write_sql_file(
+        "patients.sql", "patients", None, generate_patient_rows(range(1, NUM_PATIENTS + 1)), NUM_PATIENTS
+    )
+    write_sql_file(
+        "providers.sql", "providers", None,
+        generate_provider_rows(NUM_PROVIDERS, len(SPECIALTIES), len(DEPARTMENTS)), NUM_PROVIDERS,
+    )
+    
+    # Encounters - the only retained state is EncounterState's typed arrays
+    print("\nGenerating transactional tables...")
+    state = EncounterState()
+    write_sql_file(
+        "encounters.sql", "encounters", None,
+        generate_encounter_rows(
+            range(1, NUM_ENCOUNTERS + 1), range(1, NUM_PATIENTS + 1), NUM_PROVIDERS, len(DEPARTMENTS), state,
+            skew=skew,
+        ),
+        NUM_ENCOUNTERS,
+    )
+    
+    # Junction tables (row counts are only known once drained)
+    num_enc_diags = write_sql_file(
+        "encounter_diagnoses.sql", "encounter_diagnoses", None,
+        generate_encounter_diagnosis_rows(range(1, NUM_ENCOUNTERS + 1), len(all_diagnoses())),
+    )
+    num_enc_procs = write_sql_file(
+        "encounter_procedures.sql", "encounter_procedures", None,
+        generate_encounter_procedure_rows(state, len(all_procedures())),
+    )
+    
+    # Billing (one claim per encounter)
+    print("\nGenerating billing records...")
+    write_sql_file("billing.sql", "billing", None, generate_billing_rows(state), NUM_ENCOUNTERS)
+    return num_enc_diags, num_enc_procs
+
+
+# =============================================================================
+# MAIN DATA GENERATION
+# =============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate realistic healthcare OLTP data.")
+    parser.add_argument("--format", choices=FORMATS, default=OUTPUT_FORMAT,
+                        help="output format (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows per statement for multi-insert output (default: %(default)s)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="scale factor for patients, providers and encounters (child tables follow); "
+                             "reference tables do not scale (default: %(default)s)")
+    parser.add_argument("--patient-skew", type=float, default=0.0,
+                        help="Zipf exponent of encounters per patient, e.g. 1.0 for frequent flyers "
+                             "(default: 0, uniform)")
+    parser.add_argument("--provider-skew", type=float, default=0.0,
+                        help="Zipf exponent of encounters per provider (default: 0, uniform)")
+    parser.add_argument("--seasonality", type=float, default=0.0,
+                        help="amplitude (0-1) of the yearly encounter-date cycle peaking in January "
+                             "(default: 0, flat)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=COMPRESSION,
+                        help="stream data files through gzip or zstd (default: %(default)s)")
+    parser.add_argument("--compression-level", type=int, default=COMPRESSION_LEVEL,
+                        help="gzip (1-9) or zstd (1-22) compression level (default: 6 for gzip, 3 for zstd)")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="directory to write data files to (default: data/oltp)")
+    parser.add_argument("--seed", type=int, default=SEED,
+                        help="random seed (default: %(default)s)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split patients/encounters into N ID-range shards generated in parallel "
+                             "(default: 1, a single serial stream)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --shards (default: CPU count)")
+    parser.add_argument("--keep-parts", action="store_true",
+                        help="keep per-shard part files (listed in manifest.json) instead of merging them")
+    parser.add_argument("--backend", choices=("python", "numpy"), default="python",
+                        help="row generation backend for patients, encounters, junction tables and billing; "
+                             "numpy draws whole columns at once (default: %(default)s)")
+    parser.add_argument("--report", type=Path, default=None,
+                        help="write a JSON run report (wall/CPU time, rows/s, bytes and peak RSS per stage)")
+    parser.add_argument("--progress", action="store_true",
+                        help="show a live progress line (rows, rows/s) on stderr while each stage runs")
+    args = parser.parse_args(argv)
+    if args.backend == "numpy" and vectorized is None:
+        parser.error("--backend numpy requires NumPy (pip install numpy)")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.patient_skew < 0 or args.provider_skew < 0:
+        parser.error("--patient-skew and --provider-skew must not be negative")
+    if not 0 <= args.seasonality < 1:
+        parser.error("--seasonality must be at least 0 and below 1")
+    error = check_compression(args.compression, args.compression_level)
+    if error:
+        parser.error(error)
+    return args
+
+
+def main(argv=None):
+    global OUTPUT_DIR, OUTPUT_FORMAT, BATCH_SIZE, COMPRESSION, COMPRESSION_LEVEL
+    global NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS
+    args = parse_args(argv)
+    OUTPUT_DIR, OUTPUT_FORMAT, BATCH_SIZE = args.output_dir, args.format, args.batch_size
+    COMPRESSION, COMPRESSION_LEVEL = args.compression, args.compression_level
+    if args.seed != SEED:
+        random.seed(args.seed)
+    if args.scale != 1:
+        NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS = (
+            scaled(count, args.scale) for count in (NUM_PATIENTS, NUM_PROVIDERS, NUM_ENCOUNTERS)
+        )
+    skew = Skew(args.patient_skew, args.provider_skew, args.seasonality)
+    REPORT.progress = args.progress
+    
+    print("\n" + "=" * 70)
+    print("Healthcare OLTP Realistic Data Generator")
+    print("=" * 70 + "\n")
+    print(f"Scale {args.scale:g} ({NUM_PATIENTS:,} patients, {NUM_PROVIDERS:,} providers, "
+          f"{NUM_ENCOUNTERS:,} encounters); key distribution: {skew}\n")
+    
+    # Ensure output directory exists
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    diagnoses = all_diagnoses()
+    procedures = all_procedures()
+    num_specialties = len(SPECIALTIES)
+    num_departments = len(DEPARTMENTS)
+    num_diagnoses = len(diagnoses)
+    num_procedures = len(procedures)
+    
+    # 1-4. Lookup and clinical reference tables
+    print("Generating reference/lookup tables...")
+    write_sql_file("specialties.sql", "specialties", None, generate_specialty_rows(), num_specialties)
+    write_sql_file("departments.sql", "departments", None, generate_department_rows(), num_departments)
+    
+    print("\nGenerating clinical reference tables...")
+    write_sql_file("diagnoses.sql", "diagnoses", None, generate_diagnosis_rows(diagnoses), num_diagnoses)
+    write_sql_file("procedures.sql", "procedures", None, generate_procedure_rows(procedures), num_procedures)
+    
+    # 5-10. Entity and transactional tables
+    if args.shards > 1 or args.backend == "numpy":
+        num_enc_diags, num_enc_procs = build_sharded(
+            args.seed, max(args.shards, 1), args.workers, args.keep_parts, args.backend, skew
+        )
+    else:
+        num_enc_diags, num_enc_procs = build_serial(skew)
     
     # -------------------------------------------------------------------------
     # SUMMARY
@@ -588,11 +1112,20 @@ def main():
     print(f"  Patients:              {NUM_PATIENTS:>8,} rows")
     print(f"  Providers:             {NUM_PROVIDERS:>8,} rows")
     print(f"  Encounters:            {NUM_ENCOUNTERS:>8,} rows")
-    print(f"  Encounter_Diagnoses:   {enc_diag_id - 1:>8,} rows")
-    print(f"  Encounter_Procedures:  {enc_proc_id - 1:>8,} rows")
+    print(f"  Encounter_Diagnoses:   {num_enc_diags:>8,} rows")
+    print(f"  Encounter_Procedures:  {num_enc_procs:>8,} rows")
     print(f"  Billing:               {NUM_ENCOUNTERS:>8,} rows")
     print("-" * 40)
+    
+    for path in write_loader_scripts(OUTPUT_DIR, LOADED_TABLES, OUTPUT_FORMAT):
+        print(f"  Loader script: {path.name}")
     print(f"\nAll files written to: {OUTPUT_DIR.absolute()}")
+    if args.report or args.progress:
+        print("\nStage timings (slowest first):")
+        for line in REPORT.summary_lines():
+            print(line)
+    if args.report:
+        print(f"\nRun report written to: {REPORT.write(args.report, argv)}")
     print()
 
 
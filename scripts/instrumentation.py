@@ -0,0 +1,207 @@
+"""
+Run Instrumentation
+===================
+Per-stage performance figures for generator and ETL runs (``--report`` and
+``--progress`` on both generators).
+
+A stage is one unit of a build: a dimension, the fact, readmission
+detection, a bridge, an encounter scan. For every stage a RunReport records:
+
+- wall_seconds / cpu_seconds: CPU is user + system time of this process and
+  of the worker processes it waited for during the stage
+- rows, rows_per_second and bytes (the size on disk of the files written,
+  after compression)
+- peak_rss_mb: the peak resident set size so far, of this process or any
+  finished worker. It is a high-water mark, so the stage that raised it is
+  the first one to report the new value.
+
+Sharded runs time each worker's stages in the worker and add them to the
+report with their shard number, next to the parent stage that covers the
+whole parallel run. Stages nest per thread, so threads (the bulk loader's,
+the ETL task graph's) time their own stages in the one report; CPU time is
+per process, so the CPU seconds of concurrent thread stages overlap. Other
+components add whole sections to the JSON report (the task graph's
+schedule and critical path).
+With ``progress`` a live line (rows so far, rows/s) is written to stderr
+while a stage streams its rows.
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from output_formats import ColumnBlock, generated_at
+
+try:
+    import resource
+except ImportError:  # Unix only; peak RSS is reported as None elsewhere
+    resource = None
+
+# Seconds between progress updates on a terminal, and in a log (one line each)
+PROGRESS_INTERVAL = 0.5
+LOG_PROGRESS_INTERVAL = 10.0
+
+# Rows between clock checks while tracking per-row streams
+_TRACK_BATCH = 4096
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def peak_rss_mb():
+    """Peak RSS (MB) of this process or any waited-for child, or None if unknown."""
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def file_bytes(*paths):
+    """Total size on disk of ``paths``."""
+    return sum(os.path.getsize(path) for path in paths)
+
+
+class Stage:
+    """Counters of one running stage; ``count`` adds rows and bytes written."""
+
+    __slots__ = ("name", "rows", "bytes", "started", "cpu_started")
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.cpu_started = _cpu_seconds()
+
+    def count(self, rows=0, nbytes=0):
+        self.rows += rows
+        self.bytes += nbytes
+
+    def finish(self):
+        """The stage's report entry."""
+        wall = time.perf_counter() - self.started
+        return {
+            "name": self.name,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(_cpu_seconds() - self.cpu_started, 4),
+            "rows": self.rows,
+            "rows_per_second": round(self.rows / wall) if wall > 0 else None,
+            "bytes": self.bytes,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+class RunReport:
+    """Stage timings of one run, in the order the stages finished."""
+
+    def __init__(self, progress=False):
+        self.progress = progress
+        self.stages = []
+        self.sections = {}
+        self._local = threading.local()
+        self._started = time.perf_counter()
+        self._cpu_started = _cpu_seconds()
+
+    @property
+    def _active(self):
+        """Running stages of the calling thread, innermost last."""
+        try:
+            return self._local.active
+        except AttributeError:
+            self._local.active = []
+            return self._local.active
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage ``name``; yields its Stage."""
+        stage = Stage(name)
+        active = self._active
+        active.append(stage)
+        try:
+            yield stage
+        finally:
+            active.pop()
+            self.stages.append(stage.finish())
+            if self.progress and sys.stderr.isatty():
+                sys.stderr.write("\r\033[K")
+                sys.stderr.flush()
+
+    def count(self, rows=0, nbytes=0):
+        """Add rows and bytes to the calling thread's innermost running stage (if any)."""
+        active = self._active
+        if active:
+            active[-1].count(rows, nbytes)
+
+    def add_shard_stages(self, shard, stages):
+        """Add the stage entries a shard worker recorded in its own RunReport."""
+        for entry in stages:
+            self.stages.append({**entry, "shard": shard})
+
+    def track(self, rows):
+        """``rows`` (tuples or ColumnBlocks), updating the progress line as they stream by."""
+        active = self._active
+        if not self.progress or not active:
+            return rows
+        return self._track(rows, active[-1])
+
+    def _track(self, rows, stage):
+        interactive = sys.stderr.isatty()
+        interval = PROGRESS_INTERVAL if interactive else LOG_PROGRESS_INTERVAL
+        count = 0
+        next_update = stage.started + interval
+        for item in rows:
+            if type(item) is ColumnBlock:
+                count += len(item)
+            else:
+                count += 1
+                if count % _TRACK_BATCH:
+                    yield item
+                    continue
+            now = time.perf_counter()
+            if now >= next_update:
+                elapsed = now - stage.started
+                line = f"  {stage.name}: {count:,} rows, {count / elapsed:,.0f} rows/s, {elapsed:.1f}s"
+                sys.stderr.write(f"\r\033[K{line}" if interactive else line + "\n")
+                sys.stderr.flush()
+                next_update = now + interval
+            yield item
+
+    def as_dict(self, argv=None):
+        wall = time.perf_counter() - self._started
+        return {
+            "generated": generated_at(),
+            "python": platform.python_version(),
+            "argv": list(sys.argv[1:] if argv is None else argv),
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(_cpu_seconds() - self._cpu_started, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+            **self.sections,
+        }
+
+    def write(self, path, argv=None):
+        """Write the JSON run report to ``path``."""
+        path.write_text(json.dumps(self.as_dict(argv), indent=2) + "\n", encoding="utf-8")
+        return path
+
+    def summary_lines(self):
+        """Stage table for the console, slowest first (shard stages are left to the JSON report)."""
+        stages = sorted((entry for entry in self.stages if "shard" not in entry),
+                        key=lambda entry: entry["wall_seconds"], reverse=True)
+        lines = [f"  {'Stage':<38} {'Wall s':>8} {'CPU s':>8} {'Rows':>12} {'Rows/s':>11} {'MB':>9} {'RSS MB':>8}"]
+        for entry in stages:
+            lines.append(
+                f"  {entry['name'][:38]:<38} {entry['wall_seconds']:>8.2f} {entry['cpu_seconds']:>8.2f} "
+                f"{entry['rows']:>12,} {entry['rows_per_second'] or 0:>11,} {entry['bytes'] / (1 << 20):>9.1f} "
+                f"{entry['peak_rss_mb'] if entry['peak_rss_mb'] is not None else '-':>8}"
+            )
+        return lines
@@ -0,0 +1,194 @@
+"""
+OLTP Source Reader
+==================
+Streams rows out of the OLTP data produced by generate_realistic_data.py so
+the OLAP build can transform real source data instead of re-randomizing it.
+
+A source is either a directory of data files or a SQLite database:
+
+- <table>.sql   INSERT / multi-row INSERT statements or COPY ... FROM stdin blocks
+- <table>.tsv   tab-separated text (\\N for NULL)
+- <table>.csv   CSV with a header line (\\N for NULL)
+- *.db / *.sqlite / *.sqlite3   a loaded OLTP database
+
+Data files may also be gzip or zstd compressed (<table>.tsv.gz,
+<table>.sql.zst, ...); they are decompressed as they are read.
+
+Rows are yielded one at a time as tuples in OLTP_COLUMNS order; nothing is
+buffered beyond the current line. Incremental reads pass ``since`` to get only
+the rows at or past a watermark; SQLite sources evaluate it in the query.
+"""
+
+import csv
+import re
+import sqlite3
+from pathlib import Path
+
+from compression import SUFFIXES, data_suffix, open_text_input
+
+# Column order of each OLTP table (matches oltp_schema/oltp_schema.sql)
+OLTP_COLUMNS = {
+    "specialties": ("specialty_id", "specialty_name", "specialty_code"),
+    "departments": ("department_id", "department_name", "floor", "capacity"),
+    "diagnoses": ("diagnosis_id", "icd10_code", "icd10_description"),
+    "procedures": ("procedure_id", "cpt_code", "cpt_description"),
+    "patients": ("patient_id", "first_name", "last_name", "date_of_birth", "gender", "mrn"),
+    "providers": ("provider_id", "first_name", "last_name", "credential", "specialty_id", "department_id"),
+    "encounters": (
+        "encounter_id", "patient_id", "provider_id", "encounter_type",
+        "encounter_date", "discharge_date", "department_id",
+    ),
+    "encounter_diagnoses": ("encounter_diagnosis_id", "encounter_id", "diagnosis_id", "diagnosis_sequence"),
+    "encounter_procedures": ("encounter_procedure_id", "encounter_id", "procedure_id", "procedure_date"),
+    "billing": ("billing_id", "encounter_id", "claim_amount", "allowed_amount", "claim_date", "claim_status"),
+}
+
+DATABASE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Extensions tried, in order, when looking for a table's data file
+FILE_SUFFIXES = (".sql", ".tsv", ".csv")
+
+# Compression suffixes tried after each extension ("" = uncompressed)
+COMPRESSION_SUFFIXES = ("",) + tuple(SUFFIXES.values())
+
+NULL_MARKER = "\\N"
+
+# One parenthesised VALUES tuple (quotes may contain parentheses)
+_TUPLE_RE = re.compile(r"\((?:'(?:[^']|'')*'|[^()'])*\)")
+
+# One value inside a tuple: quoted string, number or keyword
+_VALUE_RE = re.compile(r"'((?:[^']|'')*)'|(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)|(NULL|TRUE|FALSE)", re.IGNORECASE)
+
+_KEYWORDS = {"NULL": None, "TRUE": True, "FALSE": False}
+
+_TEXT_UNESCAPE_RE = re.compile(r"\\(.)")
+_TEXT_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+
+
+def parse_sql_tuple(text):
+    """Parse the body of one ``(...)`` VALUES tuple into Python values."""
+    values = []
+    for string, number, keyword in _VALUE_RE.findall(text):
+        if number:
+            if "." in number or "e" in number or "E" in number:
+                values.append(float(number))
+            else:
+                values.append(int(number))
+        elif keyword:
+            values.append(_KEYWORDS[keyword.upper()])
+        else:
+            values.append(string.replace("''", "'"))
+    return tuple(values)
+
+
+def parse_text_field(field):
+    """Decode one field of the LOAD DATA / COPY text format."""
+    if field == NULL_MARKER:
+        return None
+    if "\\" in field:
+        return _TEXT_UNESCAPE_RE.sub(lambda m: _TEXT_UNESCAPES.get(m.group(1), m.group(1)), field)
+    return field
+
+
+def _read_sql_file(f):
+    in_copy = False
+    for line in f:
+        if in_copy:
+            if line.startswith("\\."):
+                in_copy = False
+                continue
+            yield tuple(parse_text_field(field) for field in line.rstrip("\n").split("\t"))
+        elif line.startswith("COPY "):
+            in_copy = True
+        elif line.startswith("--") or not line.strip():
+            continue
+        else:
+            if line.startswith("INSERT"):
+                # Skip the (optional) column list before VALUES
+                line = line[line.index("VALUES") + len("VALUES"):]
+            for match in _TUPLE_RE.finditer(line):
+                yield parse_sql_tuple(match.group(0)[1:-1])
+
+
+def _read_tsv_file(f):
+    for line in f:
+        yield tuple(parse_text_field(field) for field in line.rstrip("\n").split("\t"))
+
+
+def _read_csv_file(f):
+    reader = csv.reader(f)
+    next(reader, None)  # header line
+    for row in reader:
+        yield tuple(None if value == NULL_MARKER else value for value in row)
+
+
+_FILE_READERS = {".sql": _read_sql_file, ".tsv": _read_tsv_file, ".csv": _read_csv_file}
+
+
+def is_database(source):
+    return Path(source).suffix.lower() in DATABASE_SUFFIXES
+
+
+def find_table_file(source_dir, table_name):
+    """Return the data file for ``table_name`` in ``source_dir``."""
+    for suffix in FILE_SUFFIXES:
+        for compression_suffix in COMPRESSION_SUFFIXES:
+            path = Path(source_dir) / f"{table_name}{suffix}{compression_suffix}"
+            if path.exists():
+                return path
+    raise FileNotFoundError(f"No data file for OLTP table {table_name!r} in {source_dir}")
+
+
+def _since_predicate(table_name, since):
+    """Row filter keeping rows where any ``since`` column is at least its value.
+
+    Values are compared as the watermark's type: ints for ids, strings for
+    ISO dates (a DATETIME's date prefix compares like the date).
+    """
+    bounds = [(OLTP_COLUMNS[table_name].index(column), type(value), value) for column, value in since.items()]
+
+    def predicate(row):
+        for idx, kind, value in bounds:
+            field = row[idx]
+            if field is not None and kind(field) >= value:
+                return True
+        return False
+    return predicate
+
+
+def read_table(source, table_name, since=None):
+    """Yield the rows of an OLTP table as tuples in OLTP_COLUMNS order.
+
+    Text formats yield strings for unquoted values, so callers convert the
+    columns they use (``int(...)``/``float(...)`` accept both forms).
+    ``since`` maps column -> minimum value: only rows where at least one of
+    those columns is at or past its minimum are yielded.
+    """
+    if is_database(source):
+        yield from _read_database_table(source, table_name, since)
+        return
+
+    path = find_table_file(source, table_name)
+    with open_text_input(path) as f:
+        rows = _FILE_READERS[data_suffix(path)](f)
+        if since:
+            rows = filter(_since_predicate(table_name, since), rows)
+        yield from rows
+
+
+def _read_database_table(database, table_name, since=None):
+    columns = ", ".join(OLTP_COLUMNS[table_name])
+    query, params = f"SELECT {columns} FROM {table_name}", ()
+    if since:
+        query += " WHERE " + " OR ".join(f"{column} >= ?" for column in since)
+        params = tuple(since.values())
+    connection = sqlite3.connect(database)
+    try:
+        cursor = connection.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        connection.close()
@@ -0,0 +1,526 @@
+"""
+Bulk-Load Output Formats
+========================
+Shared row writers for the OLTP and OLAP generators.
+
+Generators yield plain value tuples; this module turns them into one of:
+
+- insert:        one INSERT statement per row (the original format)
+- multi-insert:  batched multi-row INSERTs (BATCH_SIZE rows per statement)
+- csv:           RFC 4180 CSV with a header line, for LOAD DATA INFILE / COPY CSV
+- tsv:           tab-separated text (MySQL LOAD DATA / Postgres COPY text format)
+- copy:          psql scripts with inline COPY ... FROM stdin blocks
+
+and writes a matching loader script that loads every table in dependency order.
+Incremental runs also write plain SQL scripts of UPDATE statements
+(write_statements), which the loader scripts run as they are.
+
+Table files can be streamed through gzip or zstd (see compression.py); the
+loaders for such a directory are shell scripts that pipe each file through
+its decompressor into the database client.
+
+A row stream may also yield ColumnBlock chunks (rows given column by column,
+as the vectorized generators produce them); these are rendered a whole column
+at a time instead of value by value. A block column may be a
+dictionary_encoding.DictionaryColumn, whose distinct values are rendered once.
+
+write_table drains one row stream into one file. A producer that feeds
+several tables in a single pass (the OLAP fact stream writes both bridge
+tables as it goes) pushes rows into a TableWriter per table instead.
+"""
+
+import csv
+import os
+import re
+from datetime import datetime, timezone
+
+from compression import DECOMPRESS_COMMANDS, compressed_name, compression_of, open_text_output
+from dictionary_encoding import DictionaryColumn
+
+FORMATS = ("insert", "multi-insert", "csv", "tsv", "copy")
+
+FILE_EXTENSIONS = {
+    "insert": ".sql",
+    "multi-insert": ".sql",
+    "csv": ".csv",
+    "tsv": ".tsv",
+    "copy": ".sql",
+}
+
+FORMAT_LABELS = {
+    "insert": "INSERT statements",
+    "multi-insert": "multi-row INSERT statements",
+    "csv": "CSV",
+    "tsv": "TSV",
+    "copy": "COPY data",
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+# NULL marker understood by both LOAD DATA (default ESCAPED BY '\\') and COPY
+NULL_MARKER = "\\N"
+
+_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def sql_literal(value):
+    """Render a Python value as a SQL literal."""
+    if value is None:
+        return "NULL"
+    if value is True:
+        return "TRUE"
+    if value is False:
+        return "FALSE"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+
+def text_field(value):
+    """Render a value for the tab-separated text format (LOAD DATA / COPY)."""
+    if value is None:
+        return NULL_MARKER
+    if value is True:
+        return "1"
+    if value is False:
+        return "0"
+    if isinstance(value, str):
+        return value.translate(_TEXT_ESCAPES)
+    return str(value)
+
+
+def csv_field(value):
+    """Render a value for CSV; quoting is left to the csv module."""
+    if value is None:
+        return NULL_MARKER
+    if value is True:
+        return "1"
+    if value is False:
+        return "0"
+    return value
+
+
+class ColumnBlock:
+    """A chunk of rows given as equal-length column lists, in table column order."""
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+
+_NUMBER_TYPES = {int, float}
+_CSV_NATIVE_TYPES = {int, float, str}
+_TEXT_SPECIALS = ("\\", "\t", "\n", "\r")
+_quote_plain_sql = "'{}'".format
+
+
+def _quote_sql(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _text_strings(values):
+    """Escape a str column for the text format (untouched if nothing needs escaping)."""
+    blob = "".join(values)
+    if any(special in blob for special in _TEXT_SPECIALS):
+        return [value.translate(_TEXT_ESCAPES) for value in values]
+    return values
+
+
+def _sql_strings(values):
+    """Quote a str column as SQL literals."""
+    if "'" in "".join(values):
+        return map(_quote_sql, values)
+    return map(_quote_plain_sql, values)
+
+
+def _render_column(values, field, render_strings):
+    """Render one column of a ColumnBlock, choosing a bulk path by value type."""
+    if type(values) is DictionaryColumn:
+        rendered = list(_render_column(values.values, field, render_strings))
+        return map(rendered.__getitem__, values.codes)
+    kinds = set(map(type, values))
+    if kinds <= _NUMBER_TYPES:
+        return map(str, values)
+    if kinds == {str}:
+        return render_strings(values)
+    return map(field, values)
+
+
+def _block_lines(block, field, render_strings, separator):
+    """The rows of a ColumnBlock as rendered, ``separator``-joined strings."""
+    columns = [_render_column(values, field, render_strings) for values in block.columns]
+    return map(separator.join, zip(*columns))
+
+
+def output_filename(filename, fmt, compression="none"):
+    """Swap the extension of a generator's ``*.sql`` filename for ``fmt`` (plus the codec's)."""
+    stem = filename.rsplit(".", 1)[0]
+    return compressed_name(stem + FILE_EXTENSIONS[fmt], compression)
+
+
+def generated_at():
+    """Timestamp for file banners; honours SOURCE_DATE_EPOCH for reproducible builds."""
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch:
+        return datetime.fromtimestamp(int(epoch), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _write_banner(f, label, description, total_rows):
+    f.write(f"-- ============================================================================\n")
+    f.write(f"-- {label} - {description}\n")
+    f.write(f"-- ============================================================================\n")
+    f.write(f"-- Generated: {generated_at()}\n")
+    if total_rows is not None:
+        f.write(f"-- Total rows: {total_rows:,}\n")
+    f.write(f"-- ============================================================================\n\n")
+
+
+def _write_inserts(f, table_name, rows):
+    prefix = f"INSERT INTO {table_name} VALUES ("
+    written = 0
+    for row in rows:
+        if type(row) is ColumnBlock:
+            f.writelines(prefix + values + ");\n" for values in _block_lines(row, sql_literal, _sql_strings, ", "))
+            written += len(row)
+            continue
+        f.write(prefix + ", ".join(map(sql_literal, row)) + ");\n")
+        written += 1
+    return written
+
+
+def _multi_insert(table_name, columns, values):
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES\n" + ",\n".join(values) + ";\n"
+
+
+def _write_multi_inserts(f, table_name, columns, rows, batch_size, pending=None):
+    """Write full batches of ``rows``; with ``pending`` (a list), a final partial
+    batch is left in it for the next call instead of being written."""
+    written = 0
+    batch = [] if pending is None else pending
+    for row in rows:
+        if type(row) is ColumnBlock:
+            batch.extend("(" + values + ")" for values in _block_lines(row, sql_literal, _sql_strings, ", "))
+        else:
+            batch.append("(" + ", ".join(map(sql_literal, row)) + ")")
+        while len(batch) >= batch_size:
+            f.write(_multi_insert(table_name, columns, batch[:batch_size]))
+            written += batch_size
+            del batch[:batch_size]
+    if batch and pending is None:
+        f.write(_multi_insert(table_name, columns, batch))
+        written += len(batch)
+    return written
+
+
+def _write_text_rows(f, rows):
+    written = 0
+    for row in rows:
+        if type(row) is ColumnBlock:
+            f.write("\n".join(_block_lines(row, text_field, _text_strings, "\t")) + "\n")
+            written += len(row)
+            continue
+        f.write("\t".join(map(text_field, row)) + "\n")
+        written += 1
+    return written
+
+
+def _csv_column(values):
+    if type(values) is DictionaryColumn:
+        return map(_csv_column(values.values).__getitem__, values.codes)
+    return values if set(map(type, values)) <= _CSV_NATIVE_TYPES else list(map(csv_field, values))
+
+
+def _write_csv_rows(f, rows):
+    writer = csv.writer(f, lineterminator="\n")
+    written = 0
+    for row in rows:
+        if type(row) is ColumnBlock:
+            columns = [_csv_column(values) for values in row.columns]
+            writer.writerows(zip(*columns))
+            written += len(row)
+            continue
+        writer.writerow([csv_field(value) for value in row])
+        written += 1
+    return written
+
+
+def write_prologue(f, label, table_name, columns, fmt, total_rows=None):
+    """Write everything that precedes the rows of a table file."""
+    if fmt == "csv":
+        csv.writer(f, lineterminator="\n").writerow(columns)
+    elif fmt != "tsv":
+        _write_banner(f, label, FORMAT_LABELS[fmt], total_rows)
+        if fmt == "copy":
+            f.write(f"COPY {table_name} ({', '.join(columns)}) FROM stdin;\n")
+
+
+def write_rows(f, table_name, columns, rows, fmt="insert", batch_size=DEFAULT_BATCH_SIZE):
+    """Write the body of a table file (no banner); returns the row count.
+
+    Bodies of the same table and format can be concatenated, which is how
+    sharded runs assemble their part files.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if fmt == "insert":
+        return _write_inserts(f, table_name, rows)
+    if fmt == "multi-insert":
+        return _write_multi_inserts(f, table_name, columns, rows, batch_size)
+    if fmt == "csv":
+        return _write_csv_rows(f, rows)
+    return _write_text_rows(f, rows)
+
+
+def write_epilogue(f, fmt, written, total_rows=None):
+    """Write everything that follows the rows of a table file."""
+    if fmt == "copy":
+        f.write("\\.\n")
+    if fmt in ("csv", "tsv"):
+        return
+    if total_rows is None:
+        f.write(f"\n-- Total rows: {written:,}\n")
+
+
+def write_table(filepath, label, table_name, columns, rows, fmt="insert",
+                batch_size=DEFAULT_BATCH_SIZE, total_rows=None, compression="none", level=None):
+    """Drain ``rows`` (value tuples) into ``filepath`` in the given format.
+
+    SQL formats get the usual comment banner headed by ``label``; when
+    ``total_rows`` is not known up front the row count is written as a
+    trailing comment instead. ``compression`` streams the file through
+    gzip or zstd at ``level``. Returns the number of rows written.
+    """
+    with TableWriter(filepath, label, table_name, columns, fmt, batch_size, total_rows, compression, level) as writer:
+        writer.write(rows)
+    return writer.written
+
+
+class TableWriter:
+    """A table file filled by any number of ``write`` calls, for producers that
+    feed several tables at once.
+
+    The file is finished on ``close`` (or on leaving a ``with`` block);
+    multi-insert batches run on across calls. ``framed`` False writes the
+    body only (no banner, COPY header or CSV header), as for shard parts.
+    Other arguments are as for write_table.
+    """
+
+    __slots__ = ("f", "table_name", "columns", "fmt", "batch_size", "total_rows", "framed", "written", "_pending")
+
+    def __init__(self, filepath, label, table_name, columns, fmt="insert", batch_size=DEFAULT_BATCH_SIZE,
+                 total_rows=None, compression="none", level=None, framed=True):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown output format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        self.table_name = table_name
+        self.columns = columns
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.total_rows = total_rows
+        self.framed = framed
+        self.written = 0
+        self._pending = []
+        self.f = open_text_output(filepath, compression, level)
+        if framed:
+            write_prologue(self.f, label, table_name, columns, fmt, total_rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, rows):
+        """Append ``rows`` (value tuples or ColumnBlocks)."""
+        if self.fmt == "multi-insert":
+            self.written += _write_multi_inserts(
+                self.f, self.table_name, self.columns, rows, self.batch_size, self._pending
+            )
+        else:
+            self.written += write_rows(self.f, self.table_name, self.columns, rows, self.fmt, self.batch_size)
+
+    def close(self):
+        """Finish and close the file; returns the number of rows written."""
+        if self.f.closed:
+            return self.written
+        if self._pending:
+            self.f.write(_multi_insert(self.table_name, self.columns, self._pending))
+            self.written += len(self._pending)
+            self._pending = []
+        if self.framed:
+            write_epilogue(self.f, self.fmt, self.written, self.total_rows)
+        self.f.close()
+        return self.written
+
+
+# =============================================================================
+# UPDATE SCRIPTS
+# =============================================================================
+
+def update_statement(table_name, key_column, key, columns, values, increment=False):
+    """Render an UPDATE of the row whose ``key_column`` equals ``key``.
+
+    ``increment`` adds ``values`` to the current column values instead of
+    replacing them (for additive measures).
+    """
+    if increment:
+        assignments = ", ".join(f"{c} = {c} + {sql_literal(v)}" for c, v in zip(columns, values))
+    else:
+        assignments = ", ".join(f"{c} = {sql_literal(v)}" for c, v in zip(columns, values))
+    return f"UPDATE {table_name} SET {assignments} WHERE {key_column} = {sql_literal(key)};"
+
+
+def write_statements(filepath, label, statements):
+    """Write a SQL script of ``statements`` (one per line); returns the statement count."""
+    with open(filepath, "w", encoding="utf-8", newline="") as f:
+        _write_banner(f, label, "SQL statements", None)
+        written = 0
+        for statement in statements:
+            f.write(statement + "\n")
+            written += 1
+        f.write(f"\n-- Total statements: {written:,}\n")
+    return written
+
+
+# =============================================================================
+# LOADER SCRIPTS
+# =============================================================================
+
+def _mysql_loader(tables, fmt):
+    lines = [
+        "-- Load every table in dependency order. Run from this directory:",
+        "--   mysql --local-infile=1 <database> < load_mysql.sql",
+        "SET FOREIGN_KEY_CHECKS = 0;",
+        "SET UNIQUE_CHECKS = 0;",
+        "SET autocommit = 0;",
+        "",
+    ]
+    for table_name, filename, columns in tables:
+        if columns is None or fmt in ("insert", "multi-insert"):
+            lines.append(f"SOURCE {filename};")
+        elif fmt == "tsv":
+            lines.append(
+                f"LOAD DATA LOCAL INFILE '{filename}' INTO TABLE {table_name}\n"
+                f"    FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'\n"
+                f"    ({', '.join(columns)});"
+            )
+        else:  # csv
+            lines.append(
+                f"LOAD DATA LOCAL INFILE '{filename}' INTO TABLE {table_name}\n"
+                f"    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n'\n"
+                f"    IGNORE 1 LINES ({', '.join(columns)});"
+            )
+        lines.append("COMMIT;")
+    lines += ["", "SET UNIQUE_CHECKS = 1;", "SET FOREIGN_KEY_CHECKS = 1;", "SET autocommit = 1;"]
+    return "\n".join(lines) + "\n"
+
+
+def _postgres_loader(tables, fmt):
+    lines = [
+        "-- Load every table in dependency order. Run from this directory:",
+        "--   psql -v ON_ERROR_STOP=1 -d <database> -f load_postgres.sql",
+        "\\set ON_ERROR_STOP on",
+        "",
+    ]
+    for table_name, filename, columns in tables:
+        column_list = ", ".join(columns or ())
+        if columns is None or fmt in ("insert", "multi-insert", "copy"):
+            lines.append(f"BEGIN;\n\\i {filename}\nCOMMIT;")
+        elif fmt == "tsv":
+            lines.append(f"\\copy {table_name} ({column_list}) FROM '{filename}' WITH (FORMAT text)")
+        else:  # csv
+            lines.append(
+                f"\\copy {table_name} ({column_list}) FROM '{filename}' "
+                f"WITH (FORMAT csv, HEADER true, NULL '\\N')"
+            )
+    return "\n".join(lines) + "\n"
+
+
+_MYSQL_SESSION = "SET FOREIGN_KEY_CHECKS = 0; SET UNIQUE_CHECKS = 0; SET autocommit = 0;"
+
+_SHELL_SPECIAL_RE = re.compile(r'(["\\$`])')
+
+
+def _shell_escape(text):
+    """Escape ``text`` for use inside a double-quoted shell word (SQL quotes stay readable)."""
+    return _SHELL_SPECIAL_RE.sub(r"\\\1", text)
+
+
+def _shell_header(usage):
+    return [
+        "#!/usr/bin/env bash",
+        "# Load every table in dependency order, streaming compressed files through",
+        "# their decompressor. Run from anywhere:",
+        f"#   {usage}",
+        "set -euo pipefail",
+        'cd "$(dirname "$0")"',
+        "",
+    ]
+
+
+def _mysql_shell_loader(tables, fmt):
+    lines = _shell_header("./load_mysql.sh [mysql options] <database>")
+    lines.append(f'SESSION="{_MYSQL_SESSION}"')
+    for table_name, filename, columns in tables:
+        reader = f"{DECOMPRESS_COMMANDS[compression_of(filename)]} {filename}"
+        if columns is None or fmt in ("insert", "multi-insert"):
+            lines.append(f'{{ echo "$SESSION"; {reader}; echo "COMMIT;"; }} | mysql "$@"')
+            continue
+        if fmt == "tsv":
+            fields = "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'"
+        else:  # csv
+            fields = "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' IGNORE 1 LINES"
+        load = (
+            f"LOAD DATA LOCAL INFILE '/dev/stdin' INTO TABLE {table_name} {fields} "
+            f"({', '.join(columns)}); COMMIT;"
+        )
+        lines.append(f'{reader} | mysql --local-infile=1 "$@" -e "$SESSION {_shell_escape(load)}"')
+    return "\n".join(lines) + "\n"
+
+
+def _postgres_shell_loader(tables, fmt):
+    lines = _shell_header("./load_postgres.sh [psql options] -d <database>")
+    for table_name, filename, columns in tables:
+        reader = f"{DECOMPRESS_COMMANDS[compression_of(filename)]} {filename}"
+        if columns is None or fmt in ("insert", "multi-insert", "copy"):
+            lines.append(f'{{ echo "BEGIN;"; {reader}; echo "COMMIT;"; }} | psql -v ON_ERROR_STOP=1 -q "$@"')
+            continue
+        if fmt == "tsv":
+            options = "FORMAT text"
+        else:  # csv
+            options = "FORMAT csv, HEADER true, NULL '\\N'"
+        copy = f"\\copy {table_name} ({', '.join(columns)}) FROM pstdin WITH ({options})"
+        lines.append(f'{reader} | psql -v ON_ERROR_STOP=1 "$@" -c "{_shell_escape(copy)}"')
+    return "\n".join(lines) + "\n"
+
+
+def write_loader_scripts(output_dir, tables, fmt):
+    """Write loader script(s) for ``tables`` [(table_name, filename, columns)].
+
+    Entries whose ``columns`` is None are SQL scripts (see write_statements)
+    and are run as they are, whatever the data format.
+
+    COPY output is psql-only; every other format gets both a MySQL and a
+    Postgres loader. The loaders are SQL scripts for the clients, or shell
+    scripts (load_*.sh) when any file is compressed. Returns the paths written.
+    """
+    compressed = any(compression_of(filename) != "none" for _, filename, _ in tables)
+    if compressed:
+        scripts = [("load_mysql.sh", _mysql_shell_loader), ("load_postgres.sh", _postgres_shell_loader)]
+    else:
+        scripts = [("load_mysql.sql", _mysql_loader), ("load_postgres.sql", _postgres_loader)]
+    if fmt == "copy":
+        scripts = scripts[1:]
+
+    written = []
+    for name, render in scripts:
+        path = output_dir / name
+        path.write_text(render(tables, fmt), encoding="utf-8")
+        if compressed:
+            path.chmod(0o755)
+        written.append(path)
+    return written
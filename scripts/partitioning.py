@@ -0,0 +1,199 @@
+"""
+Monthly Partitions
+==================
+Year/month partitioned output of the fact and bridge tables
+(``--partition-by month`` on generate_olap_data.py).
+
+Fact rows are routed by their encounter_date_key (YYYYMMDD) into one file per
+encounter month, partitions/fact_encounters.pYYYY_MM.<ext>. Bridge rows carry
+no date of their own (a procedure may fall in the next month), so they are
+routed by their encounter's month through an encounter_key -> YYYYMM lookup
+and land in partitions/bridge_*.pYYYY_MM.<ext>: a month of the fact and its
+bridges loads as one unit, one month per worker. Every file is a complete
+loadable file in the selected format; manifest.json lists them with their
+partition, as it lists kept shard parts.
+
+partition_ddl writes the matching MySQL ``PARTITION BY RANGE
+(encounter_date_key)`` DDL (olap_schema/star_schema_partitioning.sql for the
+default calendar), whose partition names are the file suffixes, so a query
+over one month prunes to one partition.
+"""
+
+from dictionary_encoding import DictionaryColumn
+from output_formats import ColumnBlock
+
+PARTITIONS_DIRNAME = "partitions"
+
+PARTITIONINGS = ("none", "month")
+
+# Partitioned tables: the fact by its own date key, the bridges by their encounter
+PARTITIONED_TABLES = ("fact_encounters", "bridge_encounter_diagnoses", "bridge_encounter_procedures")
+
+# Rows collected per partition before they are handed to its writer
+ROUTE_BATCH_ROWS = 1024
+
+# Foreign keys to drop, by their number in star_schema.sql (InnoDB names them
+# <table>_ibfk_<n>): all of the fact's, and the bridges' references to the fact
+_FOREIGN_KEYS = {
+    "bridge_encounter_diagnoses": (1,),
+    "bridge_encounter_procedures": (1,),
+    "fact_encounters": range(1, 9),
+}
+
+
+def date_key_month(date_key):
+    """YYYYMM of a YYYYMMDD date key."""
+    return date_key // 100
+
+
+def partition_name(month):
+    """Partition (and file suffix) of YYYYMM ``month``, e.g. p2024_03."""
+    return f"p{month // 100}_{month % 100:02d}"
+
+
+def partition_filename(filename, month):
+    """<table>.pYYYY_MM.<ext> for a table file name such as fact_encounters.tsv.gz
+    (the files go to the partitions/ directory)."""
+    stem, extension = filename.split(".", 1)
+    return f"{stem}.{partition_name(month)}.{extension}"
+
+
+def _take(values, positions):
+    if type(values) is DictionaryColumn:
+        return values.take(positions)
+    return [values[i] for i in positions]
+
+
+class PartitionedWriter:
+    """Routes a table's rows into one writer per month, opened on first use.
+
+    ``open_writer(month)`` returns a TableWriter (or anything with
+    ``write``/``close``/``written``); the month of a row is
+    ``month_of(row[column])``. ColumnBlocks are split column-wise (a
+    DictionaryColumn by its codes).
+    """
+
+    __slots__ = ("open_writer", "column", "month_of", "writers")
+
+    def __init__(self, open_writer, column, month_of=date_key_month):
+        self.open_writer = open_writer
+        self.column = column
+        self.month_of = month_of
+        self.writers = {}
+
+    def _writer(self, month):
+        writer = self.writers.get(month)
+        if writer is None:
+            writer = self.writers[month] = self.open_writer(month)
+        return writer
+
+    def write(self, rows):
+        """Append ``rows`` (value tuples or ColumnBlocks) to their partitions."""
+        column, month_of = self.column, self.month_of
+        pending = {}
+        for item in rows:
+            if type(item) is ColumnBlock:
+                self._write_block(item)
+                continue
+            month = month_of(item[column])
+            batch = pending.get(month)
+            if batch is None:
+                batch = pending[month] = []
+            batch.append(item)
+            if len(batch) >= ROUTE_BATCH_ROWS:
+                self._writer(month).write(batch)
+                pending[month] = []
+        for month, batch in pending.items():
+            if batch:
+                self._writer(month).write(batch)
+
+    def _write_block(self, block):
+        positions = {}
+        for position, value in enumerate(block.columns[self.column]):
+            month = self.month_of(value)
+            group = positions.get(month)
+            if group is None:
+                group = positions[month] = []
+            group.append(position)
+        if len(positions) == 1:
+            self._writer(next(iter(positions))).write([block])
+            return
+        for month, group in positions.items():
+            self._writer(month).write([ColumnBlock([_take(values, group) for values in block.columns])])
+
+    @property
+    def written(self):
+        return sum(writer.written for writer in self.writers.values())
+
+    @property
+    def partitions(self):
+        """{month: rows written}, in month order."""
+        return {month: self.writers[month].written for month in sorted(self.writers)}
+
+    def close(self):
+        """Finish every partition file; returns the total rows written."""
+        for writer in self.writers.values():
+            writer.close()
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _months(first_month, last_month):
+    year, month = divmod(first_month, 100)
+    while year * 100 + month <= last_month:
+        yield year * 100 + month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def partition_ddl(first_month, last_month):
+    """MySQL DDL partitioning star_schema.sql's fact_encounters by month of
+    encounter_date_key, ``first_month`` .. ``last_month`` (YYYYMM), with
+    catch-all partitions on either side."""
+    first, last = f"{first_month // 100}-{first_month % 100:02d}", f"{last_month // 100}-{last_month % 100:02d}"
+    foreign_keys = {
+        table: ", ".join(f"DROP FOREIGN KEY {table}_ibfk_{n}" for n in numbers)
+        for table, numbers in _FOREIGN_KEYS.items()
+    }
+    lines = [
+        "-- " + "=" * 76,
+        "-- FACT_ENCOUNTERS MONTHLY RANGE PARTITIONS (run after star_schema.sql)",
+        "-- " + "=" * 76,
+        f"-- Generated by generate_olap_data.py --partition-by month for {first} .. {last}.",
+        "-- One partition per month of encounter_date_key (YYYYMMDD), named like the",
+        "-- partitions/fact_encounters.pYYYY_MM data files, so each file loads into one",
+        "-- partition and a query over one month only reads that partition.",
+        "--",
+        "-- MySQL requires the partitioning column in every unique key of a partitioned",
+        "-- table and supports no foreign keys to or from partitioned InnoDB tables:",
+        "-- the primary key becomes (encounter_key, encounter_date_key), encounter_id",
+        "-- is unique together with its date, and the foreign keys of the fact and of",
+        "-- the bridges that reference it are dropped (the ETL resolves every key).",
+        "-- The bridges have no encounter date to partition on; their data files are",
+        "-- split by their encounter's month so a month of fact and bridges loads as a unit.",
+        "-- " + "=" * 76,
+        "",
+        f"ALTER TABLE bridge_encounter_diagnoses {foreign_keys['bridge_encounter_diagnoses']};",
+        f"ALTER TABLE bridge_encounter_procedures {foreign_keys['bridge_encounter_procedures']};",
+        "ALTER TABLE fact_encounters",
+        "    " + foreign_keys["fact_encounters"].replace(", ", ",\n    ") + ";",
+        "ALTER TABLE fact_encounters",
+        "    DROP INDEX encounter_id,",
+        "    ADD UNIQUE KEY uk_fact_encounter_id (encounter_id, encounter_date_key),",
+        "    DROP PRIMARY KEY,",
+        "    ADD PRIMARY KEY (encounter_key, encounter_date_key);",
+        "",
+        "ALTER TABLE fact_encounters",
+        "PARTITION BY RANGE (encounter_date_key) (",
+        f"    PARTITION p_before VALUES LESS THAN ({first_month * 100 + 1}),",
+    ]
+    for month in _months(first_month, last_month):
+        year, number = divmod(month, 100)
+        bound = (year + 1) * 10000 + 101 if number == 12 else month * 100 + 101
+        lines.append(f"    PARTITION {partition_name(month)} VALUES LESS THAN ({bound}),")
+    lines += ["    PARTITION p_after VALUES LESS THAN MAXVALUE", ");", ""]
+    return "\n".join(lines)
@@ -0,0 +1,173 @@
+"""
+30-Day Readmission Engine
+=========================
+Flags inpatient readmissions by sort-and-sweep instead of comparing every
+stay with every earlier stay of the same patient.
+
+A stay is a (patient_key, admit_seconds, discharge_seconds, encounter_key)
+tuple, with times in seconds since proleptic ordinal day 0 (day granularity
+inputs just pass ``ordinal * 86400``). Stays are sorted by
+(patient, admit, discharge, encounter key) and swept once: each stay is compared
+with the same patient's previous stay only, matching
+
+    LAG(discharge_date) OVER (PARTITION BY patient ORDER BY encounter_date)
+
+from etl_design.txt. The result does not depend on the order stays arrive in.
+
+Inputs larger than ``run_size`` stays are sorted externally: sorted runs are
+spilled to temporary files and k-way merged, so memory stays bounded.
+
+Run standalone to flag readmissions in OLTP data (files or SQLite):
+
+    python scripts/readmission.py --oltp-path data/oltp --output readmissions.csv
+"""
+
+import argparse
+import csv
+import heapq
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from calendar_table import SECONDS_PER_DAY
+from oltp_source import read_table
+
+READMISSION_WINDOW_DAYS = 30
+
+# Stays held in memory before a sorted run is spilled to disk
+DEFAULT_RUN_SIZE = 1_000_000
+
+_STAY = struct.Struct("<qqqq")
+_READ_BATCH = 4096
+
+
+def _write_run(path, stays):
+    stays.sort()
+    with open(path, "wb") as f:
+        for stay in stays:
+            f.write(_STAY.pack(*stay))
+    return path
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(_STAY.size * _READ_BATCH)
+            if not block:
+                break
+            yield from _STAY.iter_unpack(block)
+
+
+def sort_stays(stays, run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """Yield ``stays`` sorted by (patient, admit time, discharge time, encounter key).
+
+    Sorts in memory when the input fits in one run; otherwise spills sorted
+    runs of ``run_size`` stays to a temporary directory and merges them.
+    """
+    run = []
+    with tempfile.TemporaryDirectory(prefix="readmission-", dir=tmp_dir) as directory:
+        runs = []
+        for stay in stays:
+            run.append((stay[0], stay[1], stay[2], stay[3]))
+            if len(run) >= run_size:
+                runs.append(_write_run(Path(directory) / f"run-{len(runs):05d}.bin", run))
+                run = []
+        if not runs:
+            run.sort()
+            yield from run
+            return
+        if run:
+            runs.append(_write_run(Path(directory) / f"run-{len(runs):05d}.bin", run))
+            run = []
+        yield from heapq.merge(*(_read_run(path) for path in runs))
+
+
+def sweep(sorted_stays, window_days=READMISSION_WINDOW_DAYS):
+    """Yield (encounter_key, days since previous discharge) for each readmission.
+
+    ``sorted_stays`` must be ordered by patient, then admit time.
+    """
+    prev_patient = None
+    prev_discharge_day = 0
+    for patient_key, admit, discharge, encounter_key in sorted_stays:
+        if patient_key == prev_patient:
+            days = admit // SECONDS_PER_DAY - prev_discharge_day
+            if 0 < days <= window_days:
+                yield encounter_key, days
+        prev_patient = patient_key
+        prev_discharge_day = discharge // SECONDS_PER_DAY
+
+
+def find_readmissions(stays, window_days=READMISSION_WINDOW_DAYS, run_size=DEFAULT_RUN_SIZE, tmp_dir=None):
+    """Return {encounter_key: days since previous discharge} for every readmission."""
+    return dict(sweep(sort_stays(stays, run_size, tmp_dir), window_days))
+
+
+# =============================================================================
+# OLTP SOURCE
+# =============================================================================
+
+def parse_seconds(value):
+    """'YYYY-MM-DD[ HH:MM:SS]' -> seconds since ordinal day 0 (None if missing)."""
+    if value is None or value == "":
+        return None
+    moment = datetime.fromisoformat(str(value))
+    return moment.toordinal() * SECONDS_PER_DAY + moment.hour * 3600 + moment.minute * 60 + moment.second
+
+
+def oltp_inpatient_stays(source):
+    """Yield a stay for every inpatient encounter with a discharge date in OLTP ``source``."""
+    for encounter_id, patient_id, _, encounter_type, admitted, discharged, _ in read_table(source, "encounters"):
+        if encounter_type != "Inpatient":
+            continue
+        admit, discharge = parse_seconds(admitted), parse_seconds(discharged)
+        if admit is None or discharge is None:
+            continue
+        yield int(patient_id), admit, discharge, int(encounter_id)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Flag 30-day inpatient readmissions in OLTP data.")
+    parser.add_argument("--oltp-path", type=Path, default=Path(__file__).parent.parent / "data" / "oltp",
+                        help="OLTP data directory or SQLite database (default: data/oltp)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="write encounter_id,days_since_last_discharge CSV here (default: summary only)")
+    parser.add_argument("--window-days", type=int, default=READMISSION_WINDOW_DAYS,
+                        help="readmission window in days (default: %(default)s)")
+    parser.add_argument("--run-size", type=int, default=DEFAULT_RUN_SIZE,
+                        help="stays sorted in memory before spilling a run to disk (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    num_stays = 0
+
+    def counted(stays):
+        nonlocal num_stays
+        for stay in stays:
+            num_stays += 1
+            yield stay
+
+    readmissions = sweep(sort_stays(counted(oltp_inpatient_stays(args.oltp_path)), args.run_size), args.window_days)
+    num_readmissions = 0
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(("encounter_id", "days_since_last_discharge"))
+            for row in readmissions:
+                writer.writerow(row)
+                num_readmissions += 1
+    else:
+        num_readmissions = sum(1 for _ in readmissions)
+
+    rate = num_readmissions * 100.0 / num_stays if num_stays else 0.0
+    print(f"  Inpatient stays: {num_stays:,}")
+    print(f"  Readmissions:    {num_readmissions:,} ({rate:.2f}% within {args.window_days} days)")
+    if args.output:
+        print(f"  [OK] {args.output}")
+
+
+if __name__ == "__main__":
+    main()
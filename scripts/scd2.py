@@ -0,0 +1,93 @@
+"""
+Slowly Changing Dimensions (Type 2)
+===================================
+Hash-based change detection for versioned dimensions such as dim_patient.
+
+Each incoming row's tracked attributes are reduced to a 64-bit hash and
+compared with a persisted natural key -> (current surrogate key, row hash)
+map. The map is held as three sorted typed arrays (24 bytes per entity),
+loaded with one ordered query and binary-searched in memory, so checking
+millions of rows is a single streaming pass with no per-row database
+lookups. Only changes produce output:
+
+- new natural key:  a version row (new surrogate key, is_current)
+- changed hash:     the current version is expired and a new version row
+                    gets the next surrogate key
+- unchanged:        nothing; the current surrogate key is reused
+"""
+
+from array import array
+from bisect import bisect_left
+
+from etl_state import row_hash
+
+
+class VersionMap:
+    """Natural id -> (current surrogate key, row hash) of a versioned dimension.
+
+    ``entries`` are (natural id, key, hash) sorted by natural id, as
+    EtlState.iter_dimension_keys yields them; ids set during a run are kept
+    in ``changes`` (and are what needs saving afterwards).
+    """
+
+    __slots__ = ("natural_ids", "keys", "hashes", "changes", "max_key")
+
+    def __init__(self, entries=()):
+        self.natural_ids, self.keys, self.hashes = array("q"), array("q"), array("q")
+        for natural_id, key, digest in entries:
+            self.natural_ids.append(natural_id)
+            self.keys.append(key)
+            self.hashes.append(digest)
+        self.changes = {}
+        self.max_key = max(self.keys, default=0)
+
+    def _find(self, natural_id):
+        idx = bisect_left(self.natural_ids, natural_id)
+        if idx < len(self.natural_ids) and self.natural_ids[idx] == natural_id:
+            return idx
+        return -1
+
+    def get(self, natural_id):
+        """Current (surrogate key, row hash) of ``natural_id``, or None if unseen."""
+        current = self.changes.get(natural_id)
+        if current is not None:
+            return current
+        idx = self._find(natural_id)
+        return None if idx < 0 else (self.keys[idx], self.hashes[idx])
+
+    def set(self, natural_id, key, digest):
+        self.changes[natural_id] = (key, digest)
+        self.max_key = max(self.max_key, key)
+
+    def changed_entries(self):
+        """(natural id, key, hash) of every id set since the map was loaded."""
+        return ((natural_id, key, digest) for natural_id, (key, digest) in self.changes.items())
+
+
+class Scd2Processor:
+    """Assigns surrogate keys to incoming rows of one SCD2 dimension.
+
+    Call it with (natural id, tracked attributes) per incoming row; it
+    returns (current surrogate key, True if a new version starts). Keys of
+    superseded versions are collected in ``expired``.
+    """
+
+    __slots__ = ("versions", "effective_date", "next_key", "expired")
+
+    def __init__(self, versions, effective_date):
+        self.versions = versions
+        self.effective_date = effective_date
+        self.next_key = versions.max_key + 1
+        self.expired = []
+
+    def __call__(self, natural_id, attributes):
+        digest = row_hash(attributes)
+        current = self.versions.get(natural_id)
+        if current is not None and current[1] == digest:
+            return current[0], False
+        if current is not None:
+            self.expired.append(current[0])
+        key = self.next_key
+        self.next_key += 1
+        self.versions.set(natural_id, key, digest)
+        return key, True
@@ -0,0 +1,161 @@
+"""
+Sharded Parallel Generation
+===========================
+Helpers for splitting a table into ID-range shards that worker processes
+generate independently.
+
+Determinism rules:
+- Every (table, shard) pair draws from its own random.Random seeded by
+  derive_seed(seed, table, shard), so a shard's rows never depend on which
+  worker ran it or in what order shards finished.
+- Shard boundaries depend only on the row count and the shard count.
+- Part files are merged (or listed in the manifest) in shard order.
+- Compressed parts are merged by copying their bytes between a separately
+  compressed prologue and epilogue; gzip and zstd readers treat the
+  concatenated streams as one file.
+
+Together these make the output byte-identical for a given seed, scale and
+shard count, whatever the number of worker processes.
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from compression import compress_text, compressed_name
+from output_formats import FILE_EXTENSIONS, TableWriter, write_epilogue, write_prologue
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def derive_seed(seed, table, shard):
+    """Derive an independent 64-bit seed for one shard of one table."""
+    digest = hashlib.sha256(f"{seed}:{table}:{shard}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def shard_random(seed, table, shard):
+    """Independent random.Random for one shard of one table."""
+    return random.Random(derive_seed(seed, table, shard))
+
+
+def shard_ranges(total, num_shards, start=1):
+    """Split ids ``start .. start + total - 1`` into ``num_shards`` contiguous ranges.
+
+    Ranges differ in size by at most one; empty ranges are dropped.
+    """
+    size, extra = divmod(total, num_shards)
+    ranges = []
+    lo = start
+    for shard in range(num_shards):
+        hi = lo + size + (1 if shard < extra else 0)
+        if hi > lo:
+            ranges.append(range(lo, hi))
+        lo = hi
+    return ranges
+
+
+def run_parallel(task, args, workers=None, on_result=None):
+    """Run ``task`` over ``args`` in a process pool; results are in ``args`` order.
+
+    ``on_result(position, result)`` is called in this process as each task
+    finishes (e.g. to checkpoint it), in completion order.
+    """
+    workers = workers or os.cpu_count() or 1
+    results = [None] * len(args)
+    if workers == 1 or len(args) <= 1:
+        for position, arg in enumerate(args):
+            results[position] = task(arg)
+            if on_result is not None:
+                on_result(position, results[position])
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(args))) as pool:
+        futures = {pool.submit(task, arg): position for position, arg in enumerate(args)}
+        for future in as_completed(futures):
+            position = futures[future]
+            results[position] = future.result()
+            if on_result is not None:
+                on_result(position, results[position])
+    return results
+
+
+def part_path(parts_dir, filename, shard, fmt, compression="none"):
+    """Path of one shard's part file, e.g. parts/patients.part-00003.sql(.gz)."""
+    stem = filename.rsplit(".", 1)[0]
+    return parts_dir / compressed_name(f"{stem}.part-{shard:05d}{FILE_EXTENSIONS[fmt]}", compression)
+
+
+def write_part(path, label, table_name, columns, rows, fmt, batch_size, complete, compression="none", level=None):
+    """Write one shard's rows; returns the row count.
+
+    ``complete`` parts are standalone loadable files (banner, COPY header,
+    CSV header); otherwise only the body is written, ready to be merged.
+    """
+    with open_part(path, label, table_name, columns, fmt, batch_size, complete, compression, level) as writer:
+        writer.write(rows)
+    return writer.written
+
+
+def open_part(path, label, table_name, columns, fmt, batch_size, complete, compression="none", level=None):
+    """A TableWriter for one shard's part file (arguments as for write_part)."""
+    return TableWriter(
+        path, f"{label} (part)", table_name, columns, fmt, batch_size, None, compression, level, framed=complete
+    )
+
+
+def merge_parts(dest, part_paths, label, table_name, columns, fmt, total_rows, compression="none", level=None):
+    """Concatenate body-only part files into ``dest`` and delete the parts.
+
+    Parts are copied byte for byte, so compressed parts are not recompressed.
+    """
+    prologue, epilogue = io.StringIO(newline=""), io.StringIO(newline="")
+    write_prologue(prologue, label, table_name, columns, fmt, total_rows)
+    write_epilogue(epilogue, fmt, total_rows, total_rows)
+    with open(dest, "wb") as out:
+        out.write(compress_text(prologue.getvalue(), compression, level))
+        for path in part_paths:
+            with open(path, "rb") as part:
+                shutil.copyfileobj(part, out, 1 << 20)
+            path.unlink()
+        out.write(compress_text(epilogue.getvalue(), compression, level))
+
+
+def assemble_table(output_dir, filename, label, table_name, columns, fmt, parts, keep_parts,
+                   compression="none", level=None):
+    """Merge a table's parts into ``output_dir/filename``, or keep them as they are.
+
+    ``parts`` is [(part path, rows)] in shard order. Returns the resulting
+    files as [(path relative to ``output_dir``, rows)].
+    """
+    if keep_parts:
+        return [(path.relative_to(output_dir).as_posix(), rows) for path, rows in parts]
+    total_rows = sum(rows for _, rows in parts)
+    merge_parts(
+        output_dir / filename, [path for path, _ in parts], label, table_name, columns, fmt, total_rows,
+        compression, level,
+    )
+    return [(filename, total_rows)]
+
+
+def write_manifest(output_dir, seed, num_shards, fmt, tables, backend="python", partition_by="none"):
+    """Write manifest.json describing every (possibly sharded or partitioned) table file.
+
+    ``tables`` maps table name -> list of {"file", "rows", "first_id", "last_id"},
+    or of {"file", "rows", "partition"} for a partitioned table.
+    """
+    manifest = {
+        "seed": seed,
+        "shards": num_shards,
+        "format": fmt,
+        "backend": backend,
+    }
+    if partition_by != "none":
+        manifest["partition_by"] = partition_by
+    manifest["tables"] = tables
+    path = output_dir / MANIFEST_FILENAME
+    path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    return path
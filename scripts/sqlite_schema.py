@@ -0,0 +1,108 @@
+"""
+SQLite Schema Translation
+=========================
+Parses the MySQL DDL files (oltp_schema/oltp_schema.sql,
+olap_schema/star_schema.sql) into TableSchemas that build the same tables in
+SQLite, for the query benchmark and the bulk loader:
+
+- column types map to SQLite affinities; PRIMARY KEY columns become rowid
+  keys (clustered, as in InnoDB)
+- every INDEX / UNIQUE KEY becomes a separate CREATE INDEX statement, plus an
+  index on each FOREIGN KEY column (InnoDB creates those implicitly), so
+  callers can build the secondary indexes after loading the data. Column-level
+  UNIQUE constraints become plain indexes, because scaled copies repeat
+  natural codes such as mrn
+- FOREIGN KEY references are kept as (column, table, column), which gives the
+  load order of the tables
+"""
+
+import re
+
+_CREATE_TABLE_RE = re.compile(r"CREATE TABLE (\w+) \((.*?)\n\);", re.S)
+_INDEX_RE = re.compile(r"(UNIQUE KEY|INDEX) (\w+) \(([^)]*)\)")
+_FOREIGN_KEY_RE = re.compile(r"FOREIGN KEY \((\w+)\)(?: REFERENCES (\w+)\s*\((\w+)\))?")
+_COLUMN_RE = re.compile(r"(\w+) (\w+)")
+
+
+class TableSchema:
+    """Columns, primary key, indexes and foreign keys of one table parsed from the DDL."""
+
+    __slots__ = ("name", "columns", "primary_key", "indexes", "foreign_keys")
+
+    def __init__(self, name):
+        self.name = name
+        self.columns = []       # (column, SQLite type)
+        self.primary_key = None
+        self.indexes = []       # (index name, columns, unique)
+        self.foreign_keys = []  # (column, referenced table, referenced column)
+
+    @property
+    def dependencies(self):
+        """Names of the other tables this table references."""
+        return {table for _, table, _ in self.foreign_keys if table and table != self.name}
+
+    def create_statement(self, foreign_keys=False):
+        """CREATE TABLE without secondary indexes; ``foreign_keys`` adds the
+        REFERENCES clauses (enforced only with PRAGMA foreign_keys)."""
+        columns = [
+            f"{column} {kind}" + (" PRIMARY KEY" if column == self.primary_key else "")
+            for column, kind in self.columns
+        ]
+        if foreign_keys:
+            columns.extend(
+                f"FOREIGN KEY ({column}) REFERENCES {table} ({target})"
+                for column, table, target in self.foreign_keys if table
+            )
+        return f"CREATE TABLE {self.name} ({', '.join(columns)})"
+
+    def index_statements(self):
+        seen = {(self.primary_key,)}
+        statements = []
+        for name, columns, unique in self.indexes:
+            if columns in seen:
+                continue
+            seen.add(columns)
+            statements.append(
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {self.name} ({', '.join(columns)})"
+            )
+        return statements
+
+
+def sqlite_type(sql_type):
+    """SQLite affinity for a MySQL column type."""
+    sql_type = sql_type.upper()
+    if sql_type in ("INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BOOLEAN"):
+        return "INTEGER"
+    if sql_type in ("DECIMAL", "NUMERIC", "FLOAT", "DOUBLE"):
+        return "REAL"
+    return "TEXT"
+
+
+def parse_schema(path):
+    """Parse the CREATE TABLE statements of a DDL file into TableSchemas, in file order."""
+    tables = []
+    for name, body in _CREATE_TABLE_RE.findall(path.read_text(encoding="utf-8")):
+        table = TableSchema(name)
+        for line in body.splitlines():
+            line = line.split("--", 1)[0].strip().rstrip(",")
+            if not line:
+                continue
+            index = _INDEX_RE.match(line)
+            foreign_key = _FOREIGN_KEY_RE.match(line)
+            if index:
+                kind, index_name, columns = index.groups()
+                columns = tuple(column.strip() for column in columns.split(","))
+                table.indexes.append((index_name, columns, kind == "UNIQUE KEY"))
+            elif foreign_key:
+                column, referenced_table, referenced_column = foreign_key.groups()
+                table.indexes.append((f"fk_{name}_{column}", (column,), False))
+                table.foreign_keys.append((column, referenced_table, referenced_column))
+            elif not line.startswith(("PRIMARY KEY", "UNIQUE", "KEY", "CONSTRAINT", "CHECK")):
+                column, kind = _COLUMN_RE.match(line).groups()
+                table.columns.append((column, sqlite_type(kind)))
+                if "PRIMARY KEY" in line:
+                    table.primary_key = column
+                elif re.search(r"\bUNIQUE\b", line):
+                    table.indexes.append((f"uq_{name}_{column}", (column,), False))
+        tables.append(table)
+    return tables
@@ -0,0 +1,160 @@
+"""
+Task Graph Scheduler
+====================
+Runs the stages of a build as a DAG instead of a fixed serial list.
+
+Each task declares the named values it reads (``inputs``) and produces
+(``outputs``); a task that must only wait for another one (because it
+mutates data the other reads) lists it in ``after``. The dependencies follow
+from the producers, and the graph is checked before anything runs: every
+input needs exactly one producer and there must be no cycle.
+
+``run`` executes the tasks on a thread pool, starting each one as soon as
+its dependencies have finished, so independent stages overlap. Threads
+rather than processes: the tasks hand each other large in-memory structures
+(key maps, encounter arrays) that are shared, not copied. The overlap comes
+from reading and writing files and from compression, which release the GIL.
+
+After a run, ``schedule`` lists when each task started and finished and
+``critical_path`` is the chain of dependent tasks with the longest total
+duration: the shortest wall time any number of workers could reach.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Task:
+    """One node of a TaskGraph and its timing once it has run."""
+
+    __slots__ = ("name", "function", "inputs", "outputs", "after", "started", "finished", "thread")
+
+    def __init__(self, name, function, inputs, outputs, after):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.after = tuple(after)
+        self.started = self.finished = None
+        self.thread = None
+
+    @property
+    def seconds(self):
+        return self.finished - self.started
+
+    def __call__(self, values):
+        self.thread = threading.current_thread().name
+        self.started = time.perf_counter()
+        try:
+            result = self.function(*(values[name] for name in self.inputs))
+        finally:
+            self.finished = time.perf_counter()
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+
+class TaskGraph:
+    """Tasks with declared inputs and outputs, run concurrently in dependency order."""
+
+    def __init__(self):
+        self.tasks = {}
+        self._producers = {}
+        self._started = self._finished = None
+
+    def add(self, name, function, inputs=(), outputs=(), after=()):
+        """Add task ``name``: ``function(*inputs)`` returns its outputs (a
+        tuple when there are several)."""
+        if name in self.tasks:
+            raise ValueError(f"duplicate task {name!r}")
+        for output in outputs:
+            if output in self._producers:
+                raise ValueError(f"{output!r} is produced by both {self._producers[output]!r} and {name!r}")
+            self._producers[output] = name
+        self.tasks[name] = Task(name, function, inputs, outputs, after)
+
+    def dependencies(self):
+        """{task: set of the tasks it waits for}."""
+        dependencies = {}
+        for task in self.tasks.values():
+            for value in task.inputs:
+                if value not in self._producers:
+                    raise ValueError(f"task {task.name!r} reads {value!r}, which no task produces")
+            for name in task.after:
+                if name not in self.tasks:
+                    raise ValueError(f"task {task.name!r} runs after unknown task {name!r}")
+            dependencies[task.name] = {self._producers[value] for value in task.inputs} | set(task.after)
+        return dependencies
+
+    def order(self):
+        """Task names in a dependency-respecting order (insertion order among ready tasks)."""
+        dependencies = self.dependencies()
+        done, order = set(), []
+        while len(order) < len(dependencies):
+            ready = [name for name, waits in dependencies.items() if name not in done and waits <= done]
+            if not ready:
+                cycle = sorted(name for name in dependencies if name not in done)
+                raise ValueError(f"task dependency cycle among: {', '.join(cycle)}")
+            order.extend(ready)
+            done.update(ready)
+        return order
+
+    def run(self, workers=None):
+        """Run every task on ``workers`` threads (default: CPU count).
+
+        Returns {value name: value} of all outputs. The first task that raises
+        stops new tasks from starting; its exception is re-raised once the
+        running ones have finished.
+        """
+        self.order()
+        dependencies = self.dependencies()
+        workers = max(1, workers or os.cpu_count() or 1)
+        values, done, running = {}, set(), {}
+        self._started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task") as executor:
+            while len(done) < len(dependencies):
+                for name, waits in dependencies.items():
+                    if name not in done and name not in running.values() and waits <= done:
+                        running[executor.submit(self.tasks[name], values)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    values.update(future.result())
+                    done.add(name)
+        self._finished = time.perf_counter()
+        return values
+
+    def critical_path(self):
+        """(task names, seconds) of the longest chain of dependent tasks in the last run."""
+        dependencies = self.dependencies()
+        longest = {}
+        for name in self.order():
+            previous = max(dependencies[name], key=lambda waited: longest[waited][1], default=None)
+            path, seconds = longest[previous] if previous else ((), 0.0)
+            longest[name] = (path + (name,), seconds + self.tasks[name].seconds)
+        return max(longest.values(), key=lambda entry: entry[1], default=((), 0.0))
+
+    def schedule(self):
+        """Report section of the last run: the wall time, each task's start and
+        finish (seconds from the start of the run) and the critical path."""
+        dependencies = self.dependencies()
+        path, seconds = self.critical_path()
+        return {
+            "wall_seconds": round(self._finished - self._started, 4),
+            "critical_path": list(path),
+            "critical_path_seconds": round(seconds, 4),
+            "tasks": [
+                {
+                    "name": task.name,
+                    "after": sorted(dependencies[task.name]),
+                    "start": round(task.started - self._started, 4),
+                    "finish": round(task.finished - self._started, 4),
+                    "thread": task.thread,
+                }
+                for task in sorted(self.tasks.values(), key=lambda task: task.started)
+            ],
+        }
@@ -0,0 +1,169 @@
+"""
+Vectorized Row Generation
+=========================
+NumPy building blocks for the generators' ``--backend numpy`` row streams.
+
+Instead of calling ``random`` and building ``datetime`` objects once per row,
+a stream draws whole columns for a chunk of CHUNK_SIZE rows, derives dates,
+timestamps and amounts with array arithmetic, and converts each column to
+Python values in one ``tolist()`` call, yielding the chunk as an
+output_formats.ColumnBlock that the writers render a column at a time.
+
+NumPy is an optional dependency: the generators only need this module when
+``--backend numpy`` is selected. Every (table, shard) stream is seeded with
+sharding.derive_seed, so numpy output is reproducible for a given seed and
+shard count (it is a different stream from the pure-Python backend).
+"""
+
+from array import array
+from datetime import date
+
+import numpy as np
+
+from calendar_table import SECONDS_PER_DAY
+from sharding import derive_seed
+
+CHUNK_SIZE = 1 << 16
+
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def numpy_rng(seed, table, shard=0):
+    """Independent NumPy generator for one shard of one table."""
+    return np.random.Generator(np.random.PCG64(derive_seed(seed, table, shard)))
+
+
+def chunked(ids, chunk_size=CHUNK_SIZE):
+    """Split an id range into consecutive sub-ranges of at most ``chunk_size``."""
+    for start in range(ids.start, ids.stop, chunk_size):
+        yield range(start, min(start + chunk_size, ids.stop))
+
+
+def weighted_indexes(rng, weights, size):
+    """Draw ``size`` indexes into ``weights`` with probability proportional to the weights."""
+    cumulative = np.cumsum(np.asarray(weights, dtype=np.float64))
+    return np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side="right")
+
+
+def weighted_values(rng, values, weights, size):
+    """Draw ``size`` entries of ``values`` with the given weights."""
+    return np.asarray(values)[weighted_indexes(rng, weights, size)]
+
+
+def sample(rng, sampler, size):
+    """Draw ``size`` positions from a distributions.Sampler (uniform: the plain ``integers`` draw)."""
+    if sampler.cumulative is None:
+        return rng.integers(0, sampler.size, size)
+    ranks = np.searchsorted(np.frombuffer(sampler.cumulative), rng.random(size) * sampler.total, side="right")
+    return np.minimum(ranks, sampler.size - 1) * sampler.stride % sampler.size
+
+
+def uniform_amounts(rng, low, high):
+    """Uniform amounts in [low, high) rounded to cents; bounds are per-row arrays."""
+    return np.round(rng.uniform(low, high), 2)
+
+
+def distinct_draws(rng, counts, num_choices):
+    """Draw ``counts[i]`` distinct ids in 1..num_choices for every row i.
+
+    Returns an (n, max(counts)) matrix whose first ``counts[i]`` entries in
+    row i are distinct; duplicates are redrawn column by column, mirroring
+    the pure-Python rejection loop.
+    """
+    width = int(counts.max()) if len(counts) else 0
+    draws = rng.integers(1, num_choices + 1, size=(len(counts), width), dtype=np.int32)
+    for col in range(1, width):
+        rows = np.flatnonzero(counts > col)
+        while len(rows):
+            earlier = draws[rows, :col]
+            rows = rows[(earlier == draws[rows, col][:, None]).any(axis=1)]
+            draws[rows, col] = rng.integers(1, num_choices + 1, size=len(rows), dtype=np.int32)
+    return draws
+
+
+def distinct_samples(rng, counts, num_choices):
+    """Draw ``counts[i]`` distinct ids in 1..num_choices for every row i, without rejection.
+
+    Returns an (n, max(counts)) matrix like distinct_draws. Column j draws a
+    rank among the ``num_choices - j`` ids not yet taken in its row and
+    shifts it past the taken ids in ascending order, so every column is one
+    draw per row however many ids are taken.
+    """
+    n = len(counts)
+    width = int(counts.max()) if n else 0
+    draws = np.empty((n, width), dtype=np.int32)
+    taken = np.empty((n, 0), dtype=np.int32)
+    for col in range(width):
+        ranks = 1 + (rng.random(n) * (num_choices - col)).astype(np.int32)
+        for k in range(col):
+            ranks += ranks >= taken[:, k]
+        draws[:, col] = ranks
+        taken = np.sort(draws[:, :col + 1], axis=1)
+    return draws
+
+
+def explode(parent_ids, counts, draws):
+    """Flatten per-row draws into child rows.
+
+    Returns (parent id per child, drawn value per child, 1-based sequence per
+    child) for the first ``counts[i]`` draws of each row.
+    """
+    mask = np.arange(draws.shape[1]) < counts[:, None]
+    sequences = np.broadcast_to(np.arange(1, draws.shape[1] + 1), draws.shape)
+    return np.repeat(parent_ids, counts), draws[mask], sequences[mask]
+
+
+def _dense_strings(values, render):
+    """Render every value in [min, max] once and look each entry up (object array).
+
+    For columns with a narrow value range, such as the dates of a chunk.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if not len(values):
+        return np.empty(0, dtype=object)
+    low = int(values.min())
+    return np.array(render(np.arange(low, int(values.max()) + 1)), dtype=object)[values - low]
+
+
+def _distinct_strings(values, render):
+    """Render each distinct value once and look each entry up (object array).
+
+    For columns with few distinct values over a wide range, such as times of day.
+    """
+    distinct, inverse = np.unique(np.asarray(values, dtype=np.int64), return_inverse=True)
+    return np.array(render(distinct), dtype=object)[inverse]
+
+
+def _render_dates(ordinals):
+    return np.datetime_as_string((ordinals - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")).tolist()
+
+
+def _render_times(seconds):
+    stamps = np.datetime_as_string(seconds.astype("datetime64[s]")).tolist()
+    return [stamp[11:] for stamp in stamps]
+
+
+def format_dates(ordinals):
+    """Proleptic ordinals -> list of 'YYYY-MM-DD' strings.
+
+    Each date in the chunk's range is rendered once and then looked up, as a
+    chunk spans a few thousand days at most.
+    """
+    return _dense_strings(ordinals, _render_dates).tolist()
+
+
+def format_timestamps(seconds):
+    """Seconds since ordinal day 0 -> list of 'YYYY-MM-DD HH:MM:SS' strings."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    days, times = np.divmod(seconds, SECONDS_PER_DAY)
+    return (_dense_strings(days, _render_dates) + " " + _distinct_strings(times, _render_times)).tolist()
+
+
+def codes(indexes):
+    """An int array as the ``array("i")`` codes of a dictionary_encoding.DictionaryColumn."""
+    return array("i", np.asarray(indexes, dtype=np.int32).tobytes())
+
+
+def lookup(packed, indexes):
+    """Gather ``packed[indexes]`` from an ``array.array`` column (e.g. a calendar_table.Calendar array)."""
+    return np.frombuffer(packed, dtype=packed.typecode)[indexes]